@@ -2,19 +2,105 @@
 from __future__ import print_function
 
 import argparse
+import os
 import sys
-from compliance_checker.runner import ComplianceChecker, CheckSuite
-from compliance_checker.cf.util import download_cf_standard_name_table
+from functools import partial
+from compliance_checker.client import (DaemonError, daemon_status,
+                                       forward_to_daemon)
 from compliance_checker import __version__
 from textwrap import dedent
 
 
-def main():
-    # Load all available checker classes
-    check_suite = CheckSuite()
-    check_suite.load_all_available_checkers()
+# priorities of BaseCheck.HIGH, MEDIUM and LOW by name
+PRIORITIES = {'high': 3, 'medium': 2, 'low': 1}
+
+
+def priority(name):
+    '''
+    argparse type of priority names, returning the priority
+    '''
+    try:
+        return PRIORITIES[name.lower()]
+    except KeyError:
+        raise argparse.ArgumentTypeError(
+            "invalid priority '{}' (choose from high, medium, low)".format(name))
+
+
+def sections(value):
+    '''
+    argparse type of comma separated section numbers, returning the list of
+    sections
+    '''
+    sections = [section.strip() for section in value.split(',')]
+    for section in sections:
+        if not all(part.isdigit() for part in section.split('.')):
+            raise argparse.ArgumentTypeError(
+                "invalid section '{}', sections are numbered like 4 or 5.6".format(section))
+    return sections
+
+
+def sample(value):
+    '''
+    argparse type of sample sizes, returning a fraction of the chunks as a
+    float, or a number of chunks as an int
+    '''
+    try:
+        size = int(value)
+    except ValueError:
+        try:
+            size = float(value)
+        except ValueError:
+            size = None
+    if size is None or (isinstance(size, int) and size < 1) or \
+            (isinstance(size, float) and not 0 < size <= 1):
+        raise argparse.ArgumentTypeError(
+            "invalid sample '{}', give a fraction like 0.01 or a number of "
+            "chunks like 100".format(value))
+    return size
 
-    parser = argparse.ArgumentParser()
+
+# multiples of the units of memory sizes
+MEMORY_UNITS = {'': 1, 'K': 2 ** 10, 'M': 2 ** 20, 'G': 2 ** 30, 'T': 2 ** 40}
+
+
+def memory_size(value):
+    '''
+    argparse type of memory sizes like 512M or 2G, returning the size in
+    bytes
+    '''
+    text = value.strip().upper()
+    for suffix in ('IB', 'B'):
+        if text.endswith(suffix):
+            text = text[:-len(suffix)]
+            break
+    unit = text[-1:] if text[-1:] in MEMORY_UNITS else ''
+    try:
+        size = int(float(text[:len(text) - len(unit)]) * MEMORY_UNITS[unit])
+    except ValueError:
+        size = 0
+    if size <= 0:
+        raise argparse.ArgumentTypeError(
+            "invalid memory size '{}', give a size like 512M or 2G".format(value))
+    return size
+
+
+def expand_fail_fast(argv):
+    '''
+    Returns the command line arguments with a bare --fail-fast not followed
+    by a priority name spelt out as --fail-fast=high, so that argparse
+    doesn't take the dataset following it for its priority
+    '''
+    expanded = []
+    for i, arg in enumerate(argv):
+        if arg == '--fail-fast' and (i + 1 == len(argv) or
+                                     argv[i + 1].lower() not in PRIORITIES):
+            arg = '--fail-fast=high'
+        expanded.append(arg)
+    return expanded
+
+
+def create_parser(add_help=True):
+    parser = argparse.ArgumentParser(add_help=add_help)
     parser.add_argument('--test', '-t', '--test=', '-t=', default=[],
                         action='append',
                         help=("Select the Checks you want to perform. Defaults to 'acdd'"
@@ -50,6 +136,150 @@ def main():
                                     """),
                         action='append')
 
+    parser.add_argument('--only-checks', action='append', metavar='CHECK',
+                        help=("Only run the named check, e.g. `check_units`.  "
+                              "May be given many times.  Checks which aren't "
+                              "selected are skipped, along with any analysis "
+                              "of the dataset only they need."))
+
+    parser.add_argument('--sections', type=sections, metavar='SECTIONS',
+                        help=("Only run the checks of these comma separated "
+                              "sections of the standard and their "
+                              "subsections, e.g. `--sections 4,5.6` for CF "
+                              "chapter 4 and section 5.6.  Checkers which "
+                              "don't number their checks by section, such as "
+                              "ACDD, run all of their checks."))
+
+    parser.add_argument('--max-workers', '-w', type=int, default=None,
+                        help=("Run checks which read variable data, such as "
+                              "the ACDD extent checks, concurrently on up to "
+                              "this many threads, for OPeNDAP datasets.  "
+                              "Their data is then read with DAP2 requests "
+                              "made side by side, as the netCDF library "
+                              "isn't thread-safe; checks of local files "
+                              "still take turns using it.  Defaults to "
+                              "running all checks sequentially."))
+
+    parser.add_argument('--metadata-only', action='store_true',
+                        help=("Only run checks which can be evaluated from "
+                              "the dataset header (dimensions, attributes and "
+                              "data types).  Checks which read variable data "
+                              "are skipped, which makes triage of large "
+                              "archives much faster."))
+
+    parser.add_argument('--check-data', action='store_true',
+                        help=("Also check the values of the variables "
+                              "themselves: that they lie within their valid "
+                              "range and that flag variables only hold valid "
+                              "flags.  Every value of those variables is "
+                              "read, in chunks and several variables at "
+                              "once, so this takes as long as reading the "
+                              "data."))
+
+    parser.add_argument('--sample', type=sample, metavar='FRACTION|N',
+                        help=("Only read a random FRACTION (e.g. 0.01) or N "
+                              "of the chunks of each variable the data "
+                              "checks, like --check-data and the ACDD "
+                              "extents, would read in full.  Their results "
+                              "are marked approximate, with the size of the "
+                              "sample, in exchange for far less I/O on very "
+                              "large files."))
+
+    parser.add_argument('--max-memory', type=memory_size, metavar='SIZE',
+                        help=("Read variable data in chunks sized to keep "
+                              "the data held at once within SIZE, e.g. 512M "
+                              "or 2G, rather than reading variables whole.  "
+                              "The peak memory of the data read from each "
+                              "dataset is reported to stderr."))
+
+    parser.add_argument('--fail-fast', type=priority,
+                        metavar='PRIORITY',
+                        help=("Stop checking a dataset as soon as a check "
+                              "fails at or above PRIORITY (high, medium or "
+                              "low, defaults to high), or the lowest priority "
+                              "the --criteria report if that is higher.  "
+                              "The report only "
+                              "holds the checks run until then, but a "
+                              "dataset which fails is found much faster.  "
+                              "Useful to triage files at ingest."))
+
+    parser.add_argument('--http-cache', action='store_true',
+                        help=("Keep the metadata of remote datasets (OPeNDAP "
+                              "DAS and DDS, SOS documents) in an on-disk "
+                              "cache and revalidate it with conditional "
+                              "requests.  The results of checking a remote "
+                              "dataset loaded from its metadata alone, i.e. "
+                              "SOS or OPeNDAP with --metadata-only, are "
+                              "reused while its metadata is unchanged."))
+
+    parser.add_argument('--crawl-sos', action='store_true',
+                        help=("Treat each dataset location as the URL of an "
+                              "SOS GetCapabilities document, and also check "
+                              "the DescribeSensor document of every procedure "
+                              "of its offerings.  The DescribeSensor documents "
+                              "are fetched concurrently and checked as they "
+                              "arrive.  Use with `--test ioos_sos`."))
+
+    parser.add_argument('--crawl-workers', type=int, default=8, metavar='N',
+                        help=("Number of DescribeSensor documents fetched at "
+                              "once with --crawl-sos.  Defaults to 8."))
+
+    parser.add_argument('--serve', nargs='?', const='localhost:8765',
+                        metavar='ADDRESS',
+                        help=("Run as a daemon which keeps the checkers "
+                              "loaded and serves check requests over HTTP on "
+                              "ADDRESS, given as [host:]port.  Only loopback "
+                              "addresses are accepted.  Defaults to "
+                              "localhost:8765."))
+
+    parser.add_argument('--daemon', nargs='?', const='localhost:8765',
+                        metavar='ADDRESS',
+                        default=os.environ.get('COMPLIANCE_CHECKER_DAEMON'),
+                        help=("Forward the checks to a daemon started with "
+                              "--serve listening on ADDRESS, falling back to "
+                              "checking in this process if there is none.  "
+                              "Defaults to the COMPLIANCE_CHECKER_DAEMON "
+                              "environment variable."))
+
+    parser.add_argument('--watch', metavar='DIR',
+                        help=("Watch the directory DIR and check datasets as "
+                              "they are created or changed, once they have "
+                              "been left unchanged for a couple of seconds.  "
+                              "Runs until interrupted.  Results for each "
+                              "dataset are written to stdout, or to a file "
+                              "named after the dataset in the directory given "
+                              "by --output."))
+
+    parser.add_argument('--watch-pattern', default='*.nc', metavar='PATTERN',
+                        help=("Shell-style pattern of the file names to check "
+                              "in --watch mode.  Defaults to '*.nc'."))
+
+    parser.add_argument('--summary', action='store_true',
+                        help=("Instead of a report for every dataset, output "
+                              "a single summary of the results of all of them: "
+                              "how often each check failed, the distribution "
+                              "of scores and the lowest scoring datasets.  The "
+                              "summary is written as text, or as JSON if the "
+                              "format is 'json'."))
+
+    parser.add_argument('--summary-top', type=int, default=10, metavar='N',
+                        help=("Number of lowest scoring datasets listed in the "
+                              "summary.  Defaults to 10."))
+
+    parser.add_argument('--merge-summary', default=[], action='append',
+                        metavar='FILE',
+                        help=("Merge a JSON summary written by an earlier run "
+                              "into the summary.  May be given many times, "
+                              "and with no datasets to only merge summaries."))
+
+    parser.add_argument('--batch-attributes', action='store_true',
+                        help=("With --summary, evaluate the attribute checks "
+                              "of the local netCDF files, such as the ACDD "
+                              "and IOOS checks of global attributes, for all "
+                              "of the files at once.  Much faster on large, "
+                              "homogeneous archives; the results are the "
+                              "same."))
+
     parser.add_argument('-f', '--format', default=[], action='append',
                         help=("Output format(s). Options are 'text', 'html', 'json', 'json_new'."
                               " The difference between the 'json' and the 'json_new'"
@@ -82,10 +312,44 @@ def main():
                         help=("Specify a version of the cf standard name table"
                               " to download as packaged version"))
 
+    return parser
+
+
+def main():
+    # Hand the checks straight to a running daemon, before paying for
+    # loading the checkers.  Options added by generator plugins are unknown
+    # until the checkers are loaded, so runs using them aren't forwarded.
+    argv = expand_fail_fast(sys.argv[1:])
+    args, unknown = create_parser(add_help=False).parse_known_args(argv)
+    # (passed, errors) of the runs the daemon did
+    finished = []
+    if (args.daemon and args.dataset_location and not unknown and
+            not (args.version or args.list_tests or args.serve or
+                 args.watch or args.summary or
+                 args.download_standard_names) and
+            daemon_status(args.daemon) is not None):
+        try:
+            return run_checks(args, partial(forward_to_daemon, args.daemon),
+                              finished)
+        except DaemonError as e:
+            # the reports the daemon already wrote aren't written again
+            print("{}; running the remaining checks locally".format(e),
+                  file=sys.stderr)
+
+    from compliance_checker.runner import ComplianceChecker, CheckSuite
+    from compliance_checker.cf.util import download_cf_standard_name_table
+    from compliance_checker.server import serve
+
+    # Load all available checker classes
+    check_suite = CheckSuite()
+    check_suite.load_all_available_checkers()
+
+    parser = create_parser()
+
     # Add command line args from generator plugins
     check_suite.add_plugin_args(parser)
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     check_suite.load_generated_checkers(args)
 
@@ -107,10 +371,48 @@ def main():
     if args.download_standard_names:
         download_cf_standard_name_table(args.download_standard_names)
 
+    if args.serve:
+        try:
+            serve(args.serve)
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            return 2
+        return 0
+
+    if args.watch:
+        return watch_directory(args, ComplianceChecker.run_checker)
+
+    if args.summary and (args.dataset_location or args.merge_summary):
+        return summarize(args, ComplianceChecker.run_summary)
+
     if len(args.dataset_location) == 0:
         parser.print_help()
         return 1
 
+    return run_checks(args, ComplianceChecker.run_checker, finished)
+
+
+def crawl_workers(args):
+    '''
+    Returns the crawl_sos argument of the runner for the command line
+    arguments
+    '''
+    return args.crawl_workers if args.crawl_sos else None
+
+
+def run_checks(args, run_checker, finished=None):
+    '''
+    Checks the datasets given on the command line and returns the exit
+    status.  The datasets are checked in one run, or in a run per dataset
+    if there is an output file for each.
+
+    :param argparse.Namespace args: Parsed command line arguments
+    :param run_checker: Function taking the arguments of
+                        ComplianceChecker.run_checker, which runs the checks
+    :param list finished: (passed, errors) of each run done so far, e.g. by
+                          the daemon before it failed, which are skipped.
+                          The runs done are appended to it.
+    '''
     # Check the number of output files
     if not args.output:
         args.output = '-'
@@ -121,40 +423,147 @@ def main():
 
     # Run the compliance checker
     # 2 modes, concatenated output file or multiple output files
-    return_values = []
-    had_errors = []
     if output_len == 1:
-        if args.format != 'json':
-            print("Running Compliance Checker on the datasets from: {}".format(args.dataset_location), file=sys.stderr)
-        return_value, errors = ComplianceChecker.run_checker(args.dataset_location,
-                                                             args.test or ['acdd'],
-                                                             args.verbose,
-                                                             args.criteria,
-                                                             args.skip_checks,
-                                                             args.output[0],
-                                                             args.format or ['text'])
-        return_values.append(return_value)
-        had_errors.append(errors)
+        runs = [(args.dataset_location, args.output[0],
+                 "Running Compliance Checker on the datasets from: {}".format(args.dataset_location))]
     else:
-        for output, dataset in zip(args.output, args.dataset_location):
-            if args.format != 'json':
-                print("Running Compliance Checker on the dataset from: {}".format(dataset), file=sys.stderr)
-            return_value, errors = ComplianceChecker.run_checker([dataset],
-                                                                args.test or ['acdd'],
-                                                                args.verbose,
-                                                                args.criteria,
-                                                                args.skip_checks,
-                                                                output,
-                                                                args.format or ['text'])
-            return_values.append(return_value)
-            had_errors.append(errors)
-
-    if any(had_errors):
+        runs = [([dataset], output,
+                 "Running Compliance Checker on the dataset from: {}".format(dataset))
+                for output, dataset in zip(args.output, args.dataset_location)]
+    if finished is None:
+        finished = []
+    for ds_loc, output, message in runs[len(finished):]:
+        if args.format != 'json':
+            print(message, file=sys.stderr)
+        finished.append(run_checker(ds_loc,
+                                    args.test or ['acdd'],
+                                    args.verbose,
+                                    args.criteria,
+                                    args.skip_checks,
+                                    output,
+                                    args.format or ['text'],
+                                    args.max_workers,
+                                    args.metadata_only,
+                                    args.fail_fast,
+                                    args.only_checks,
+                                    args.sections,
+                                    args.http_cache,
+                                    crawl_workers(args),
+                                    args.check_data,
+                                    args.sample,
+                                    args.max_memory))
+
+    if any(errors for _, errors in finished):
+        return 2
+    if all(return_value for return_value, _ in finished):
+        return 0
+    return 1
+
+
+def summarize(args, run_summary):
+    '''
+    Writes a summary of the results of the datasets given on the command
+    line and returns the exit status.
+
+    :param argparse.Namespace args: Parsed command line arguments
+    :param run_summary: ComplianceChecker.run_summary
+    '''
+    if len(args.output) > 1:
+        print('Only one output file can be given for a summary', file=sys.stderr)
+        sys.exit(2)
+    if len(args.dataset_location) > 0:
+        print("Running Compliance Checker on the datasets from: {}".format(args.dataset_location), file=sys.stderr)
+    return_value, errors = run_summary(args.dataset_location,
+                                       args.test or ['acdd'],
+                                       args.verbose,
+                                       args.criteria,
+                                       args.skip_checks,
+                                       args.output[0] if args.output else '-',
+                                       args.format or ['text'],
+                                       args.max_workers,
+                                       args.metadata_only,
+                                       args.fail_fast,
+                                       args.only_checks,
+                                       args.sections,
+                                       args.summary_top,
+                                       args.merge_summary,
+                                       args.http_cache,
+                                       crawl_workers(args),
+                                       args.check_data,
+                                       args.sample,
+                                       args.max_memory,
+                                       args.batch_attributes)
+    if errors:
         return 2
-    if all(return_values):
+    if return_value:
         return 0
     return 1
 
 
+# file extensions of the result files written in watch mode
+FORMAT_EXTENSIONS = {'text': 'txt', 'html': 'html', 'json': 'json',
+                     'json_new': 'json'}
+
+
+def watch_directory(args, run_checker):
+    '''
+    Checks datasets as they are created or changed in the directory given by
+    --watch, until interrupted.  Returns the exit status.
+
+    :param argparse.Namespace args: Parsed command line arguments
+    :param run_checker: Function taking the arguments of
+                        ComplianceChecker.run_checker, which runs the checks
+    '''
+    from compliance_checker.watch import DatasetWatcher
+
+    if len(args.output) > 1:
+        print('Only one output directory can be given in watch mode', file=sys.stderr)
+        sys.exit(2)
+    output_dir = args.output[0] if args.output else '-'
+    output_format = args.format or ['text']
+    if output_dir != '-' and not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+
+    watcher = DatasetWatcher(args.watch, args.watch_pattern)
+    print("Watching {} for datasets matching {}".format(args.watch, args.watch_pattern), file=sys.stderr)
+    try:
+        for dataset in watcher:
+            if output_dir == '-':
+                output = '-'
+            else:
+                output = os.path.join(output_dir, '{}.{}'.format(
+                    os.path.basename(dataset),
+                    FORMAT_EXTENSIONS[output_format[0]]))
+            print("Running Compliance Checker on the dataset from: {}".format(dataset), file=sys.stderr)
+            try:
+                run_checker([dataset],
+                            args.test or ['acdd'],
+                            args.verbose,
+                            args.criteria,
+                            args.skip_checks,
+                            output,
+                            output_format,
+                            args.max_workers,
+                            args.metadata_only,
+                            args.fail_fast,
+                            args.only_checks,
+                            args.sections,
+                            args.http_cache,
+                            None,
+                            args.check_data,
+                            args.sample,
+                            args.max_memory)
+            except Exception as e:
+                # keep watching, a bad file shouldn't stop the checks of the
+                # ones arriving after it
+                print("Failed to check {}: {}".format(dataset, e), file=sys.stderr)
+            sys.stdout.flush()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+    return 0
+
+
 if __name__ == "__main__":
     sys.exit(main())
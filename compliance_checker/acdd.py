@@ -7,14 +7,16 @@ project for the verification and scoring of attributes for datasets.
 
 from __future__ import unicode_literals
 import numpy as np
-from netCDF4 import num2date
 from datetime import timedelta
 from compliance_checker.base import (BaseCheck, BaseNCCheck, check_has,
-                                     Result, ratable_result)
-from compliance_checker.cf.util import _possiblexunits, _possibleyunits
+                                     Result, ratable_result, io_bound,
+                                     max_priority)
 from compliance_checker.util import datetime_is_iso, dateparse
+from compliance_checker.dates import num2datetime
+from compliance_checker.inputs import (requires, requires_with_data,
+                                      get_input, sample_note,
+                                      streamed_extents)
 from compliance_checker import cfutil
-import pendulum
 from pygeoif import from_wkt
 
 
@@ -198,6 +200,7 @@ class ACDDBaseCheck(BaseCheck):
 
         return results
 
+    @max_priority(BaseCheck.MEDIUM)
     def check_acknowledgment(self, ds):
         '''
         Check if acknowledgment/acknowledgment attribute is present. Because
@@ -216,6 +219,24 @@ class ACDDBaseCheck(BaseCheck):
         # name="Global Attributes" so gets grouped with Global Attributes
         return Result(BaseCheck.MEDIUM, check, "Global Attributes", msgs=messages)
 
+    def _sample_notes(self, ds, names):
+        '''
+        Returns notes marking extents as approximate for the variables of
+        which only a sample of the values was read, see --sample
+
+        :param netCDF4.Dataset ds: An open netCDF dataset
+        :param list names: Names of the variables the extents are of
+        '''
+        notes = []
+        for name in names:
+            note = sample_note(ds, name)
+            if note is not None:
+                notes.append("Extents of %s are %s, the data may extend further" % (name, note))
+        return notes
+
+    @max_priority(BaseCheck.MEDIUM)
+    @io_bound
+    @requires('latitude_candidates', 'latitude_extents')
     def check_lat_extents(self, ds):
         '''
         Check that the values of geospatial_lat_min/geospatial_lat_max
@@ -230,41 +251,13 @@ class ACDDBaseCheck(BaseCheck):
         lat_max = ds.geospatial_lat_max
 
         # identify lat var(s) as per CF 4.1
-        lat_vars = {}       # var -> number of criteria passed
-        for name, var in ds.variables.items():
-
-            # must have units
-            if not hasattr(var, 'units'):
-                continue
-
-            lat_vars[var] = 0
-
-            # units in this set
-            if var.units in _possibleyunits:
-                lat_vars[var] += 1
-
-            # standard name of "latitude"
-            if hasattr(var, 'standard_name') and var.standard_name == 'latitude':
-                lat_vars[var] += 1
-
-            # axis of "Y"
-            if hasattr(var, 'axis') and var.axis == 'Y':
-                lat_vars[var] += 1
-
-        # trim out any zeros
-        lat_vars = {k: v for k, v in lat_vars.items() if v > 0}
-
-        if len(lat_vars) == 0:
+        if len(get_input(ds, 'latitude_candidates')) == 0:
             return Result(BaseCheck.MEDIUM,
                           False,
                           'geospatial_lat_extents_match',
                           ['Could not find lat variable to test extent of geospatial_lat_min/max, see CF-1.6 spec chapter 4.1'])
 
-        # sort by criteria passed
-        final_lats = sorted(lat_vars, key=lambda x: lat_vars[x], reverse=True)
-
-        obs_mins = {var._name: np.nanmin(var) for var in final_lats if not np.isnan(var).all()}
-        obs_maxs = {var._name: np.nanmax(var) for var in final_lats if not np.isnan(var).all()}
+        obs_mins, obs_maxs = get_input(ds, 'latitude_extents')
 
         min_pass = any((np.isclose(lat_min, min_val) for min_val in obs_mins.values()))
         max_pass = any((np.isclose(lat_max, max_val) for max_val in obs_maxs.values()))
@@ -276,12 +269,16 @@ class ACDDBaseCheck(BaseCheck):
             msgs.append("Data for possible latitude variables (%s) did not match geospatial_lat_min value (%s)" % (obs_mins, lat_min))
         if not max_pass:
             msgs.append("Data for possible latitude variables (%s) did not match geospatial_lat_max value (%s)" % (obs_maxs, lat_max))
+        msgs.extend(self._sample_notes(ds, obs_mins))
 
         return Result(BaseCheck.MEDIUM,
                       (allpass, 2),
                       'geospatial_lat_extents_match',
                       msgs)
 
+    @max_priority(BaseCheck.MEDIUM)
+    @io_bound
+    @requires('longitude_candidates', 'longitude_extents')
     def check_lon_extents(self, ds):
         '''
         Check that the values of geospatial_lon_min/geospatial_lon_max
@@ -296,41 +293,13 @@ class ACDDBaseCheck(BaseCheck):
         lon_max = ds.geospatial_lon_max
 
         # identify lon var(s) as per CF 4.2
-        lon_vars = {}       # var -> number of criteria passed
-        for name, var in ds.variables.items():
-
-            # must have units
-            if not hasattr(var, 'units'):
-                continue
-
-            lon_vars[var] = 0
-
-            # units in this set
-            if var.units in _possiblexunits:
-                lon_vars[var] += 1
-
-            # standard name of "longitude"
-            if hasattr(var, 'standard_name') and var.standard_name == 'longitude':
-                lon_vars[var] += 1
-
-            # axis of "Y"
-            if hasattr(var, 'axis') and var.axis == 'X':
-                lon_vars[var] += 1
-
-        # trim out any zeros
-        lon_vars = {k: v for k, v in lon_vars.items() if v > 0}
-
-        if len(lon_vars) == 0:
+        if len(get_input(ds, 'longitude_candidates')) == 0:
             return Result(BaseCheck.MEDIUM,
                           False,
                           'geospatial_lon_extents_match',
                           ['Could not find lon variable to test extent of geospatial_lon_min/max, see CF-1.6 spec chapter 4.2'])
 
-        # sort by criteria passed
-        final_lons = sorted(lon_vars, key=lambda x: lon_vars[x], reverse=True)
-
-        obs_mins = {var._name: np.nanmin(var) for var in final_lons if not np.isnan(var).all()}
-        obs_maxs = {var._name: np.nanmax(var) for var in final_lons if not np.isnan(var).all()}
+        obs_mins, obs_maxs = get_input(ds, 'longitude_extents')
 
         min_pass = any((np.isclose(lon_min, min_val) for min_val in obs_mins.values()))
         max_pass = any((np.isclose(lon_max, max_val) for max_val in obs_maxs.values()))
@@ -342,6 +311,7 @@ class ACDDBaseCheck(BaseCheck):
             msgs.append("Data for possible longitude variables (%s) did not match geospatial_lon_min value (%s)" % (obs_mins, lon_min))
         if not max_pass:
             msgs.append("Data for possible longitude variables (%s) did not match geospatial_lon_max value (%s)" % (obs_maxs, lon_max))
+        msgs.extend(self._sample_notes(ds, obs_mins))
 
         return Result(BaseCheck.MEDIUM,
                       (allpass, 2),
@@ -382,13 +352,7 @@ class ACDDBaseCheck(BaseCheck):
         msgs = []
         total = 2
 
-        zvalue = ds.variables[z_variable][:]
-        # If the array has fill values, which is allowed in the case of point
-        # features
-        if hasattr(zvalue, 'mask'):
-            zvalue = zvalue[~zvalue.mask]
-        zmin = zvalue.min()
-        zmax = zvalue.max()
+        zmin, zmax = get_input(ds, 'vertical_extents')
         if not np.isclose(vert_min, zmin):
             msgs.append("geospatial_vertical_min != min(%s) values, %s != %s" % (
                 z_variable,
@@ -401,9 +365,11 @@ class ACDDBaseCheck(BaseCheck):
                 vert_min,
                 zmax
             ))
+        score = total - len(msgs)
+        msgs.extend(self._sample_notes(ds, [z_variable]))
 
         return Result(BaseCheck.MEDIUM,
-                      (total - len(msgs), total),
+                      (score, total),
                       'geospatial_vertical_extents_match',
                       msgs)
 
@@ -439,6 +405,9 @@ class ACDDBaseCheck(BaseCheck):
                       'geospatial_vertical_extents_match',
                       msgs)
 
+    @max_priority(BaseCheck.MEDIUM)
+    @io_bound
+    @requires('z_variable', 'vertical_extents')
     def check_vertical_extents(self, ds):
         """
         Check that the values of geospatial_vertical_min/geospatial_vertical_max approximately match the data.
@@ -448,7 +417,7 @@ class ACDDBaseCheck(BaseCheck):
         if not (hasattr(ds, 'geospatial_vertical_min') and hasattr(ds, 'geospatial_vertical_max')):
             return
 
-        z_variable = cfutil.get_z_variable(ds)
+        z_variable = get_input(ds, 'z_variable')
         if not z_variable:
             return Result(BaseCheck.MEDIUM,
                           False,
@@ -459,9 +428,15 @@ class ACDDBaseCheck(BaseCheck):
 
         return self._check_total_z_extents(ds, z_variable)
 
+    @max_priority(BaseCheck.MEDIUM)
+    @io_bound
+    @requires('time_variable', 'time_endpoints')
+    @requires_with_data('coordinate_values')
     def check_time_extents(self, ds):
         """
         Check that the values of time_coverage_start/time_coverage_end approximately match the data.
+        When validating data, the lowest and highest times streamed for the
+        coordinate data checks are compared rather than the first and last.
         """
         if not (hasattr(ds, 'time_coverage_start') and hasattr(ds, 'time_coverage_end')):
             return
@@ -476,7 +451,7 @@ class ACDDBaseCheck(BaseCheck):
                           'time_coverage_extents_match',
                           ['time_coverage attributes are not formatted properly. Use the ISO 8601:2004 date format, preferably the extended format.'])
 
-        timevar = cfutil.get_time_variable(ds)
+        timevar = get_input(ds, 'time_variable')
 
         if not timevar:
             return Result(BaseCheck.MEDIUM,
@@ -485,16 +460,21 @@ class ACDDBaseCheck(BaseCheck):
                           ['Could not find time variable to test extent of time_coverage_start/time_coverage_end, see CF-1.6 spec chapter 4.4'])
 
         # Time should be monotonically increasing, so we make that assumption here so we don't have to download THE ENTIRE ARRAY
+        # unless the data is validated, in which case the whole array is
+        # streamed anyway and its lowest and highest values are used
         try:
-            # num2date returns as naive date, but with time adjusted to UTC
-            # we need to attach timezone information here, or the date
-            # subtraction from t_min/t_max will assume that a naive timestamp is
-            # in the same time zone and cause erroneous results.
-            # Pendulum uses UTC by default, but we are being explicit here
-            time0 = pendulum.instance(num2date(ds.variables[timevar][0],
-                                      ds.variables[timevar].units), 'UTC')
-            time1 = pendulum.instance(num2date(ds.variables[timevar][-1],
-                                      ds.variables[timevar].units), 'UTC')
+            # num2datetime returns the times in UTC, with the time zone
+            # attached so that the subtraction from t_min/t_max, which are
+            # aware, doesn't assume they're in the same time zone
+            extents = streamed_extents(ds, timevar)
+            if extents is not None:
+                first, last = extents
+                labels = ('min(time)', 'max(time)')
+            else:
+                first, last = get_input(ds, 'time_endpoints')
+                labels = ('time[0]', 'time[N]')
+            time0 = num2datetime(first, ds.variables[timevar].units)
+            time1 = num2datetime(last, ds.variables[timevar].units)
         except:
             return Result(BaseCheck.MEDIUM,
                           False,
@@ -508,12 +488,14 @@ class ACDDBaseCheck(BaseCheck):
         msgs = []
         if start_dt > timedelta(hours=1):
             msgs.append("Date time mismatch between time_coverage_start and actual "
-                        "time values %s (time_coverage_start) != %s (time[0])" % (t_min.isoformat(), time0.isoformat()))
+                        "time values %s (time_coverage_start) != %s (%s)" % (t_min.isoformat(), time0.isoformat(), labels[0]))
             score -= 1
         if end_dt > timedelta(hours=1):
             msgs.append("Date time mismatch between time_coverage_end and actual "
-                        "time values %s (time_coverage_end) != %s (time[N])" % (t_max.isoformat(), time1.isoformat()))
+                        "time values %s (time_coverage_end) != %s (%s)" % (t_max.isoformat(), time1.isoformat(), labels[1]))
             score -= 1
+        if extents is not None:
+            msgs.extend(self._sample_notes(ds, [timevar]))
 
         return Result(BaseCheck.MEDIUM,
                       (score, 2),
@@ -611,6 +593,9 @@ class ACDD1_3Check(ACDDNCCheck):
             'publisher_institution',
         ])
 
+    # without a metadata_link the check returns None, which is reported as
+    # a medium priority skip
+    @max_priority(BaseCheck.MEDIUM)
     def check_metadata_link(self, ds):
         '''
         Checks if metadata link is formed in a rational manner
@@ -626,6 +611,7 @@ class ACDD1_3Check(ACDDNCCheck):
         valid_link = (len(msgs) == 0)
         return Result(BaseCheck.LOW, valid_link, 'metadata_link_valid', msgs)
 
+    @max_priority(BaseCheck.MEDIUM)
     def check_date_modified_is_iso(self, ds):
         '''
         Checks if date modified field is ISO compliant
@@ -637,6 +623,7 @@ class ACDD1_3Check(ACDDNCCheck):
         date_modified_check, msgs = datetime_is_iso(getattr(ds, u'date_modified'))
         return Result(BaseCheck.MEDIUM, date_modified_check, 'date_modified_is_iso', msgs)
 
+    @max_priority(BaseCheck.MEDIUM)
     def check_date_issued_is_iso(self, ds):
         '''
         Checks if date issued field is ISO compliant
@@ -648,6 +635,7 @@ class ACDD1_3Check(ACDDNCCheck):
         date_issued_check, msgs = datetime_is_iso(getattr(ds, u'date_issued'))
         return Result(BaseCheck.MEDIUM, date_issued_check, 'date_issued_is_iso', msgs)
 
+    @max_priority(BaseCheck.MEDIUM)
     def check_date_metadata_modified_is_iso(self, ds):
         '''
         Checks if date metadata modified field is ISO compliant
@@ -659,6 +647,7 @@ class ACDD1_3Check(ACDDNCCheck):
         date_metadata_modified_check, msgs = datetime_is_iso(getattr(ds, u'date_metadata_modified'))
         return Result(BaseCheck.MEDIUM, date_metadata_modified_check, 'date_metadata_modified_is_iso', msgs)
 
+    @max_priority(BaseCheck.MEDIUM)
     def check_id_has_no_blanks(self, ds):
         '''
         Check if there are blanks in the id field
@@ -673,6 +662,7 @@ class ACDD1_3Check(ACDDNCCheck):
         else:
             return Result(BaseCheck.MEDIUM, True, 'no_blanks_in_id', msgs=[])
 
+    @max_priority(BaseCheck.MEDIUM)
     def check_date_created(self, ds):
         '''
         Check if date created is ISO-8601
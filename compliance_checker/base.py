@@ -12,6 +12,8 @@ from owslib.swe.observation.sos100 import SensorObservationService_1_0_0
 from owslib.swe.sensor.sml import SensorML
 from owslib.namespaces import Namespaces
 from compliance_checker import __version__, MemoizedDataset
+from compliance_checker.header import HeaderDataset
+from compliance_checker.sos import CapabilitiesDocument, SensorMLDocument
 from lxml import etree
 import sys
 
@@ -49,6 +51,21 @@ class BaseCheck(object):
 
     supported_ds = []
 
+    # check method name -> section of the standard it covers, e.g. '4.3.1',
+    # for checkers which allow selecting checks by section
+    _cc_check_sections = {}
+
+    # lowest priority of the results which will be kept, set by the CheckSuite
+    # before setup.  Checks can skip the work for results below it.
+    priority_limit = LOW
+
+    def keeps(self, priority):
+        """
+        Returns True if results of the given priority will be kept, so checks
+        mixing priorities can skip tests whose results would be discarded.
+        """
+        return priority >= self.priority_limit
+
     def setup(self, ds):
         """
         Common setup method for a Checker.
@@ -62,7 +79,7 @@ class BaseNCCheck(object):
     """
     Base Class for NetCDF Dataset supporting Check Suites.
     """
-    supported_ds = {Dataset, MemoizedDataset}
+    supported_ds = {Dataset, MemoizedDataset, HeaderDataset}
 
     @classmethod
     def std_check_in(cls, dataset, name, allowed_vals):
@@ -87,14 +104,14 @@ class BaseSOSGCCheck(object):
     """
     Base class for SOS-GetCapabilities supporting Check Suites.
     """
-    supported_ds = [SensorObservationService_1_0_0]
+    supported_ds = [SensorObservationService_1_0_0, CapabilitiesDocument]
 
 
 class BaseSOSDSCheck(object):
     """
     Base class for SOS-DescribeSensor supporting Check Suites.
     """
-    supported_ds = [SensorML]
+    supported_ds = [SensorML, SensorMLDocument]
 
 
 class Result(object):
@@ -352,11 +369,63 @@ def check_has(priority=BaseCheck.HIGH, gname=None):
                 attr_check(l, ds, priority, ret_val, gname)
             return ret_val
 
-        return wraps(func)(_dec)
+        _dec = wraps(func)(_dec)
+        # keep the attribute list and how it is checked so the checks can
+        # also be run over many datasets at once, see compliance_checker.batch
+        _dec._cc_attr_check = (func, priority, gname)
+        _dec._cc_max_priority = priority
+        return _dec
+
+    return _inner
+
+
+def io_bound(func):
+    """
+    Decorator to mark a check method as spending most of its time reading
+    variable data, e.g. over OPeNDAP.  When a CheckSuite is run with more
+    than one worker thread, checks marked this way are dispatched to a thread
+    pool so that their reads can overlap.
+    :param function func: check method to mark"""
+    func._cc_io_bound = True
+    return func
+
+
+def validates_data(func):
+    """
+    Decorator to mark a check method which validates the values of variables
+    themselves rather than the metadata describing them.  These checks read
+    every value of the variables they check, so they are opt in: a
+    CheckSuite only runs them with `check_data`, or when they are named in
+    `only_checks`.
+    :param function func: check method to mark"""
+    func._cc_validates_data = True
+    return func
+
 
+def max_priority(priority):
+    """
+    Decorator to declare the highest priority of the results a check method
+    returns.  A CheckSuite doesn't run the check at all when only results of
+    a higher priority are kept, e.g. low priority checks with the normal
+    criteria.  Checks using `check_has` declare its priority automatically.
+    :param int priority: BaseCheck.HIGH, MEDIUM or LOW"""
+    def _inner(func):
+        func._cc_max_priority = priority
+        return func
     return _inner
 
 
+def thread_unsafe(func):
+    """
+    Decorator to mark a check method which must not run concurrently with any
+    other check, e.g. because it mutates shared checker state.  When a
+    CheckSuite is run with worker threads, these checks run on the calling
+    thread after all other checks have finished.
+    :param function func: check method to mark"""
+    func._cc_thread_safe = False
+    return func
+
+
 def fix_return_value(v, method_name, method=None, checker=None):
     """
     Transforms scalar return values into Result.
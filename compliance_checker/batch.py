@@ -0,0 +1,457 @@
+'''
+Attribute checks over many datasets at once
+
+Checking the discovery metadata of a large, homogeneous archive one dataset
+and one attribute at a time repeats the same work over and over: most
+datasets share most of their attribute values.  An AttributeTable holds the
+global and variable attributes of many datasets in columns, one per
+attribute, with each column storing every distinct value once and an array
+of codes saying which value each dataset has.  The checks decorated with
+`check_has` are then evaluated a column at a time: the presence of an
+attribute is a comparison over the code array and each distinct value is
+only tested once, however many datasets share it.
+
+run_attribute_checks returns, for each dataset, the same Results that calling
+the check methods on the dataset itself would.  A CheckSuite takes the
+results of its attribute checks from a BatchResults while it runs each of
+the datasets of a table in turn, see CheckSuite.batch_attribute_checks.
+'''
+from __future__ import unicode_literals
+import inspect
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from netCDF4 import Dataset
+
+from compliance_checker.base import Result, attr_check, fix_return_value
+from compliance_checker.protocols import netcdf
+
+
+def _value_key(value):
+    # hashable key of an attribute value, so equal values share a code
+    if isinstance(value, np.ndarray):
+        return (type(value), value.dtype.str, value.shape, value.tobytes())
+    try:
+        hash(value)
+    except TypeError:
+        return (type(value), repr(value))
+    # keep 1, 1.0 and True apart
+    return (type(value), value)
+
+
+def _not_blank(value):
+    # as in attr_check: strings must have something besides whitespace,
+    # anything without a strip method is fine
+    try:
+        return bool(value.strip())
+    except AttributeError:
+        return True
+
+
+class AttributeColumn(object):
+    '''
+    The values of one attribute across the datasets of an AttributeTable
+
+    :param str name: Attribute name
+    :param int size: Number of datasets
+    '''
+
+    def __init__(self, name, size):
+        self.name = name
+        # index into values for each dataset, -1 where the attribute is
+        # missing
+        self.codes = np.full(size, -1, dtype=np.intp)
+        self.values = []
+        self._keys = {}
+
+    def set(self, row, value):
+        key = _value_key(value)
+        code = self._keys.get(key)
+        if code is None:
+            code = self._keys[key] = len(self.values)
+            self.values.append(value)
+        self.codes[row] = code
+
+    def get(self, row):
+        '''
+        Returns the value of a dataset, raising AttributeError if it doesn't
+        have the attribute
+        '''
+        code = self.codes[row]
+        if code < 0:
+            raise AttributeError(self.name)
+        return self.values[code]
+
+    @property
+    def present(self):
+        '''
+        Boolean array, True for the datasets which have the attribute
+        '''
+        return self.codes >= 0
+
+    def apply(self, func, dtype=bool):
+        '''
+        Returns an array of func applied to the value of each dataset,
+        calling func only once per distinct value.  Datasets without the
+        attribute get zero (False).
+
+        :param func: Function of an attribute value
+        :param dtype: Data type of the returned array
+        '''
+        mapped = np.zeros(len(self.values) + 1, dtype=dtype)
+        for code, value in enumerate(self.values):
+            mapped[code] = func(value)
+        # missing attributes have the code -1, picking the trailing zero
+        return mapped[self.codes]
+
+
+class AttributeTable(object):
+    '''
+    Global and variable attributes of many datasets, stored in columns
+
+    :param list sources: Names of the datasets, usually their paths
+    '''
+
+    def __init__(self, sources):
+        self.sources = list(sources)
+        # (variable name or None for global attributes, attribute name)
+        # -> AttributeColumn
+        self._columns = OrderedDict()
+        # variable names of each dataset, as tuples
+        self._variables = AttributeColumn('variables', len(self.sources))
+        # rows of the datasets whose attributes couldn't be read
+        self.unreadable = set()
+
+    def __len__(self):
+        return len(self.sources)
+
+    def column(self, name, variable=None):
+        '''
+        Returns the column of a global attribute, or of a variable attribute
+        if variable is given.  Attributes no dataset has get an empty column.
+
+        :param str name: Attribute name
+        :param str variable: Variable name
+        '''
+        column = self._columns.get((variable, name))
+        if column is None:
+            column = AttributeColumn(name, len(self))
+        return column
+
+    def set_attributes(self, row, attributes, variable=None):
+        '''
+        Sets the global attributes of a dataset, or the attributes of one of
+        its variables
+
+        :param int row: Index of the dataset
+        :param dict attributes: Attribute names to values
+        :param str variable: Variable name
+        '''
+        for name, value in attributes.items():
+            key = (variable, name)
+            if key not in self._columns:
+                self._columns[key] = AttributeColumn(name, len(self))
+            self._columns[key].set(row, value)
+
+    def set_variables(self, row, variables):
+        '''
+        Sets the attributes of all the variables of a dataset
+
+        :param int row: Index of the dataset
+        :param dict variables: Variable names to dicts of their attributes
+        '''
+        self._variables.set(row, tuple(variables))
+        for variable, attributes in variables.items():
+            self.set_attributes(row, attributes, variable)
+
+    def dataset(self, row):
+        '''
+        Returns a dataset-like view of the attributes of one dataset
+        '''
+        return DatasetAttributes(self, row)
+
+    @classmethod
+    def from_datasets(cls, datasets):
+        '''
+        Builds a table from open datasets, netCDF4 or header-only
+
+        :param list datasets: Datasets to read the attributes of
+        '''
+        datasets = list(datasets)
+        table = cls([ds.filepath() for ds in datasets])
+        for row, ds in enumerate(datasets):
+            table.set_attributes(row, _ncattrs(ds))
+            table.set_variables(row, OrderedDict(
+                (name, _ncattrs(var)) for name, var in ds.variables.items()))
+        return table
+
+    @classmethod
+    def from_paths(cls, paths):
+        '''
+        Builds a table from netCDF files.  Only the header of classic format
+        files is read, without the netCDF library; other files are opened
+        with netCDF4 one at a time.  The rows of files which can't be opened
+        are kept in `unreadable`.
+
+        :param list paths: Paths to the netCDF files
+        '''
+        paths = list(paths)
+        table = cls(paths)
+        for row, path in enumerate(paths):
+            try:
+                try:
+                    header = netcdf.read_classic_header(path)
+                except netcdf.ClassicHeaderError:
+                    header = None
+                    ds = Dataset(path)
+            except (IOError, OSError):
+                # left in the table without any attributes
+                table.unreadable.add(row)
+                continue
+            if header is None:
+                try:
+                    table.set_attributes(row, _ncattrs(ds))
+                    table.set_variables(row, OrderedDict(
+                        (name, _ncattrs(var))
+                        for name, var in ds.variables.items()))
+                finally:
+                    ds.close()
+            else:
+                table.set_attributes(row, header.attributes)
+                table.set_variables(row, OrderedDict(
+                    (var.name, var.attributes) for var in header.variables))
+        return table
+
+
+def _ncattrs(obj):
+    return OrderedDict((name, obj.getncattr(name)) for name in obj.ncattrs())
+
+
+class DatasetAttributes(object):
+    '''
+    The attributes of one dataset in an AttributeTable, exposed the way a
+    netCDF4 Dataset (or Variable, if variable is given) exposes them.  Used to
+    run checks which can't be evaluated a column at a time.
+    '''
+
+    def __init__(self, table, row, variable=None):
+        self._table = table
+        self._row = row
+        self._variable = variable
+        if variable is not None:
+            self.name = variable
+
+    def filepath(self):
+        return self._table.sources[self._row]
+
+    def ncattrs(self):
+        return [name for (variable, name), column in self._table._columns.items()
+                if variable == self._variable and column.codes[self._row] >= 0]
+
+    def getncattr(self, name):
+        return self._table.column(name, self._variable).get(self._row)
+
+    def __getattr__(self, name):
+        # only called when normal attribute lookup fails
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self.getncattr(name)
+
+    @property
+    def variables(self):
+        if self._variable is not None:
+            raise AttributeError('variables')
+        code = self._table._variables.codes[self._row]
+        names = self._table._variables.values[code] if code >= 0 else ()
+        return OrderedDict((name, DatasetAttributes(self._table, self._row, name))
+                           for name in names)
+
+
+def attribute_checks(checker):
+    '''
+    Returns the (name, bound method) of the check methods of a checker which
+    check for attributes with `check_has`, and so can be run over an
+    AttributeTable
+
+    :param checker: Checker instance
+    '''
+    return [(name, method) for name, method in
+            inspect.getmembers(checker, inspect.ismethod)
+            if name.startswith('check_') and hasattr(method, '_cc_attr_check')]
+
+
+def _group_rows(checker, func, table):
+    '''
+    Groups the datasets of the table by the attribute list the check
+    function returns for them, which is usually the same for all of them
+    '''
+    groups = []
+    for row in range(len(table)):
+        attrs = func(checker, table.dataset(row))
+        for group_attrs, rows in groups:
+            if attrs is group_attrs or attrs == group_attrs:
+                rows.append(row)
+                break
+        else:
+            groups.append((attrs, [row]))
+    return groups
+
+
+def _evaluator(spec, table, priority, gname, check_name, method, checker):
+    '''
+    Evaluates an attr_check attribute specification over all the datasets of
+    the table, see compliance_checker.base.attr_check.  Returns a function
+    building the Result of a dataset, given its row.
+    '''
+    if isinstance(spec, tuple):
+        name, other = spec
+        if not hasattr(other, '__iter__'):
+            # XPaths and functions of the dataset can't be evaluated a
+            # column at a time
+            return lambda row: fix_return_value(
+                attr_check(spec, table.dataset(row), priority, [], gname)[0],
+                check_name, method, checker)
+
+        column = table.column(name)
+        allowed = column.apply(lambda value: value in other)
+        res = (column.present.astype(int) + allowed).tolist()
+        messages = {0: ["%s not present" % name],
+                    1: ["%s present, but not in expected value list (%s)" % (name, other)],
+                    2: []}
+        return lambda row: Result(priority, (res[row], 2),
+                                  gname if gname else name,
+                                  list(messages[res[row]]),
+                                  checker=checker, check_method=method)
+
+    column = table.column(spec)
+    present = column.present.tolist()
+    filled = column.apply(_not_blank).tolist()
+    missing = "%s not present" % spec
+    blank = "%s is empty or completely whitespace" % spec
+
+    def result(row):
+        ok = filled[row]
+        return Result(priority, value=ok, name=gname if gname else spec,
+                      msgs=[] if ok else [blank if present[row] else missing],
+                      checker=checker, check_method=method)
+    return result
+
+
+def iter_attribute_checks(checker, table, check_names=None):
+    '''
+    Runs the attribute checks of a checker over all the datasets of a table
+
+    Every attribute is evaluated for all datasets up front, and then a dict
+    of check method name to the list of Results the check method returns
+    for the dataset is yielded for each dataset, in the order of the table.
+    The Results of a dataset are only built when it is reached, so they
+    needn't all be held at once.
+
+    :param checker: Checker instance
+    :param AttributeTable table: Attributes of the datasets
+    :param list check_names: Names of the check methods to run, defaults to
+                             all of the checker's attribute checks
+    '''
+    plans = []
+    for check_name, method in attribute_checks(checker):
+        if check_names is not None and check_name not in check_names:
+            continue
+        func, priority, gname = method._cc_attr_check
+        group_of = [None] * len(table)
+        evaluators = []
+        for group, (attrs, rows) in enumerate(_group_rows(checker, func, table)):
+            for row in rows:
+                group_of[row] = group
+            evaluators.append([_evaluator(spec, table, priority, gname,
+                                          check_name, method, checker)
+                               for spec in attrs])
+        plans.append((check_name, group_of, evaluators))
+
+    for row in range(len(table)):
+        yield OrderedDict((check_name, [make(row) for make in evaluators[group_of[row]]])
+                          for check_name, group_of, evaluators in plans)
+
+
+def run_attribute_checks(checker, table, check_names=None):
+    '''
+    Returns a list with a dict for each dataset of the table, of check method
+    name to the list of Results the check method returns for the dataset.
+    See iter_attribute_checks.
+    '''
+    return list(iter_attribute_checks(checker, table, check_names))
+
+
+class BatchResults(object):
+    '''
+    The Results of the attribute checks of every checker over the datasets
+    of a table, handed out a dataset at a time in the order of the table.
+    The checks of a checker are evaluated for all datasets the first time
+    one of them is asked for, see iter_attribute_checks.
+
+    :param AttributeTable table: Attributes of the datasets
+    :param int limit: Priority limit of the checkers, see
+                      BaseCheck.priority_limit, or None
+    '''
+
+    def __init__(self, table, limit=None):
+        self.table = table
+        self.limit = limit
+        self.rows = dict((source, row) for row, source
+                         in reversed(list(enumerate(table.sources))))
+        self.row = None
+        # checker class -> [results of each dataset, row of the next one,
+        #                   results of the current row]
+        self._checkers = {}
+        self._lock = threading.Lock()
+
+    def select(self, source):
+        '''
+        Makes the dataset of a source the current one, returning False if
+        the table has no attributes for it.  The results of a checker are
+        handed out in the order of the table, so a dataset selected after
+        a later one gets none.
+
+        :param str source: Name of the dataset in the table
+        '''
+        row = self.rows.get(source)
+        if row is None or row in self.table.unreadable:
+            self.row = None
+            return False
+        self.row = row
+        return True
+
+    def results(self, checker_class, check_name):
+        '''
+        Returns the list of Results of a check method for the current
+        dataset, or None if it isn't an attribute check or there is no
+        current dataset
+
+        :param type checker_class: Class of the checker
+        :param str check_name: Name of the check method
+        '''
+        with self._lock:
+            if self.row is None:
+                return None
+            state = self._checkers.get(checker_class)
+            if state is None:
+                checker = checker_class()
+                if self.limit is not None:
+                    checker.priority_limit = self.limit
+                state = [iter_attribute_checks(checker, self.table), 0, None]
+                self._checkers[checker_class] = state
+            elif not state:
+                return None
+            if state[1] > self.row + 1:
+                # already past this dataset
+                return None
+            try:
+                while state[1] <= self.row:
+                    state[2] = next(state[0])
+                    state[1] += 1
+            except Exception:
+                # e.g. an attribute list which fails for one of the
+                # datasets; the checks are then run on each dataset itself
+                self._checkers[checker_class] = False
+                return None
+            return state[2].get(check_name)
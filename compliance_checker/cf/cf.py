@@ -1,12 +1,15 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals, division, print_function
-from compliance_checker.base import BaseCheck, BaseNCCheck, Result, TestCtx
+from compliance_checker.base import (BaseCheck, BaseNCCheck, Result, TestCtx,
+                                     io_bound, max_priority, validates_data)
 from compliance_checker.cf.appendix_d import (dimless_vertical_coordinates,
                                               no_missing_terms)
 from compliance_checker.cf.appendix_f import grid_mapping_dict
 from compliance_checker.cf import util
 from compliance_checker import cfutil
+from compliance_checker.inputs import (requires, get_input, read_chunks,
+                                      sample_note)
 from cf_units import Unit
 from functools import wraps
 from collections import defaultdict
@@ -66,6 +69,54 @@ class CFBaseCheck(BaseCheck):
         2: 'Warnings',
         1: 'Info'
     }
+    # the section of the conventions each check method covers, for selecting
+    # checks by section
+    _cc_check_sections = {
+        'check_data_types': '2.2',
+        'check_naming_conventions': '2.3',
+        'check_names_unique': '2.3',
+        'check_dimension_names': '2.4',
+        'check_dimension_order': '2.4',
+        'check_fill_value_outside_valid_range': '2.5.1',
+        'check_data_valid_range': '2.5.1',
+        'check_conventions_are_cf_16': '2.6.1',
+        'check_convention_globals': '2.6.2',
+        'check_convention_possibly_var_attrs': '2.6.2',
+        'check_units': '3.1',
+        'check_standard_name': '3.3',
+        'check_ancillary_variables': '3.4',
+        'check_flags': '3.5',
+        'check_data_flag_values': '3.5',
+        'check_coordinate_types': '4',
+        'check_data_coordinates_monotonic': '4',
+        'check_latitude': '4.1',
+        'check_longitude': '4.2',
+        'check_dimensional_vertical_coordinate': '4.3.1',
+        'check_dimensionless_vertical_coordinate': '4.3.2',
+        'check_time_coordinate': '4.4',
+        'check_calendar': '4.4.1',
+        'check_aux_coordinates': '5',
+        'check_duplicate_axis': '5',
+        'check_multi_dimensional_coords': '5',
+        'check_reduced_horizontal_grid': '5.3',
+        'check_grid_coordinates': '5.6',
+        'check_grid_mapping': '5.6',
+        'check_geographic_region': '6.1',
+        'check_cell_boundaries': '7.1',
+        'check_hints': '7.1',
+        'check_data_cell_bounds': '7.1',
+        'check_cell_measures': '7.2',
+        'check_cell_methods': '7.3',
+        'check_climatological_statistics': '7.4',
+        'check_packed_data': '8.1',
+        'check_compression_gathering': '8.2',
+        'check_data_compression_indices': '8.2',
+        'check_all_features_are_same_type': '9.1',
+        'check_feature_type': '9.1',
+        'check_variable_features': '9.1',
+        'check_data_ragged_arrays': '9.3',
+        'check_cf_role': '9.5',
+    }
 
     """
     CF Convention Checker (1.6)
@@ -90,7 +141,9 @@ class CFBaseCheck(BaseCheck):
         self._geophysical_vars = defaultdict(list)
         self._aux_coords       = defaultdict(list)
 
-        self._std_names        = util.StandardNameTable()
+        self._std_name_table   = util.get_standard_name_table()
+        # dataset whose standard_name_vocabulary is still to be looked up
+        self._std_names_ds     = None
 
         self.section_titles = { # dict of section headers shared by grouped checks
             "2.2": "§2.2 Data Types",
@@ -141,19 +194,32 @@ class CFBaseCheck(BaseCheck):
 
     def setup(self, ds):
         """
-        Initialize various special variable types within the class.
-        Mutates a number of instance variables.
+        Prepares the checker for a dataset.
+
+        The special variable types of the dataset are found by the `_find_*`
+        methods the first time a check asks for them, and the standard name
+        table named by its standard_name_vocabulary the first time a check
+        uses `_std_names`, so runs of a few checks only pay for what those
+        checks use.
 
         :param netCDF4.Dataset ds: An open netCDF dataset
         """
-        self._find_coord_vars(ds)
-        self._find_aux_coord_vars(ds)
-        self._find_ancillary_vars(ds)
-        self._find_clim_vars(ds)
-        self._find_boundary_vars(ds)
-        self._find_metadata_vars(ds)
-        self._find_cf_standard_name_table(ds)
-        self._find_geophysical_vars(ds)
+        self._std_names_ds = ds
+
+    @property
+    def _std_names(self):
+        '''
+        The standard name table of the dataset being checked
+        '''
+        if self._std_names_ds is not None:
+            ds, self._std_names_ds = self._std_names_ds, None
+            self._find_cf_standard_name_table(ds)
+        return self._std_name_table
+
+    @_std_names.setter
+    def _std_names(self, table):
+        self._std_names_ds = None
+        self._std_name_table = table
 
     def _find_cf_standard_name_table(self, ds):
         '''
@@ -202,7 +268,7 @@ class CFBaseCheck(BaseCheck):
             else:
                 print("Using cached standard name table v{0} from {1}".format(version, location), file=sys.stderr)
 
-            self._std_names = util.StandardNameTable(location)
+            self._std_names = util.get_standard_name_table(location)
             return True
         except Exception as e:
             # There was an error downloading the CF table. That's ok, we'll just use the packaged version
@@ -246,7 +312,7 @@ class CFBaseCheck(BaseCheck):
         :return: List of variable names (str) that are defined to be auxiliary
                  coordinate variables.
         '''
-        if self._aux_coords.get(ds, None) and refresh is False:
+        if ds in self._aux_coords and refresh is False:
             return self._aux_coords[ds]
 
         self._aux_coords[ds] = cfutil.get_auxiliary_coordinate_variables(ds)
@@ -275,8 +341,8 @@ class CFBaseCheck(BaseCheck):
                  variables in the dataset ds.
         '''
 
-        # Used the cached version if it exists and is not empty
-        if self._ancillary_vars.get(ds, None) and refresh is False:
+        # Used the cached version if it exists
+        if ds in self._ancillary_vars and refresh is False:
             return self._ancillary_vars[ds]
 
         # Invalidate the cache at all costs
@@ -284,7 +350,7 @@ class CFBaseCheck(BaseCheck):
 
         for name, var in ds.variables.items():
             if hasattr(var, 'ancillary_variables'):
-                for anc_name in var.ancillary_variables.split(" "):
+                for anc_name in cfutil.parse_name_list(var.ancillary_variables):
                     if anc_name in ds.variables:
                         self._ancillary_vars[ds].append(anc_name)
 
@@ -307,7 +373,7 @@ class CFBaseCheck(BaseCheck):
                    variable candidates.
 
         '''
-        if self._metadata_vars.get(ds, None) and refresh is False:
+        if ds in self._metadata_vars and refresh is False:
             return self._metadata_vars[ds]
 
         self._metadata_vars[ds] = []
@@ -339,7 +405,7 @@ class CFBaseCheck(BaseCheck):
         :return: A list containing strings with geophysical variable
                  names.
         '''
-        if self._geophysical_vars.get(ds, None) and refresh is False:
+        if ds in self._geophysical_vars and refresh is False:
             return self._geophysical_vars[ds]
 
         self._geophysical_vars[ds] = cfutil.get_geophysical_variables(ds)
@@ -358,9 +424,10 @@ class CFBaseCheck(BaseCheck):
                  names.
         '''
 
-        if self._clim_vars.get(ds, None) and refresh is False:
+        if ds in self._clim_vars and refresh is False:
             return self._clim_vars[ds]
 
+        self._clim_vars[ds] = []
         climatology_variable = cfutil.get_climatology_variable(ds)
         if climatology_variable:
             self._clim_vars[ds].append(climatology_variable)
@@ -378,7 +445,7 @@ class CFBaseCheck(BaseCheck):
         :rtype: list
         :return: A list containing strings with boundary variable names.
         '''
-        if self._boundary_vars.get(ds, None) and refresh is False:
+        if ds in self._boundary_vars and refresh is False:
             return self._boundary_vars[ds]
 
         self._boundary_vars[ds] = cfutil.get_cell_boundary_variables(ds)
@@ -420,6 +487,7 @@ class CFBaseCheck(BaseCheck):
                 fails.append('The variable {} failed because the datatype is {}'.format(k, v.datatype))
         return Result(BaseCheck.HIGH, (total - len(fails), total), self.section_titles["2.2"], msgs=fails)
 
+    @max_priority(BaseCheck.MEDIUM)
     def check_naming_conventions(self, ds):
         '''
         Checks the variable names to ensure they are valid CF variable names under CF.
@@ -482,6 +550,7 @@ class CFBaseCheck(BaseCheck):
 
         return ret_val
 
+    @max_priority(BaseCheck.MEDIUM)
     def check_names_unique(self, ds):
         '''
         Checks the variable names for uniqueness regardless of case.
@@ -526,6 +595,7 @@ class CFBaseCheck(BaseCheck):
 
         return Result(BaseCheck.HIGH, (total - len(fails), total), self.section_titles['2.4'], msgs=fails)
 
+    @max_priority(BaseCheck.MEDIUM)
     def check_dimension_order(self, ds):
         '''
         Checks each variable's dimension order to ensure that the order is
@@ -723,6 +793,7 @@ class CFBaseCheck(BaseCheck):
         dimension_string = ''.join(dimension_order)
         return regx.match(dimension_string) is not None
 
+    @max_priority(BaseCheck.MEDIUM)
     def check_fill_value_outside_valid_range(self, ds):
         '''
         Checks each variable's _FillValue to ensure that it's in valid_range or
@@ -780,6 +851,53 @@ class CFBaseCheck(BaseCheck):
 
         return valid_fill_range.to_result()
 
+    def _note_sample(self, ds, ctx, name, invalid=None, count=None):
+        '''
+        Adds a note to the messages of a test context if only a sample of
+        the values of a variable it checked was read, marking the result as
+        approximate
+
+        :param netCDF4.Dataset ds: An open netCDF dataset
+        :param TestCtx ctx: Test context of the variable
+        :param str name: Name of the variable
+        :param int invalid: Number of invalid values found in the sample
+        :param int count: Number of values of the sample checked
+        '''
+        note = sample_note(ds, name, invalid, count)
+        if note is not None:
+            ctx.messages.append("{}: {}".format(name, note))
+
+    @validates_data
+    @max_priority(BaseCheck.MEDIUM)
+    @io_bound
+    @requires('value_violations')
+    def check_data_valid_range(self, ds):
+        '''
+        Checks that the values of each variable with a valid_range, or a
+        valid_min or valid_max, lie within it.  Missing values aren't
+        counted.  Reads every value of the variables, so only run on request.
+
+        CF §2.5.1 Values outside of the valid range are treated as missing,
+        so data which is meant to be valid should lie within it.
+
+        :param netCDF4.Dataset ds: An open netCDF dataset
+        :rtype: list
+        :return: List of Results
+        '''
+        ranges, _ = get_input(ds, 'value_violations')
+        if not ranges:
+            return []
+
+        valid_data = TestCtx(BaseCheck.MEDIUM, self.section_titles['2.5'])
+        for name, counter in ranges.items():
+            valid_data.assert_true(counter.invalid == 0,
+                                   "{} has {} of {} values outside of its valid range ({}, {})"
+                                   "".format(name, counter.invalid, counter.count,
+                                             counter.valid_min, counter.valid_max))
+            self._note_sample(ds, valid_data, name, counter.invalid, counter.count)
+        return [valid_data.to_result()]
+
+    @max_priority(BaseCheck.MEDIUM)
     def check_conventions_are_cf_16(self, ds):
         '''
         Check the global attribute conventions to contain CF-1.6
@@ -808,6 +926,7 @@ class CFBaseCheck(BaseCheck):
             reasoning = ['§2.6.1 Conventions field is not present']
         return Result(BaseCheck.MEDIUM, valid, self.section_titles['2.6'], msgs=reasoning)
 
+    @max_priority(BaseCheck.MEDIUM)
     def check_convention_globals(self, ds):
         '''
         Check the common global attributes are strings if they exist.
@@ -831,6 +950,7 @@ class CFBaseCheck(BaseCheck):
                                       "".format(attr))
         return valid_globals.to_result()
 
+    @max_priority(BaseCheck.MEDIUM)
     def check_convention_possibly_var_attrs(self, ds):
         """
         Check variable and global attributes are strings for recommended attributes under CF §2.6.2
@@ -1233,7 +1353,7 @@ class CFBaseCheck(BaseCheck):
                 ret_val.append(valid_ancillary.to_result())
                 continue
 
-            for ancillary_variable in ancillary_variables.split():
+            for ancillary_variable in cfutil.parse_name_list(ancillary_variables):
                 valid_ancillary.assert_true(ancillary_variable in ds.variables,
                                             "{} is not a variable in this dataset".format(ancillary_variable))
 
@@ -1311,6 +1431,41 @@ class CFBaseCheck(BaseCheck):
 
         return ret_val
 
+    @validates_data
+    @max_priority(BaseCheck.MEDIUM)
+    @io_bound
+    @requires('value_violations')
+    def check_data_flag_values(self, ds):
+        '''
+        Checks that the values of each flag variable are flags: one of its
+        flag_values, or, with flag_masks, a combination of the bits of its
+        masks.  Missing values aren't counted.  Reads every value of the
+        variables, so only run on request.
+
+        CF §3.5 The flag_values and flag_meanings attributes describe a
+        status flag consisting of mutually exclusive coded values.  The
+        flag_masks describe a number of independent Boolean conditions using
+        bit field notation.
+
+        :param netCDF4.Dataset ds: An open netCDF dataset
+        :rtype: list
+        :return: List of Results
+        '''
+        _, flags = get_input(ds, 'value_violations')
+        if not flags:
+            return []
+
+        valid_data = TestCtx(BaseCheck.MEDIUM, self.section_titles['3.5'])
+        for name, counter in flags.items():
+            if counter.bits is not None:
+                message = "{} has {} of {} values with bits outside of its flag_masks"
+            else:
+                message = "{} has {} of {} values which aren't one of its flag_values"
+            valid_data.assert_true(counter.invalid == 0,
+                                   message.format(name, counter.invalid, counter.count))
+            self._note_sample(ds, valid_data, name, counter.invalid, counter.count)
+        return [valid_data.to_result()]
+
     def _check_flag_values(self, ds, name):
         '''
         Checks a variable's flag_values attribute for compliance under CF
@@ -1349,7 +1504,7 @@ class CFBaseCheck(BaseCheck):
                                  "".format(flag_values.dtype, name, variable.dtype))
 
         if isinstance(flag_meanings, basestring):
-            flag_meanings = flag_meanings.split()
+            flag_meanings = cfutil.parse_name_list(flag_meanings)
             valid_values.assert_true(len(flag_meanings) == len(flag_values),
                                      "{}'s flag_meanings and flag_values should have the same number ".format(name)+\
                                      "of elements.")
@@ -1393,7 +1548,7 @@ class CFBaseCheck(BaseCheck):
         valid_masks.assert_true(type_ok, "{}'s data type must be capable of bit-field expression".format(name))
 
         if isinstance(flag_meanings, basestring):
-            flag_meanings = flag_meanings.split()
+            flag_meanings = cfutil.parse_name_list(flag_meanings)
             valid_masks.assert_true(len(flag_meanings) == len(flag_masks),
                                     "{} flag_meanings and flag_masks should have the same number ".format(name)+\
                                     "of elements.")
@@ -1430,8 +1585,7 @@ class CFBaseCheck(BaseCheck):
                                    "{}'s flag_meanings can't be empty".format(name))
 
         flag_regx = regex.compile("^[0-9A-Za-z_\-.+@]+$")
-        meanings = flag_meanings.split()
-        for meaning in meanings:
+        for meaning in cfutil.parse_name_list(flag_meanings):
             if flag_regx.match(meaning) is None:
                 valid_meanings.assert_true(False,
                                            "{}'s flag_meanings attribute defined an illegal flag meaning ".format(name)+\
@@ -1487,6 +1641,39 @@ class CFBaseCheck(BaseCheck):
 
         return ret_val
 
+    @validates_data
+    @io_bound
+    @requires('coordinate_values')
+    def check_data_coordinates_monotonic(self, ds):
+        '''
+        Checks that the values of each numeric coordinate variable are
+        strictly monotonic, comparing every value with the one before.
+        Reads every value of the coordinate variables, so only run on
+        request.
+
+        CF §1.2 A coordinate variable is a one-dimensional variable with the
+        same name as its dimension, defined as a numeric data type with
+        values that are ordered monotonically. Missing values are not
+        allowed in coordinate variables.
+
+        :param netCDF4.Dataset ds: An open netCDF dataset
+        :rtype: list
+        :return: List of results
+        '''
+        order, _ = get_input(ds, 'coordinate_values')
+        if not order:
+            return []
+
+        monotonic = TestCtx(BaseCheck.HIGH, self.section_titles['4'])
+        for name, counter in order.items():
+            monotonic.assert_true(counter.monotonic,
+                                  "The values of coordinate variable {} are not strictly "
+                                  "monotonic: of {} steps, {} increase and {} decrease"
+                                  "".format(name, counter.count - 1, counter.increasing,
+                                            counter.decreasing))
+            self._note_sample(ds, monotonic, name)
+        return [monotonic.to_result()]
+
     def _check_axis(self, ds, name):
         '''
         Checks that the axis attribute is a string and an allowed value, namely
@@ -1572,6 +1759,10 @@ class CFBaseCheck(BaseCheck):
                                        "latitude variable '{}' must define units".format(latitude))
             ret_val.append(valid_latitude.to_result())
 
+            # the remaining results are of medium and low priority
+            if not self.keeps(BaseCheck.MEDIUM):
+                continue
+
             # Check that latitude uses allowed units
             allowed_units = TestCtx(BaseCheck.MEDIUM, self.section_titles['4.1'])
             if standard_name == 'grid_latitude':
@@ -1589,7 +1780,8 @@ class CFBaseCheck(BaseCheck):
             ret_val.append(allowed_units.to_result())
 
             # Check that latitude uses degrees_north
-            if standard_name == 'latitude' and units != 'degrees_north':
+            if (self.keeps(BaseCheck.LOW) and
+                    standard_name == 'latitude' and units != 'degrees_north'):
                 # This is only a recommendation and we won't penalize but we
                 # will include a recommended action.
                 msg = ("CF recommends latitude variable '{}' to use units degrees_north"
@@ -1667,6 +1859,10 @@ class CFBaseCheck(BaseCheck):
                                         "longitude variable '{}' must define units".format(longitude))
             ret_val.append(valid_longitude.to_result())
 
+            # the remaining results are of medium and low priority
+            if not self.keeps(BaseCheck.MEDIUM):
+                continue
+
             # Check that longitude uses allowed units
             allowed_units = TestCtx(BaseCheck.MEDIUM, self.section_titles['4.1'])
             if standard_name == 'grid_longitude':
@@ -1684,7 +1880,8 @@ class CFBaseCheck(BaseCheck):
             ret_val.append(allowed_units.to_result())
 
             # Check that longitude uses degrees_east
-            if standard_name == 'longitude' and units != 'degrees_east':
+            if (self.keeps(BaseCheck.LOW) and
+                    standard_name == 'longitude' and units != 'degrees_east'):
                 # This is only a recommendation and we won't penalize but we
                 # will include a recommended action.
                 msg = ("CF recommends longitude variable '{}' to use units degrees_east"
@@ -1800,12 +1997,13 @@ class CFBaseCheck(BaseCheck):
                 standard_name not in dimless_vertical_coordinates):
                 continue
 
-            is_not_deprecated = TestCtx(BaseCheck.LOW, self.section_titles["4.3"])
+            if self.keeps(BaseCheck.LOW):
+                is_not_deprecated = TestCtx(BaseCheck.LOW, self.section_titles["4.3"])
 
-            is_not_deprecated.assert_true(units not in deprecated_units,
-                                          "§4.3.2: units are deprecated by CF in variable {}: {}"
-                                          "".format(name, units))
-            ret_val.append(is_not_deprecated.to_result())
+                is_not_deprecated.assert_true(units not in deprecated_units,
+                                              "§4.3.2: units are deprecated by CF in variable {}: {}"
+                                              "".format(name, units))
+                ret_val.append(is_not_deprecated.to_result())
             ret_val.append(self._check_formula_terms(ds, name))
 
         return ret_val
@@ -1835,22 +2033,17 @@ class CFBaseCheck(BaseCheck):
 
         # check that the formula_terms are well formed and are present
         # The pattern for formula terms is always component: variable_name
-        # the regex grouping always has component names in even positions and
-        # the corresponding variable name in even positions.
-        matches = regex.findall(r'([A-Za-z][A-Za-z0-9_]*: )([A-Za-z][A-Za-z0-9_]*)',
-                                variable.formula_terms)
-        terms = set(m[0][:-2] for m in matches)
+        parsed = cfutil.parse_formula_terms(formula_terms)
+        terms = set(term for term, _ in parsed.terms)
         # get the variables named in the formula terms and check if any
         # are not present in the dataset
-        missing_vars = sorted(set(m[1] for m in matches) - set(ds.variables))
+        missing_vars = sorted(set(name for _, name in parsed.terms) - set(ds.variables))
         missing_fmt = "The following variable(s) referenced in formula_terms are not present in the dataset: {}".format(coord)
         valid_formula_terms.assert_true(len(missing_vars) == 0,
                                     missing_fmt.format(', '.join(missing_vars)))
-        # try to reconstruct formula_terms by adding space in between the regex
-        # matches.  If it doesn't exactly match the original, the formatting
-        # of the attribute is incorrect
-        reconstructed_formula = ' '.join(m[0] + m[1] for m in matches)
-        valid_formula_terms.assert_true(reconstructed_formula == formula_terms,
+        # If the terms joined by single spaces don't exactly match the
+        # original, the formatting of the attribute is incorrect
+        valid_formula_terms.assert_true(parsed.well_formed,
                                         "Attribute formula_terms is not well-formed")
 
         valid_formula_terms.assert_true(standard_name in
@@ -1927,6 +2120,7 @@ class CFBaseCheck(BaseCheck):
 
         return ret_val
 
+    @max_priority(BaseCheck.LOW)
     def check_calendar(self, ds):
         '''
         Check the calendar attribute for variables defining time and ensure it
@@ -2063,7 +2257,7 @@ class CFBaseCheck(BaseCheck):
             valid_aux_coords = TestCtx(BaseCheck.HIGH,
                                       self.section_titles["5"])
 
-            for aux_coord in coordinates.split():
+            for aux_coord in cfutil.parse_name_list(coordinates):
                 valid_aux_coords.assert_true(aux_coord in ds.variables,
                                              "{}'s auxiliary coordinate specified by the coordinates attribute, {}, "
                                              "is not a variable in this dataset"
@@ -2130,6 +2324,7 @@ class CFBaseCheck(BaseCheck):
 
         return ret_val
 
+    @max_priority(BaseCheck.MEDIUM)
     def check_multi_dimensional_coords(self, ds):
         '''
         Checks that no multidimensional coordinate shares a name with its
@@ -2269,7 +2464,7 @@ class CFBaseCheck(BaseCheck):
             if not isinstance(coords, basestring) and coords:
                 continue
 
-            coord_set = set(coords.split())
+            coord_set = set(cfutil.parse_name_list(coords))
 
             # Make sure it's associated with valid lat and valid lon
             valid_rgrid.assert_true(len(coord_set.intersection(lons)) > 0,
@@ -2288,7 +2483,7 @@ class CFBaseCheck(BaseCheck):
                                         "".format(compressed_coord))
                 if not isinstance(compress, basestring):
                     continue
-                for dim in compress.split():
+                for dim in cfutil.parse_name_list(compress):
                     valid_rgrid.assert_true(dim in ds.dimensions,
                                             "dimension {} referenced by {}:compress must exist"
                                             "".format(dim, compressed_coord))
@@ -2419,6 +2614,8 @@ class CFBaseCheck(BaseCheck):
     #
     ###############################################################################
 
+    @max_priority(BaseCheck.MEDIUM)
+    @io_bound
     def check_geographic_region(self, ds):
         """
         6.1.1 When data is representative of geographic regions which can be identified by names but which have complex
@@ -2505,14 +2702,20 @@ class CFBaseCheck(BaseCheck):
             'yellow_sea'
         ]
 
+        longest = max(len(region) for region in region_list)
         for var in ds.get_variables_by_attributes(standard_name='region'):
             valid_region = TestCtx(BaseCheck.MEDIUM, self.section_titles["6.1"])
-            region = var[:]
-            if np.ma.isMA(region):
-                region = region.data
-            valid_region.assert_true(''.join(region.astype(str)).lower() in region_list,
+            # labels longer than any region name can't be one, so they are
+            # only read as far as that
+            region = ''
+            for values in read_chunks(ds, var.name):
+                region += ''.join(np.ma.getdata(values).astype(str))
+                if len(region) > longest:
+                    region = region[:longest] + '...'
+                    break
+            valid_region.assert_true(region.lower() in region_list,
                                      "6.1.1 '{}' specified by '{}' is not a valid region".format(
-                                         ''.join(region.astype(str)), var.name
+                                         region, var.name
                                          )
                                     )
             ret_val.append(valid_region.to_result())
@@ -2524,6 +2727,7 @@ class CFBaseCheck(BaseCheck):
     #
     ###############################################################################
 
+    @max_priority(BaseCheck.MEDIUM)
     def check_cell_boundaries(self, ds):
         """
         Checks the dimensions of cell boundary variables to ensure they are CF compliant.
@@ -2616,6 +2820,40 @@ class CFBaseCheck(BaseCheck):
             ret_val.append(result)
         return ret_val
 
+    @validates_data
+    @max_priority(BaseCheck.MEDIUM)
+    @io_bound
+    @requires('coordinate_values')
+    def check_data_cell_bounds(self, ds):
+        """
+        Checks that the values of each coordinate variable with a bounds or
+        climatology variable lie within their cells, between the lowest and
+        highest vertex of the cell.  Missing values aren't counted.  Reads
+        every value of the coordinate and boundary variables, so only run on
+        request.
+
+        CF §7.1 The boundary variable contains the vertices of the cell
+        boundaries of each point of the coordinate variable.
+
+        :param netCDF4.Dataset ds: An open netCDF dataset
+        :rtype: list
+        :return: List of results
+        """
+        _, cells = get_input(ds, 'coordinate_values')
+        ret_val = []
+        for name, counter in cells.items():
+            variable = ds.variables[name]
+            boundary = getattr(variable, 'bounds', None) or variable.climatology
+            within_cells = TestCtx(BaseCheck.MEDIUM, self.section_titles['7.1'])
+            within_cells.assert_true(counter.invalid == 0,
+                                     "{} of {} values of {} lie outside of their cells in "
+                                     "boundary variable {}"
+                                     "".format(counter.invalid, counter.count, name, boundary))
+            self._note_sample(ds, within_cells, name, counter.invalid, counter.count)
+            ret_val.append(within_cells.to_result())
+        return ret_val
+
+    @max_priority(BaseCheck.MEDIUM)
     def check_cell_measures(self, ds):
         """
         7.2 To indicate extra information about the spatial properties of a
@@ -2642,9 +2880,8 @@ class CFBaseCheck(BaseCheck):
         variables = ds.get_variables_by_attributes(cell_measures=lambda c:
                                                    c is not None)
         for var in variables:
-            search_str = '^(?:area|volume): (\w+)$'
-            search_res = regex.search(search_str, var.cell_measures)
-            if not search_res:
+            cell_measure = cfutil.parse_cell_measures(var.cell_measures)
+            if cell_measure is None:
                 valid = False
                 reasoning.append("The cell_measures attribute for variable {} "
                                  "is formatted incorrectly.  It should take the"
@@ -2654,8 +2891,7 @@ class CFBaseCheck(BaseCheck):
                                      var.name))
             else:
                 valid = True
-                cell_meas_var_name = search_res.groups()[0]
-                # TODO: cache previous results
+                cell_meas_var_name = cell_measure.variable
                 if cell_meas_var_name not in ds.variables:
                     valid = False
                     reasoning.append(
@@ -2728,18 +2964,17 @@ class CFBaseCheck(BaseCheck):
         }
 
         ret_val = []
-        psep = regex.compile(r'(?P<vars>\w+: )+(?P<method>\w+) ?(?P<where>where (?P<wtypevar>\w+) '
-                             '?(?P<over>over (?P<otypevar>\w+))?| ?)(?:\((?P<paren_contents>[^)]*)\))?')
 
         for var in ds.get_variables_by_attributes(cell_methods=lambda x: x is not None):
             if not getattr(var, 'cell_methods', ''):
                 continue
 
             method = getattr(var, 'cell_methods', '')
+            cell_methods = cfutil.parse_cell_methods(method)
 
             valid_attribute = TestCtx(BaseCheck.HIGH,
                                       self.section_titles['7.1'])
-            valid_attribute.assert_true(regex.match(psep, method) is not None,
+            valid_attribute.assert_true(cell_methods.well_formed,
                                         '"{}" is not a valid format for cell_methods attribute of "{}"'
                                         ''.format(method, var.name))
             ret_val.append(valid_attribute.to_result())
@@ -2748,12 +2983,10 @@ class CFBaseCheck(BaseCheck):
                                        self.section_titles['7.3'])
 
             # check that the name is valid
-            for match in regex.finditer(psep, method):
+            for cell_method in cell_methods.methods:
                 # it is possible to have "var1: var2: ... varn: ...", so handle
                 # that case
-                for var_raw_str in match.captures('vars'):
-                    # strip off the ' :' at the end of each match
-                    var_str = var_raw_str[:-2]
+                for var_str in cell_method.names:
                     if (var_str in var.dimensions or
                         var_str == 'area' or
                         var_str in getattr(var, "coordinates", "")):
@@ -2772,19 +3005,19 @@ class CFBaseCheck(BaseCheck):
             valid_cell_methods = TestCtx(BaseCheck.MEDIUM,
                                          self.section_titles['7.3'])
 
-            for match in regex.finditer(psep, method):
+            for cell_method in cell_methods.methods:
                 # CF section 7.3 - "Case is not significant in the method name."
-                valid_cell_methods.assert_true(match.group('method').lower() in methods,
+                valid_cell_methods.assert_true(cell_method.method.lower() in methods,
                                                '{}:cell_methods contains an invalid method: {}'
-                                               ''.format(var.name, match.group('method')))
+                                               ''.format(var.name, cell_method.method))
 
             ret_val.append(valid_cell_methods.to_result())
 
-            for match in regex.finditer(psep, method):
-                if match.group('paren_contents') is not None:
+            for cell_method in cell_methods.methods:
+                if cell_method.paren_contents is not None:
                     # split along spaces followed by words with a colon
                     # not sure what to do if a comment contains a colon!
-                    ret_val.append(self._check_cell_methods_paren_info(match.group('paren_contents'), var).to_result())
+                    ret_val.append(self._check_cell_methods_paren_info(cell_method.paren_contents, var).to_result())
 
         return ret_val
 
@@ -2801,16 +3034,11 @@ class CFBaseCheck(BaseCheck):
             valid_info.out_of += 1
             valid_info.score += 1
             return valid_info
-        # otherwise, split into k/v pairs
-        kv_pair_pat = r'(\S+:)\s+(.*(?=\s+\w+:)|[^:]+$)\s*'
-        # otherwise, we must split further with intervals coming
-        # first, followed by non-standard comments
-        # we need the count of the matches, and re.findall() only returns
-        # groups if they are present and we wish to see if the entire match
-        # object concatenated together is the same as the original string
-        pmatches = [m for m in regex.finditer(kv_pair_pat, paren_contents)]
-        for i, pmatch in enumerate(pmatches):
-            keyword, val = pmatch.groups()
+        # otherwise, split into k/v pairs, with intervals coming first,
+        # followed by non-standard comments
+        info = cfutil.parse_cell_methods_info(paren_contents)
+        pmatches = info.items
+        for i, (keyword, val) in enumerate(pmatches):
             if keyword == 'interval:':
                 valid_info.out_of += 2
                 interval_matches = regex.match(r'^\s*(?P<interval_number>\S+)\s+(?P<interval_units>\S+)\s*$', val)
@@ -2854,12 +3082,12 @@ class CFBaseCheck(BaseCheck):
 
         # Ensure concatenated reconstructed matches are the same as the
         # original string.  If they're not, there's likely a formatting error
-        valid_info.assert_true(''.join(m.group(0)
-                                       for m in pmatches) == paren_contents,
+        valid_info.assert_true(info.well_formed,
                    "§7.3.3 Parenthetical content inside {}:cell_methods is not well formed: {}".format(var.name, paren_contents))
 
         return valid_info
 
+    @max_priority(BaseCheck.MEDIUM)
     def check_climatological_statistics(self, ds):
         """
         7.4 A climatological time coordinate variable does not have a bounds attribute. Instead, it has a climatology
@@ -2989,6 +3217,7 @@ class CFBaseCheck(BaseCheck):
     #
     ###############################################################################
 
+    @max_priority(BaseCheck.MEDIUM)
     def check_packed_data(self, ds):
         """
         8.1 Simple packing may be achieved through the use of the optional NUG defined attributes scale_factor and
@@ -3078,6 +3307,7 @@ class CFBaseCheck(BaseCheck):
 
         return ret_val
 
+    @max_priority(BaseCheck.MEDIUM)
     def check_compression_gathering(self, ds):
         """
         At the current time the netCDF interface does not provide for packing
@@ -3121,7 +3351,7 @@ class CFBaseCheck(BaseCheck):
             valid = True
             reasoning = []
             # puts the referenced variable being compressed into a set
-            compress_set = set(compress_var.compress.split(' '))
+            compress_set = set(cfutil.parse_name_list(compress_var.compress))
             if compress_var.ndim != 1:
                 valid = False
                 reasoning.append("Compression variable {} may only have one dimension".format(compress_var.name))
@@ -3145,12 +3375,96 @@ class CFBaseCheck(BaseCheck):
 
         return ret_val
 
+    @validates_data
+    @io_bound
+    @requires('index_violations')
+    def check_data_compression_indices(self, ds):
+        """
+        Checks that the values of each compression variable index the
+        dimensions it compresses, i.e. lie between 0 and the product of
+        their lengths.  Reads every value of the compression variables, so
+        only run on request.
+
+        CF §8.2 The list variable contains the indices of the elements of the
+        compressed dimensions which are kept, as if they were a single
+        dimension with the first dimension varying slowest.
+
+        :param netCDF4.Dataset ds: An open netCDF dataset
+        :rtype: list
+        :return: List of results
+        """
+        _, indices = get_input(ds, 'index_violations')
+        ret_val = []
+        for name, counter in indices.items():
+            if 'compress' not in ds.variables[name].ncattrs():
+                continue
+            valid_indices = TestCtx(BaseCheck.HIGH, self.section_titles['8.2'])
+            valid_indices.assert_true(counter.invalid == 0,
+                                      "{} of {} values of compression variable {} are not indices "
+                                      "of the compressed dimensions, between 0 and {}"
+                                      "".format(counter.invalid, counter.count, name, counter.valid_max))
+            self._note_sample(ds, valid_indices, name, counter.invalid, counter.count)
+            ret_val.append(valid_indices.to_result())
+        return ret_val
+
     ###############################################################################
     #
     # Chapter 9: Discrete Sampling Geometries
     #
     ###############################################################################
 
+    @validates_data
+    @io_bound
+    @requires('index_violations')
+    def check_data_ragged_arrays(self, ds):
+        """
+        Checks the variables which lay out ragged arrays: that the counts of
+        a contiguous ragged array aren't negative and add up to the length
+        of its sample dimension, and that the values of the index variable
+        of an indexed ragged array are positions along its instance
+        dimension.  Reads every value of these variables, so only run on
+        request.
+
+        CF §9.3.3 The count variable contains the number of elements that
+        each instance has, and must have the sample_dimension attribute
+        naming the dimension the elements are stored along.
+
+        CF §9.3.4 The index variable contains the index of the instance each
+        element belongs to, and must have the instance_dimension attribute.
+
+        :param netCDF4.Dataset ds: An open netCDF dataset
+        :rtype: list
+        :return: List of results
+        """
+        counts, indices = get_input(ds, 'index_violations')
+        ret_val = []
+        for name, counter in counts.items():
+            sample_dimension = ds.variables[name].sample_dimension
+            samples = len(ds.dimensions[sample_dimension])
+            valid_counts = TestCtx(BaseCheck.HIGH, self.section_titles['9.3'])
+            valid_counts.assert_true(counter.negative == 0,
+                                     "{} of {} values of count variable {} are negative"
+                                     "".format(counter.negative, counter.count, name))
+            valid_counts.assert_true(counter.total == samples,
+                                     "The counts of count variable {} add up to {}, not to the "
+                                     "length of its sample dimension {} ({})"
+                                     "".format(name, counter.total, sample_dimension, samples))
+            ret_val.append(valid_counts.to_result())
+
+        for name, counter in indices.items():
+            if 'instance_dimension' not in ds.variables[name].ncattrs():
+                continue
+            valid_indices = TestCtx(BaseCheck.HIGH, self.section_titles['9.3'])
+            valid_indices.assert_true(counter.invalid == 0,
+                                      "{} of {} values of index variable {} are not indices of "
+                                      "its instance dimension {}, between 0 and {}"
+                                      "".format(counter.invalid, counter.count, name,
+                                                ds.variables[name].instance_dimension,
+                                                counter.valid_max))
+            self._note_sample(ds, valid_indices, name, counter.invalid, counter.count)
+            ret_val.append(valid_indices.to_result())
+        return ret_val
+
     def check_all_features_are_same_type(self, ds):
         """
         Check that the feature types in a dataset are all the same.
@@ -3235,6 +3549,7 @@ class CFBaseCheck(BaseCheck):
             valid_cf_role.assert_true(variable_count < 3, m)
             return valid_cf_role.to_result()
 
+    @max_priority(BaseCheck.MEDIUM)
     def check_variable_features(self, ds):
         '''
         Checks the variable feature types match the dataset featureType attribute
@@ -3294,6 +3609,7 @@ class CFBaseCheck(BaseCheck):
 
         return ret_val
 
+    @max_priority(BaseCheck.LOW)
     def check_hints(self, ds):
         '''
         Checks for potentially mislabeled metadata and makes suggestions for how to correct
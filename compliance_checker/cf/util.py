@@ -11,6 +11,12 @@ from cf_units import Unit
 from netCDF4 import Dimension, Variable
 from pkgutil import get_data
 from pkg_resources import resource_filename
+from compliance_checker import dates
+try:
+    from functools import lru_cache
+# Fallback for Python < 3.2
+except ImportError:
+    from functools32 import lru_cache
 
 # copied from paegan
 # paegan may depend on these later
@@ -317,6 +323,27 @@ class StandardNameTable(object):
         return iter(itertools.chain(self._names, self._aliases))
 
 
+@lru_cache(16)
+def _load_standard_name_table(cached_location, env_location):
+    # env_location is only part of the cache key, StandardNameTable reads
+    # the environment variable itself
+    return StandardNameTable(cached_location)
+
+
+def get_standard_name_table(cached_location=None):
+    '''
+    Returns a StandardNameTable, parsing each table only once per process.
+    The tables are shared and must not be modified.
+
+    :param str cached_location: Path to a standard name table XML file.  If
+                                omitted the table named by the
+                                CF_STANDARD_NAME_TABLE environment variable
+                                or the packaged table is used.
+    '''
+    return _load_standard_name_table(cached_location,
+                                     os.environ.get('CF_STANDARD_NAME_TABLE'))
+
+
 def download_cf_standard_name_table(version, location=None):
     '''
     Downloads the specified CF standard name table version and saves it to file
@@ -373,11 +400,7 @@ def units_convertible(units1, units2, reftimeistime=True):
 
 
 def units_temporal(units):
-    try:
-        u = Unit(units)
-    except ValueError:
-        return False
-    return u.is_time_reference()
+    return dates.is_time_reference(units)
 
 
 def map_axes(dim_vars, reverse_map=False):
@@ -5,12 +5,13 @@ compliance_checker/cfutil.py
 '''
 from cf_units import Unit
 from pkg_resources import resource_filename
-from collections import defaultdict
+from collections import defaultdict, namedtuple
 import warnings
 from functools import partial
 import six
 import csv
 import re
+import regex
 try:
     from functools import lru_cache
 # Fallback for Python < 3.2
@@ -276,7 +277,7 @@ def get_auxiliary_coordinate_variables(ds):
     # get any variables referecned by the coordinates attribute
     for ncvar in ds.get_variables_by_attributes(coordinates=lambda x: isinstance(x, basestring)):
         # split the coordinates into individual variable names
-        referenced_variables = ncvar.coordinates.split(' ')
+        referenced_variables = parse_name_list(ncvar.coordinates)
         # if the variable names exist, add them
         for referenced_variable in referenced_variables:
             if referenced_variable in ds.variables and referenced_variable not in aux_vars:
@@ -795,7 +796,7 @@ def is_compression_coordinate(ds, variable):
     if variable in compress:
         return False
     # Must point to dimensions
-    for dim in compress.split():
+    for dim in parse_name_list(compress):
         if dim not in ds.dimensions:
             return False
     return True
@@ -1589,7 +1590,7 @@ def is_mapped_grid(nc, variable):
     # dimensions.
     dims = nc.variables[variable].dimensions
     # For cases like ROMS, the coordinates are mapped using the coordinates attribute
-    variable_coordinates = getattr(nc.variables[variable], 'coordinates', '').split()
+    variable_coordinates = parse_name_list(getattr(nc.variables[variable], 'coordinates', ''))
 
     lons = get_longitude_variables(nc)
     for lon in lons:
@@ -1649,7 +1650,7 @@ def is_reduced_grid(nc, variable):
     if len(compressed_coordinates) > 1:
         return False
     compressed_coordinate = axis_map['C'][0]
-    for dim in nc.variables[compressed_coordinate].compress.split():
+    for dim in parse_name_list(nc.variables[compressed_coordinate].compress):
         if dim not in nc.dimensions:
             return False
     return True
@@ -1722,3 +1723,106 @@ def units_convertible(units1, units2, reftimeistime=True):
     except ValueError:
         return False
     return u1.is_convertible(u2)
+
+
+###############################################################################
+#
+# Attribute grammars
+#
+# Several CF attributes are small languages of their own.  The functions below
+# parse each attribute value once and are memoized on the string itself, so
+# variables and datasets sharing an attribute value share a single parse.
+#
+###############################################################################
+
+CellMethod = namedtuple('CellMethod', ['names', 'method', 'where', 'over',
+                                       'paren_contents', 'text'])
+CellMethods = namedtuple('CellMethods', ['well_formed', 'methods'])
+CellMethodsInfo = namedtuple('CellMethodsInfo', ['well_formed', 'items'])
+CellMeasure = namedtuple('CellMeasure', ['measure', 'variable'])
+FormulaTerms = namedtuple('FormulaTerms', ['well_formed', 'terms'])
+
+_CELL_METHODS_REGX = regex.compile(r'(?P<vars>\w+: )+(?P<method>\w+) ?(?P<where>where (?P<wtypevar>\w+) '
+                                   r'?(?P<over>over (?P<otypevar>\w+))?| ?)(?:\((?P<paren_contents>[^)]*)\))?')
+_CELL_METHODS_INFO_REGX = regex.compile(r'(\S+:)\s+(.*(?=\s+\w+:)|[^:]+$)\s*')
+_CELL_MEASURES_REGX = regex.compile(r'^(?P<measure>area|volume): (?P<variable>\w+)$')
+_FORMULA_TERMS_REGX = regex.compile(r'([A-Za-z][A-Za-z0-9_]*): ([A-Za-z][A-Za-z0-9_]*)')
+
+
+@lru_cache(1024)
+def parse_name_list(value):
+    '''
+    Returns a tuple of the names in a blank separated list attribute such as
+    coordinates, ancillary_variables, flag_meanings or compress
+
+    :param str value: Attribute value
+    '''
+    return tuple(value.split())
+
+
+@lru_cache(1024)
+def parse_cell_methods(value):
+    '''
+    Parses a cell_methods attribute into a CellMethods tuple.  `well_formed`
+    is True if the attribute begins with a valid "name: method" clause and
+    `methods` holds a CellMethod for every clause found.  The names of each
+    CellMethod have the trailing colon removed.
+
+    :param str value: Attribute value
+    '''
+    methods = []
+    for match in _CELL_METHODS_REGX.finditer(value):
+        methods.append(CellMethod(tuple(n[:-2] for n in match.captures('vars')),
+                                  match.group('method'),
+                                  match.group('wtypevar'),
+                                  match.group('otypevar'),
+                                  match.group('paren_contents'),
+                                  match.group(0)))
+    well_formed = _CELL_METHODS_REGX.match(value) is not None
+    return CellMethods(well_formed, tuple(methods))
+
+
+@lru_cache(1024)
+def parse_cell_methods_info(paren_contents):
+    '''
+    Parses the contents of the parentheses following a cell_methods clause
+    into "keyword: value" pairs, e.g. ('interval:', '1 hr').  `well_formed`
+    is False if the pairs don't account for the whole string.  Contents
+    without a colon are a plain comment and have no pairs.
+
+    :param str paren_contents: Text inside the parentheses
+    '''
+    if ':' not in paren_contents:
+        return CellMethodsInfo(True, ())
+    matches = list(_CELL_METHODS_INFO_REGX.finditer(paren_contents))
+    well_formed = ''.join(m.group(0) for m in matches) == paren_contents
+    return CellMethodsInfo(well_formed, tuple(m.groups() for m in matches))
+
+
+@lru_cache(1024)
+def parse_cell_measures(value):
+    '''
+    Parses a cell_measures attribute of the form "area: name" or
+    "volume: name" into a CellMeasure, or returns None if the attribute is
+    not of that form.
+
+    :param str value: Attribute value
+    '''
+    match = _CELL_MEASURES_REGX.search(value)
+    if match is None:
+        return None
+    return CellMeasure(match.group('measure'), match.group('variable'))
+
+
+@lru_cache(1024)
+def parse_formula_terms(value):
+    '''
+    Parses a formula_terms attribute into a FormulaTerms tuple of
+    (term, variable name) pairs.  `well_formed` is False if the pairs, joined
+    by single spaces, don't reproduce the attribute exactly.
+
+    :param str value: Attribute value
+    '''
+    terms = tuple(_FORMULA_TERMS_REGX.findall(value))
+    well_formed = ' '.join('{}: {}'.format(*t) for t in terms) == value
+    return FormulaTerms(well_formed, terms)
@@ -0,0 +1,707 @@
+'''
+Chunked reads of the raw values of variables
+
+Checks of the data itself, rather than of the metadata, have to look at
+every value of the variables they check, which for large files is far more
+than fits in memory.  The values are instead streamed chunk by chunk, each a
+few megabytes of consecutive values, through reducers which keep only what
+they need of each chunk, e.g. a count of invalid values.  Several variables
+are reduced at once on a pool of threads: numpy releases the GIL while it
+works through a chunk, and reads through the netCDF library, which isn't
+thread safe, are serialized.
+
+The values are raw, without the masking and scaling netCDF4 applies when
+reading variables, as the attributes describing valid values, such as
+valid_range and flag_values, are in the packed data type.  Local classic
+format files are read from their memory mapped views, see
+netcdf.map_classic_variables, others through a separate handle of the
+dataset with automatic masking and scaling turned off.
+
+For archives too large to read in full, a Sample of the chunks of each
+variable can be read instead, making the results approximate.  To keep a
+worker within a MemoryBudget, the size of the chunks is planned from the
+data type of the variables and the budget.
+'''
+from __future__ import unicode_literals, division
+import math
+import multiprocessing
+import sys
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+from netCDF4 import Dataset
+
+from compliance_checker import remote
+
+# bytes of raw values read at once for each variable
+DEFAULT_CHUNK_BYTES = 16 * 2 ** 20
+
+
+def _cpu_count():
+    try:
+        return multiprocessing.cpu_count()
+    except NotImplementedError:
+        return 1
+
+
+# number of variables reduced at once
+DEFAULT_WORKERS = min(4, _cpu_count())
+# bytes of working arrays per value of a chunk: the masks and float64
+# temporaries of the reducers, or the mask and unpacked copy of netCDF4
+WORK_BYTES_PER_VALUE = 24
+# bytes of the chunks a sample is drawn from, for variables which aren't
+# chunked in storage, so that a sample spreads over more of the variable
+SAMPLE_CHUNK_BYTES = 2 ** 20
+
+
+def chunk_slices(shape, itemsize, max_bytes=DEFAULT_CHUNK_BYTES, chunking=None):
+    '''
+    Yields tuples of slices splitting an array into chunks of at most
+    max_bytes, or of a single row of the innermost dimension if that is
+    larger.  Chunks are split along the outermost dimensions, so that each
+    is contiguous in C order, and rounded to whole storage chunks along the
+    dimension they're split on if the variable is chunked.
+
+    :param tuple shape: Shape of the array
+    :param int itemsize: Bytes per value
+    :param int max_bytes: Largest chunk to read
+    :param list chunking: Storage chunk sizes of the variable, if chunked
+    '''
+    shape = tuple(shape)
+    if not shape:
+        yield ()
+        return
+    if 0 in shape:
+        return
+    # split along the outermost axis whose inner block of values fits
+    inner = itemsize
+    axis = len(shape) - 1
+    while axis > 0 and inner * shape[axis] <= max_bytes:
+        inner *= shape[axis]
+        axis -= 1
+    step = max(1, max_bytes // inner)
+    if chunking is not None and step >= chunking[axis]:
+        step -= step % chunking[axis]
+
+    for outer in np.ndindex(*shape[:axis]):
+        prefix = tuple(slice(i, i + 1) for i in outer)
+        for start in range(0, shape[axis], step):
+            yield prefix + (slice(start, min(start + step, shape[axis])),)
+
+
+def storage_chunk_slices(shape, chunking):
+    '''
+    Yields tuples of slices of each storage chunk of a chunked array, in C
+    order of the grid of storage chunks, so that each chunk read touches a
+    single storage chunk and reads all of it
+
+    :param tuple shape: Shape of the array
+    :param list chunking: Storage chunk sizes of the variable
+    '''
+    shape = tuple(shape)
+    if not shape:
+        yield ()
+        return
+    if 0 in shape:
+        return
+    grid = [-(-size // chunk) for size, chunk in zip(shape, chunking)]
+    for position in np.ndindex(*grid):
+        yield tuple(slice(i * chunk, min((i + 1) * chunk, size))
+                    for i, chunk, size in zip(position, chunking, shape))
+
+
+class MemoryBudget(object):
+    '''
+    Memory which the chunks of data being read and worked on may take at
+    once, across threads.  Plans the size of the chunks to read, and keeps
+    track of the estimated memory of the chunks held, and of its peak.
+
+    :param int limit: Budget in bytes
+    '''
+
+    def __init__(self, limit):
+        if limit <= 0:
+            raise ValueError("Memory budgets must be positive, not {}".format(limit))
+        self.limit = limit
+        self.in_use = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return 'MemoryBudget({})'.format(format_bytes(self.limit))
+
+    def plan(self, dtype, workers=1, arrays=1, max_bytes=DEFAULT_CHUNK_BYTES):
+        '''
+        Returns the largest chunk, in bytes of raw values, to read of a
+        variable of a data type so that the chunks of all workers, each of
+        several arrays read along with each other, and their working arrays
+        fit in the budget.  Never less than a single value, nor more than
+        max_bytes.
+
+        :param numpy.dtype dtype: Data type of the variable
+        :param int workers: Number of chunks read at once
+        :param int arrays: Number of variables read in aligned chunks
+        :param int max_bytes: Largest chunk to read anyway
+        '''
+        itemsize = np.dtype(dtype).itemsize
+        share = self.limit // (max(1, workers) * max(1, arrays))
+        values = share // (itemsize + WORK_BYTES_PER_VALUE)
+        return int(max(itemsize, min(max_bytes, values * itemsize)))
+
+    def working_bytes(self, chunk):
+        '''
+        Returns the estimated memory a chunk and its working arrays take
+        '''
+        return int(chunk.nbytes + chunk.size * WORK_BYTES_PER_VALUE)
+
+    @contextmanager
+    def track(self, nbytes):
+        '''
+        Counts nbytes as in use for the duration of the block
+        '''
+        with self._lock:
+            self.in_use += nbytes
+            self.peak = max(self.peak, self.in_use)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_use -= nbytes
+
+    def reset_peak(self):
+        with self._lock:
+            self.peak = self.in_use
+
+
+@contextmanager
+def held(budget, arrays):
+    '''
+    Counts the chunks as held against a memory budget, if there is one,
+    for the duration of the block
+
+    :param MemoryBudget budget: Budget, or None
+    :param list arrays: Chunks held
+    '''
+    if budget is None:
+        yield
+        return
+    with budget.track(sum(budget.working_bytes(a) for a in arrays)):
+        yield
+
+
+def format_bytes(nbytes):
+    '''
+    Returns a number of bytes in binary units, e.g. '512.0 MiB'
+    '''
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if abs(nbytes) < 1024:
+            return '{:.1f} {}'.format(nbytes, unit)
+        nbytes /= 1024
+    return '{:.1f} TiB'.format(nbytes)
+
+
+def peak_rss():
+    '''
+    Returns the peak resident memory of the process in bytes, or None where
+    it isn't known
+    '''
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes, but bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class Sample(object):
+    '''
+    A random subset of the chunks of each variable to read instead of all of
+    them, given as a fraction of the chunks or as a number of chunks.  The
+    chunks are drawn with the variable name as the seed, so the same chunks
+    are read every time, and the first and last chunk are always among
+    them, as that is where the extremes of sorted coordinates lie.
+
+    :param size: Fraction of the chunks, a float between 0 and 1, or number
+                 of chunks, an int of at least 1
+    '''
+
+    def __init__(self, size):
+        if isinstance(size, bool) or not isinstance(size, (int, float)):
+            raise ValueError("Invalid sample size {!r}".format(size))
+        if isinstance(size, float) and not 0 < size <= 1:
+            raise ValueError("Sample fractions must be between 0 and 1, not {}".format(size))
+        if isinstance(size, int) and size < 1:
+            raise ValueError("Samples must be of at least one chunk, not {}".format(size))
+        self.size = size
+
+    def __repr__(self):
+        return 'Sample({!r})'.format(self.size)
+
+    def select(self, key, total):
+        '''
+        Returns the sorted positions of the chunks to read out of total
+        chunks, or None if all of them are to be read
+
+        :param str key: Name of the variable, seeding the selection
+        :param int total: Number of chunks of the variable
+        '''
+        if isinstance(self.size, float):
+            count = max(1, int(math.ceil(self.size * total)))
+        else:
+            count = self.size
+        if count >= total:
+            return None
+        if count == 1:
+            return np.array([0])
+        seed = zlib.crc32(key.encode('utf-8')) & 0xffffffff
+        inner = np.random.RandomState(seed).choice(np.arange(1, total - 1),
+                                                   count - 2, replace=False)
+        return np.concatenate([[0], np.sort(inner), [total - 1]])
+
+
+def describe_sample(read, total, invalid=None, count=None):
+    '''
+    Returns a note that a result is approximate, with the number of values
+    it was computed from and, for counts of invalid values, a 95% confidence
+    bound on the share of invalid values of the whole variable.  The bound
+    takes the values to be drawn independently, whereas whole chunks are
+    drawn, so it is optimistic when invalid values cluster.
+
+    :param int read: Number of values read
+    :param int total: Number of values of the variable
+    :param int invalid: Number of invalid values found, if counted
+    :param int count: Number of values read which were checked, e.g.
+                      leaving out missing values, if counted
+    '''
+    note = "approximate, from a sample of {} of {} values".format(read, total)
+    if invalid is None or not count:
+        return note
+    if invalid:
+        rate = invalid / count
+        margin = 1.96 * math.sqrt(rate * (1 - rate) / count)
+        return note + (", an estimated {:.3g}% \u00b1 {:.2g}% of the values are invalid "
+                       "(95% confidence)".format(100 * rate, 100 * margin))
+    # the rule of three
+    return note + (", fewer than {:.2g}% of the values are invalid (95% confidence)"
+                   "".format(100 * min(1., 3 / count)))
+
+
+def missing_values(variable):
+    '''
+    Returns the raw values which mark missing data of a variable, see
+    remote.fill_values
+
+    :param netCDF4.Variable variable: Variable to get the values of
+    '''
+    return remote.fill_values(variable)
+
+
+def valid_mask(chunk, missing):
+    '''
+    Returns a boolean array of the values of a chunk which aren't missing
+
+    :param numpy.ndarray chunk: Raw values
+    :param list missing: Raw missing values, see missing_values
+    '''
+    valid = np.ones(chunk.shape, dtype=bool)
+    for value in missing:
+        valid &= ~remote._equal(chunk, value)
+    return valid
+
+
+def _size(shape, index):
+    # number of values of an array with the shape at an index of slices
+    # along its outermost dimensions
+    lengths = [len(range(*s.indices(n))) for s, n in zip(index, shape)]
+    return int(np.prod(lengths + list(shape[len(index):])))
+
+
+class RawReader(object):
+    '''
+    Reads the raw values of the variables of a dataset chunk by chunk, from
+    several threads.  Use as a context manager, or close it when done.
+
+    :param netCDF4.Dataset ds: An open netCDF dataset
+    :param dict views: Memory mapped views of the variables of a classic
+                       format file, see the classic_views input
+    :param Sample sample: Sample of the chunks of each variable to read
+                          instead of all of them.  The number of values
+                          read of each sampled variable, and of the values
+                          of the variable, are kept in `coverage`.
+    '''
+
+    def __init__(self, ds, views=None, sample=None):
+        self.ds = ds
+        self.views = views or {}
+        self.sample = sample
+        self.coverage = {}
+        self._lock = threading.Lock()
+        self._handle = None
+        self._opened = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+    def _raw_handle(self):
+        # a separate handle of the dataset, so that turning off masking and
+        # scaling doesn't affect the checks reading it at the same time
+        if not self._opened:
+            self._opened = True
+            try:
+                self._handle = Dataset(self.ds.filepath())
+                self._handle.set_auto_maskandscale(False)
+            except (AttributeError, ValueError, IOError, OSError):
+                self._handle = None
+        return self._handle
+
+    def read(self, name, index):
+        '''
+        Returns the raw values of a variable at an index, as a numpy array
+
+        :param str name: Variable name
+        :param tuple index: Slices of the values to read
+        '''
+        view = self.views.get(name)
+        if view is not None:
+            return np.asarray(view[index])
+        source = remote.dap_source(self.ds)
+        if source is not None:
+            # read over HTTP, without the netCDF library
+            return np.ma.getdata(source.read(name, index, raw=True))
+        with self._lock:
+            handle = self._raw_handle()
+            if handle is not None:
+                return np.ma.getdata(handle.variables[name][index])
+            # datasets which can't be opened again, e.g. in memory ones
+            variable = self.ds.variables[name]
+            mask, scale = getattr(variable, 'mask', True), getattr(variable, 'scale', True)
+            variable.set_auto_maskandscale(False)
+            try:
+                return np.ma.getdata(variable[index])
+            finally:
+                variable.set_auto_mask(mask)
+                variable.set_auto_scale(scale)
+
+    def _sampled(self, names, index):
+        # the chunks of the sample, recording how much of the variables
+        # they cover
+        if self.sample is None:
+            return index
+        selected = self.sample.select(names[0], len(index))
+        if selected is None:
+            return index
+        index = [index[i] for i in selected]
+        for name in names:
+            shape = self.ds.variables[name].shape
+            read = sum(_size(shape, i) for i in index)
+            self.coverage[name] = (read, _size(shape, ()))
+        return index
+
+    def chunk_index(self, name, max_bytes=DEFAULT_CHUNK_BYTES, exact=False):
+        '''
+        Returns the list of indexes of the chunks of a variable to read: all
+        of them, see chunk_slices, or those of the sample.  A sample of a
+        chunked variable is drawn from its storage chunks, see
+        storage_chunk_slices, unless they are larger than max_bytes; one of
+        a variable which isn't chunked from chunks of SAMPLE_CHUNK_BYTES.
+
+        :param str name: Variable name
+        :param int max_bytes: Largest chunk to read
+        :param bool exact: Read every chunk even if sampling
+        '''
+        variable = self.ds.variables[name]
+        chunking = None
+        if name not in self.views:
+            try:
+                chunking = variable.chunking()
+            except (AttributeError, RuntimeError):
+                pass
+            if not isinstance(chunking, list):
+                chunking = None
+        if self.sample is not None and not exact:
+            if (chunking is not None and
+                    variable.dtype.itemsize * int(np.prod(chunking)) <= max_bytes):
+                index = list(storage_chunk_slices(variable.shape, chunking))
+                return self._sampled([name], index)
+            if chunking is None:
+                max_bytes = min(max_bytes, SAMPLE_CHUNK_BYTES)
+        index = list(chunk_slices(variable.shape, variable.dtype.itemsize,
+                                  max_bytes, chunking))
+        return index if exact else self._sampled([name], index)
+
+    def iter_chunks(self, name, max_bytes=DEFAULT_CHUNK_BYTES, exact=False):
+        '''
+        Yields the raw values of a variable chunk by chunk
+
+        :param str name: Variable name
+        :param int max_bytes: Largest chunk to read
+        :param bool exact: Read every chunk even if sampling
+        '''
+        for index in self.chunk_index(name, max_bytes, exact):
+            yield self.read(name, index)
+
+    def iter_aligned(self, names, max_bytes=DEFAULT_CHUNK_BYTES, exact=False):
+        '''
+        Yields tuples of the raw values of variables sharing their first
+        dimension, e.g. a coordinate variable and its boundary variable,
+        chunk by chunk along that dimension, so that the chunks of each tuple
+        cover the same positions
+
+        :param tuple names: Variable names
+        :param int max_bytes: Largest chunk to read of any of the variables
+        :param bool exact: Read every chunk even if sampling
+        '''
+        variables = [self.ds.variables[name] for name in names]
+        length = variables[0].shape[0]
+        row = max(variable.dtype.itemsize * int(np.prod(variable.shape[1:]))
+                  for variable in variables)
+        if self.sample is not None and not exact:
+            max_bytes = min(max_bytes, SAMPLE_CHUNK_BYTES)
+        step = max(1, max_bytes // row)
+        index = [(slice(start, min(start + step, length)),)
+                 for start in range(0, length, step)]
+        if not exact:
+            index = self._sampled(list(names), index)
+        for i in index:
+            yield tuple(self.read(name, i) for name in names)
+
+
+def reduce_variables(reader, reducers, max_workers=DEFAULT_WORKERS,
+                     max_bytes=DEFAULT_CHUNK_BYTES, budget=None):
+    '''
+    Streams the raw values of variables through reducers, several variables
+    at once, and returns the reducers.  A reducer is an object with an
+    `update` method called with each chunk of its variable in order.  Each
+    variable is read once, however many reducers it has.  Variables sharing
+    their first dimension can be reduced together, under a tuple of their
+    names, in which case `update` is called with a chunk of each, see
+    RawReader.iter_aligned.  At most max_workers chunks of max_bytes, per
+    variable, are held at once.  If the reader samples the chunks, variables
+    with a reducer whose `exact` attribute is True are still read in full.
+
+    :param RawReader reader: Reader of the dataset
+    :param dict reducers: Variable name, or tuple of names, to a list of
+                          reducers
+    :param int max_workers: Number of variables reduced at once
+    :param int max_bytes: Largest chunk to read
+    :param MemoryBudget budget: Budget which the chunks of all variables
+                                reduced at once are planned to fit in, or
+                                None
+    '''
+    workers = min(max_workers or 1, len(reducers))
+
+    def run(key):
+        exact = any(getattr(reducer, 'exact', False) for reducer in reducers[key])
+        names = key if isinstance(key, tuple) else (key,)
+        size = max_bytes
+        if budget is not None:
+            dtype = max((reader.ds.variables[name].dtype for name in names),
+                        key=lambda dtype: dtype.itemsize)
+            size = budget.plan(dtype, workers, len(names), max_bytes)
+        if isinstance(key, tuple):
+            pieces = reader.iter_aligned(key, size, exact)
+        else:
+            pieces = ((chunk,) for chunk in reader.iter_chunks(key, size, exact))
+        for chunk in pieces:
+            with held(budget, chunk):
+                for reducer in reducers[key]:
+                    reducer.update(*chunk)
+
+    if max_workers is None or max_workers <= 1 or len(reducers) <= 1:
+        for name in reducers:
+            run(name)
+    else:
+        with ThreadPoolExecutor(max_workers) as pool:
+            # raises the first error, once all of them are done
+            for future in [pool.submit(run, name) for name in reducers]:
+                future.result()
+    return reducers
+
+
+class RangeCounter(object):
+    '''
+    Counts the values of a variable outside of its valid range, leaving out
+    missing values
+
+    :param list missing: Raw missing values, see missing_values
+    :param valid_min: Lowest valid value, or None
+    :param valid_max: Highest valid value, or None
+    '''
+
+    def __init__(self, missing, valid_min=None, valid_max=None):
+        self.missing = missing
+        self.valid_min = valid_min
+        self.valid_max = valid_max
+        self.count = 0
+        self.invalid = 0
+
+    def update(self, chunk):
+        valid = valid_mask(chunk, self.missing)
+        outside = np.zeros(chunk.shape, dtype=bool)
+        if self.valid_min is not None:
+            outside |= chunk < self.valid_min
+        if self.valid_max is not None:
+            outside |= chunk > self.valid_max
+        self.count += int(np.count_nonzero(valid))
+        self.invalid += int(np.count_nonzero(outside & valid))
+
+
+class FlagCounter(object):
+    '''
+    Counts the values of a flag variable which aren't one of its flag_values,
+    or, given flag_masks, which set bits outside of all of the masks,
+    leaving out missing values
+
+    :param list missing: Raw missing values, see missing_values
+    :param numpy.ndarray flag_values: Values of the flags, or None
+    :param numpy.ndarray flag_masks: Bit masks of the flags, or None
+    '''
+
+    def __init__(self, missing, flag_values=None, flag_masks=None):
+        self.missing = missing
+        self.flag_values = flag_values
+        self.bits = None
+        if flag_masks is not None:
+            self.bits = np.bitwise_or.reduce(np.asarray(flag_masks).ravel())
+        self.count = 0
+        self.invalid = 0
+
+    def update(self, chunk):
+        valid = valid_mask(chunk, self.missing)
+        if self.bits is not None:
+            invalid = (chunk & ~self.bits.astype(chunk.dtype)) != 0
+        else:
+            invalid = ~np.isin(chunk, self.flag_values)
+        self.count += int(np.count_nonzero(valid))
+        self.invalid += int(np.count_nonzero(invalid & valid))
+
+
+class CountTotal(object):
+    '''
+    Adds up the values of a count variable, e.g. the number of elements of
+    each instance of a contiguous ragged array, and counts the negative ones
+    '''
+    # the total is only known from every value
+    exact = True
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.negative = 0
+
+    def update(self, chunk):
+        self.count += chunk.size
+        self.total += int(chunk.sum(dtype=np.int64))
+        self.negative += int(np.count_nonzero(chunk < 0))
+
+
+def packing(variable):
+    '''
+    Returns the scale_factor and add_offset of a variable, each None if it
+    doesn't have it
+    '''
+    return (getattr(variable, 'scale_factor', None),
+            getattr(variable, 'add_offset', None))
+
+
+def _unpack(chunk, packing):
+    scale_factor, add_offset = packing
+    if scale_factor is None and add_offset is None:
+        return chunk
+    return (chunk * (1 if scale_factor is None else scale_factor) +
+            (0 if add_offset is None else add_offset))
+
+
+class MonotonicCounter(object):
+    '''
+    Follows whether the values of a one dimensional variable are strictly
+    monotonic, comparing the first value of each chunk with the last of the
+    one before, and finds its lowest and highest raw values leaving out
+    missing values and NaNs.  Chunks of variables read along with it, e.g.
+    its bounds, are ignored.
+
+    :param list missing: Raw missing values, see missing_values
+    '''
+
+    def __init__(self, missing):
+        self.missing = missing
+        self.count = 0
+        self.increasing = 0
+        self.decreasing = 0
+        self.last = None
+        self.minimum = None
+        self.maximum = None
+
+    @property
+    def monotonic(self):
+        steps = self.count - 1
+        return steps <= 0 or steps in (self.increasing, self.decreasing)
+
+    def update(self, chunk, *aligned):
+        values = chunk.ravel()
+        if values.size == 0:
+            return
+        # comparisons rather than differences, which wrap for unsigned types
+        if self.last is not None:
+            self.increasing += int(values[0] > self.last)
+            self.decreasing += int(values[0] < self.last)
+        self.increasing += int(np.count_nonzero(values[1:] > values[:-1]))
+        self.decreasing += int(np.count_nonzero(values[1:] < values[:-1]))
+        self.count += values.size
+        self.last = values[-1]
+
+        valid = valid_mask(values, self.missing)
+        if values.dtype.kind == 'f':
+            valid &= ~np.isnan(values)
+        if valid.any():
+            values = values[valid]
+            low, high = values.min(), values.max()
+            if self.minimum is None or low < self.minimum:
+                self.minimum = low
+            if self.maximum is None or high > self.maximum:
+                self.maximum = high
+
+
+class BoundsCounter(object):
+    '''
+    Counts the values of a coordinate variable outside of their cells, the
+    range of the vertices given by its boundary variable.  The values are
+    compared unpacked, as the two variables may be packed differently.
+    Missing values and NaNs aren't counted.  Called with aligned chunks of
+    the coordinate variable and its boundary variable.
+
+    :param list missing: Raw missing values of the coordinate variable
+    :param tuple coordinate_packing: Packing of the coordinate variable, see
+                                     packing
+    :param tuple bounds_packing: Packing of the boundary variable
+    '''
+
+    def __init__(self, missing, coordinate_packing=(None, None),
+                 bounds_packing=(None, None)):
+        self.missing = missing
+        self.coordinate_packing = coordinate_packing
+        self.bounds_packing = bounds_packing
+        self.count = 0
+        self.invalid = 0
+
+    def update(self, chunk, bounds):
+        valid = valid_mask(chunk, self.missing)
+        values = _unpack(chunk, self.coordinate_packing)
+        if values.dtype.kind == 'f':
+            valid &= ~np.isnan(values)
+        cells = _unpack(bounds, self.bounds_packing).reshape(bounds.shape[0], -1)
+        outside = (values < cells.min(axis=1)) | (values > cells.max(axis=1))
+        self.count += int(np.count_nonzero(valid))
+        self.invalid += int(np.count_nonzero(outside & valid))
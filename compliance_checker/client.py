@@ -0,0 +1,147 @@
+'''
+Client for the compliance checker daemon
+
+Imports nothing beyond the standard library and six, so that handing a check
+over to a running daemon (see compliance_checker.server) avoids the imports
+and checker loading which the daemon exists to skip.
+'''
+from __future__ import print_function, unicode_literals
+import io
+import json
+import os
+import sys
+from contextlib import closing
+
+from six.moves.urllib.error import HTTPError, URLError
+from six.moves.urllib.request import Request, urlopen
+
+
+DEFAULT_ADDRESS = ('localhost', 8765)
+
+# header carrying the token which authenticates check requests
+TOKEN_HEADER = 'X-Compliance-Checker-Token'
+
+
+class DaemonError(RuntimeError):
+    '''
+    Raised when the daemon could not run a check request
+    '''
+
+
+def parse_address(address):
+    '''
+    Returns a (host, port) tuple from a "host:port", ":port" or "port" string
+
+    :param str address: Address of the daemon
+    '''
+    if isinstance(address, tuple):
+        return address
+    host, _, port = address.rpartition(':')
+    return (host or DEFAULT_ADDRESS[0], int(port))
+
+
+def _url(address, path):
+    return 'http://{}:{}{}'.format(*(parse_address(address) + (path,)))
+
+
+def token_path(address):
+    '''
+    Returns the path of the file holding the token of the daemon listening
+    on the port of the address.  The daemon creates it readable only by the
+    user running it, so only that user can hand it checks.
+
+    :param address: (host, port) tuple or "host:port" string
+    '''
+    return os.path.join(os.path.expanduser('~'),
+                        '.compliance_checker_daemon_{}'.format(
+                            parse_address(address)[1]))
+
+
+def read_token(address):
+    '''
+    Returns the token of the daemon listening on the address, or None if the
+    token file is missing or can't be read.
+
+    :param address: (host, port) tuple or "host:port" string
+    '''
+    try:
+        with io.open(token_path(address), encoding='utf-8') as f:
+            return f.read().strip()
+    except (IOError, OSError):
+        return None
+
+
+def daemon_status(address=DEFAULT_ADDRESS):
+    '''
+    Returns the status reported by the daemon at the address, a dict with
+    its version and loaded checkers, or None if no daemon is listening.
+
+    :param address: (host, port) tuple or "host:port" string
+    '''
+    try:
+        with closing(urlopen(_url(address, '/status'), timeout=1)) as response:
+            return json.loads(response.read().decode('utf-8'))
+    except (URLError, IOError, ValueError):
+        return None
+
+
+def forward_to_daemon(address, ds_loc, checker_names, verbose, criteria,
+                      skip_checks=None, output_filename='-',
+                      output_format=['text'], max_workers=None,
+                      metadata_only=False, fail_fast=None, only_checks=None,
+                      sections=None, http_cache=False, crawl_sos=None,
+                      check_data=False, sample=None, max_memory=None,
+                      token=None):
+    '''
+    Sends a check request to a running daemon and writes the report it
+    returns to stdout and stderr.  Takes the same arguments as
+    ComplianceChecker.run_checker after the daemon address and returns the
+    same (passed, errors) tuple.  Relative paths are resolved by the daemon
+    against the current working directory of the client.
+
+    :param address: (host, port) tuple or "host:port" string
+    :param str token: Token authenticating the request, read from the token
+                      file of the daemon by default
+    '''
+    token = token or read_token(address)
+    if token is None:
+        raise DaemonError("Could not read the token of the compliance checker "
+                          "daemon from {}".format(token_path(address)))
+    options = {
+        'cwd': os.getcwd(),
+        'ds_loc': ds_loc,
+        'checker_names': checker_names,
+        'verbose': verbose,
+        'criteria': criteria,
+        'skip_checks': skip_checks,
+        'output_filename': output_filename,
+        'output_format': output_format,
+        'max_workers': max_workers,
+        'metadata_only': metadata_only,
+        'fail_fast': fail_fast,
+        'only_checks': only_checks,
+        'sections': sections,
+        'http_cache': http_cache,
+        'crawl_sos': crawl_sos,
+        'check_data': check_data,
+        'sample': sample,
+        'max_memory': max_memory,
+    }
+    request = Request(_url(address, '/check'),
+                      data=json.dumps(options).encode('utf-8'),
+                      headers={'Content-Type': 'application/json',
+                               TOKEN_HEADER: token})
+    try:
+        response = urlopen(request)
+    except HTTPError as e:
+        body = json.loads(e.read().decode('utf-8'))
+        raise DaemonError(body.get('error', e.reason))
+    except URLError as e:
+        raise DaemonError("Could not reach the compliance checker daemon at "
+                          "{}: {}".format(_url(address, ''), e.reason))
+    with closing(response):
+        body = json.loads(response.read().decode('utf-8'))
+
+    sys.stdout.write(body['stdout'])
+    sys.stderr.write(body['stderr'])
+    return body['passed'], body['errors']
@@ -0,0 +1,262 @@
+'''
+Parsing of ISO 8601 dates and of CF time references
+
+The date checks of ACDD and IOOS validate and parse ISO 8601 attributes with
+isodate and pendulum, and CF time units ("<units> since <reference date>")
+are parsed by cf_units and cftime every time they're looked at.  All of them
+are slow to import and slower still to call once per attribute, variable and
+value.  The common forms are handled here instead, with compiled regular
+expressions and numpy, and the results cached by string.  Anything else is
+handed to the library the checks used before, imported only when it's
+needed, so the results are the same either way.
+'''
+from __future__ import unicode_literals
+import re
+from datetime import datetime, timedelta, tzinfo
+
+import numpy as np
+
+try:
+    from functools import lru_cache
+# Fallback for Python < 3.2
+except ImportError:
+    from functools32 import lru_cache
+
+try:
+    from datetime import timezone
+# Fallback for Python < 3.2
+except ImportError:
+    class timezone(tzinfo):
+        '''
+        Fixed offset from UTC, standing in for datetime.timezone
+        '''
+        def __init__(self, offset):
+            self._offset = offset
+
+        def utcoffset(self, dt):
+            return self._offset
+
+        def dst(self, dt):
+            return timedelta(0)
+
+        def tzname(self, dt):
+            if not self._offset:
+                return 'UTC'
+            minutes = int(self._offset.total_seconds()) // 60
+            sign = '-' if minutes < 0 else '+'
+            return 'UTC{}{:02d}:{:02d}'.format(sign, *divmod(abs(minutes), 60))
+
+        def __eq__(self, other):
+            return isinstance(other, timezone) and self._offset == other._offset
+
+        def __ne__(self, other):
+            return not self == other
+
+        def __hash__(self):
+            return hash(self._offset)
+
+        def __repr__(self):
+            return 'timezone({!r})'.format(self._offset)
+
+    timezone.utc = timezone(timedelta(0))
+
+
+# extended format dates, with an optional time of day and time zone
+ISO_DATETIME = re.compile(
+    r'^(\d{4})-(\d{2})-(\d{2})'
+    r'(?:T(\d{2})(?::(\d{2})(?::(\d{2})(?:[.,](\d+))?)?)?'
+    r'(Z|[+-]\d{2}(?::?\d{2})?)?)?\Z')
+
+# reference date of a time unit, as cftime and udunits read it
+_REFERENCE = re.compile(
+    r'^(\d{4})-(\d{1,2})-(\d{1,2})'
+    r'(?:[T ](\d{1,2}):(\d{1,2})(?::(\d{1,2})(?:\.(\d+))?)?)?'
+    r'\s*(?:Z|UTC)?$')
+
+# seconds in each unit of time cftime and udunits both understand
+TIME_UNITS = {
+    'microseconds': 1e-6, 'microsecond': 1e-6, 'microsec': 1e-6, 'microsecs': 1e-6,
+    'milliseconds': 1e-3, 'millisecond': 1e-3, 'millisec': 1e-3, 'millisecs': 1e-3,
+    'ms': 1e-3,
+    'seconds': 1., 'second': 1., 'secs': 1., 'sec': 1., 's': 1.,
+    'minutes': 60., 'minute': 60., 'min': 60.,
+    'hours': 3600., 'hour': 3600., 'hr': 3600., 'h': 3600.,
+    'days': 86400., 'day': 86400., 'd': 86400.,
+}
+
+# calendars which are the proleptic Gregorian one, from the given date on
+_GREGORIAN = {
+    'standard': datetime(1582, 10, 15),
+    'gregorian': datetime(1582, 10, 15),
+    'proleptic_gregorian': datetime(1, 1, 1),
+}
+
+_MAX_DATE = datetime(9999, 12, 31, 23, 59, 59)
+
+
+def _microseconds(fraction):
+    # fractions of a second are truncated to microseconds, like isodate does
+    return int((fraction or '0')[:6].ljust(6, '0'))
+
+
+@lru_cache(1024)
+def _parse_iso(date_str):
+    '''
+    Returns the aware datetime of an extended format ISO 8601 date, in UTC
+    if it has no time zone, or None if the string isn't in that format
+    '''
+    match = ISO_DATETIME.match(date_str)
+    if match is None:
+        return None
+    year, month, day, hour, minute, second, fraction, zone = match.groups()
+    tzinfo = timezone.utc
+    try:
+        if zone and zone != 'Z':
+            offset = timedelta(hours=int(zone[1:3]), minutes=int(zone[3:].lstrip(':') or 0))
+            tzinfo = timezone(-offset if zone[0] == '-' else offset)
+        return datetime(int(year), int(month), int(day), int(hour or 0),
+                        int(minute or 0), int(second or 0),
+                        _microseconds(fraction), tzinfo)
+    except ValueError:
+        # out of range, left for the libraries to decide
+        return None
+
+
+def is_iso(date_str):
+    '''
+    Returns True if the string is an ISO 8601 date or date and time, in any
+    of the formats isodate accepts
+
+    :param str date_str: Date string
+    '''
+    try:
+        if _parse_iso(date_str) is not None:
+            return True
+    except TypeError:
+        return False
+    import isodate
+    try:
+        if len(date_str) > 10:
+            isodate.parse_datetime(date_str)
+        else:
+            isodate.parse_date(date_str)
+        return True
+    except Exception:
+        return False
+
+
+def parse_iso(date_str):
+    '''
+    Returns an aware datetime parsed from an ISO 8601 string, in UTC if the
+    string has no time zone.  Raises ValueError if it can't be parsed.
+
+    :param str date_str: An ISO-8601 string
+    '''
+    dt = _parse_iso(date_str)
+    if dt is not None:
+        return dt
+    import pendulum
+    try:
+        dt = pendulum.parse(date_str)
+    except Exception as e:
+        raise ValueError("Can't parse {!r}: {}".format(date_str, e))
+    if not isinstance(dt, datetime):
+        # durations and times of day
+        raise ValueError("{!r} is not a date".format(date_str))
+    return datetime(dt.year, dt.month, dt.day, dt.hour, dt.minute, dt.second,
+                    dt.microsecond, timezone(dt.utcoffset()))
+
+
+@lru_cache(256)
+def time_reference(units):
+    '''
+    Returns the length of the units in seconds and the naive UTC reference
+    date of CF time units like "days since 1970-01-01", or None if they
+    aren't in a form parsed here
+
+    :param str units: Time units
+    '''
+    parts = units.strip().split(None, 2)
+    if len(parts) != 3 or parts[1] != 'since' or parts[0] not in TIME_UNITS:
+        return None
+    match = _REFERENCE.match(parts[2].strip())
+    if match is None:
+        return None
+    year, month, day, hour, minute, second, fraction = match.groups()
+    try:
+        reference = datetime(int(year), int(month), int(day), int(hour or 0),
+                             int(minute or 0), int(second or 0),
+                             _microseconds(fraction))
+    except ValueError:
+        return None
+    return TIME_UNITS[parts[0]], reference
+
+
+@lru_cache(256)
+def is_time_reference(units):
+    '''
+    Returns True if the units are valid CF time units, "<units> since
+    <reference date>", as udunits reads them
+
+    :param str units: Units string
+    '''
+    if time_reference(units) is not None:
+        return True
+    from cf_units import Unit
+    try:
+        return Unit(units).is_time_reference()
+    except ValueError:
+        return False
+
+
+def decode_times(values, units, calendar='standard'):
+    '''
+    Converts an array of times to numpy datetime64 values with microsecond
+    precision, vectorized.  Raises ValueError for units, calendars or values
+    which can't be converted this way, e.g. dates before the Gregorian
+    calendar in the standard calendar, or masked values, which netCDF4's
+    num2date has to handle.
+
+    :param values: Numeric array or scalar of times
+    :param str units: CF time units
+    :param str calendar: CF calendar of the times
+    '''
+    reference = time_reference(units)
+    start = _GREGORIAN.get(calendar)
+    if reference is None or start is None:
+        raise ValueError("Can't decode times in {!r} ({})".format(units, calendar))
+    seconds, epoch = reference
+    if np.ma.is_masked(values):
+        raise ValueError("Can't decode masked times")
+    values = np.asarray(np.ma.getdata(values), dtype=np.float64)
+    if not np.all(np.isfinite(values)):
+        raise ValueError("Can't decode non finite times")
+    microseconds = np.round(values * (seconds * 1e6))
+    epoch = np.datetime64(epoch, 'us')
+    lowest = (np.datetime64(start, 'us') - epoch).astype(np.float64)
+    highest = (np.datetime64(_MAX_DATE, 'us') - epoch).astype(np.float64)
+    if microseconds.size and (microseconds.min() < lowest or microseconds.max() > highest):
+        raise ValueError("Times out of the range of the Gregorian calendar")
+    return epoch + microseconds.astype(np.int64).astype('timedelta64[us]')
+
+
+def num2datetime(value, units, calendar='standard'):
+    '''
+    Returns the aware UTC datetime of a time value, like netCDF4's num2date
+    but always as a Python datetime
+
+    :param value: Numeric time
+    :param str units: CF time units
+    :param str calendar: CF calendar of the time
+    '''
+    try:
+        dt = decode_times(value, units, calendar).item()
+    except ValueError:
+        from netCDF4 import num2date
+        try:
+            dt = num2date(value, units, calendar, only_use_cftime_datetimes=False,
+                          only_use_python_datetimes=True)
+        except TypeError:
+            # versions always returning datetimes for real world calendars
+            dt = num2date(value, units, calendar)
+    return dt.replace(tzinfo=timezone.utc)
@@ -0,0 +1,295 @@
+'''
+Header-only datasets
+
+Lightweight stand-ins for netCDF4 Dataset, Variable and Dimension objects
+which hold only the metadata of a dataset: its dimensions, attributes,
+variable shapes and data types.  They are built without the netCDF library,
+e.g. from the header of a classic format file or the DAS and DDS of an
+OPeNDAP dataset, and are used to run checks which don't need to read
+variable data.
+'''
+from __future__ import unicode_literals
+from collections import OrderedDict
+
+import numpy as np
+from netCDF4 import Dataset
+try:
+    from functools import lru_cache
+# Fallback for Python < 3.2
+except ImportError:
+    from functools32 import lru_cache
+
+from compliance_checker.protocols import netcdf, opendap
+
+# length of the character dimension netCDF gives DAP strings
+DAP_STRLEN = 64
+
+
+class HeaderAttributes(object):
+    '''
+    Mixin exposing a `_attributes` OrderedDict the way netCDF4 exposes
+    netCDF attributes, both as python attributes and through ncattrs and
+    getncattr.
+    '''
+
+    def ncattrs(self):
+        return list(self._attributes)
+
+    def getncattr(self, name):
+        try:
+            return self._attributes[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __getattr__(self, name):
+        # only called when normal attribute lookup fails
+        if name.startswith('__') or name == '_attributes':
+            raise AttributeError(name)
+        return self.getncattr(name)
+
+
+class HeaderDimension(object):
+    '''
+    Header-only equivalent of a netCDF4 Dimension
+    '''
+
+    def __init__(self, name, size, unlimited=False):
+        self.name = name
+        self.size = size
+        self._unlimited = unlimited
+
+    def __len__(self):
+        return self.size
+
+    def isunlimited(self):
+        return self._unlimited
+
+    def __repr__(self):
+        return '<HeaderDimension {}: {}{}>'.format(
+            self.name, self.size, ' (unlimited)' if self._unlimited else '')
+
+
+class HeaderVariable(HeaderAttributes):
+    '''
+    Header-only equivalent of a netCDF4 Variable.  Reading data from it
+    raises an error, unless the dataset has a source of data.
+    '''
+
+    def __init__(self, dataset, name, dimensions, dtype, attributes):
+        self._dataset = dataset
+        self.name = self._name = name
+        self.dimensions = tuple(dimensions)
+        if isinstance(dtype, np.dtype):
+            # netCDF4 always reports native byte order
+            dtype = dtype.newbyteorder('=')
+        self.dtype = self.datatype = dtype
+        self._attributes = attributes
+
+    @property
+    def shape(self):
+        return tuple(len(self._dataset.dimensions[d]) for d in self.dimensions)
+
+    @property
+    def ndim(self):
+        return len(self.dimensions)
+
+    @property
+    def size(self):
+        size = 1
+        for length in self.shape:
+            size *= length
+        return size
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        source = self._dataset.data_source()
+        if source is None:
+            raise IOError("Variable data for {} is not available from a "
+                          "header-only dataset".format(self.name))
+        return source.variables[self.name][key]
+
+    def __repr__(self):
+        return '<HeaderVariable {} {}{}>'.format(self.dtype, self.name,
+                                                 self.dimensions)
+
+
+class HeaderDataset(HeaderAttributes):
+    '''
+    Header-only equivalent of a netCDF4 Dataset
+    '''
+
+    def __init__(self, path, attributes=None):
+        self._path = path
+        self._attributes = attributes or OrderedDict()
+        self.dimensions = OrderedDict()
+        self.variables = OrderedDict()
+        # opens the netCDF4 Dataset variable data is read from, if any
+        self._open_source = None
+        self._source = None
+
+    @classmethod
+    def from_classic(cls, path):
+        '''
+        Builds a dataset from the header of a classic, 64-bit offset or
+        64-bit data netCDF file without opening it with the netCDF library.
+
+        :param str path: Path to the netCDF file
+        '''
+        header = netcdf.read_classic_header(path)
+        ds = cls(path, header.attributes)
+        ds._header = header
+        for dim in header.dimensions:
+            # a zero length dimension in the header is the record dimension
+            unlimited = dim.size == 0
+            size = (header.numrecs or 0) if unlimited else dim.size
+            ds.dimensions[dim.name] = HeaderDimension(dim.name, size,
+                                                      unlimited)
+        for var in header.variables:
+            ds.variables[var.name] = HeaderVariable(ds, var.name,
+                                                    var.dimensions, var.dtype,
+                                                    var.attributes)
+        return ds
+
+    @classmethod
+    def from_opendap(cls, url, das=None, dds=None, session=None):
+        '''
+        Builds a dataset from the DAS and DDS of an OPeNDAP dataset without
+        the netCDF library, fetching whichever of them isn't given.  Variable
+        data is read through netCDF4, which only opens the URL if a variable
+        is read.  Raises DAPError for datasets with structures or sequences.
+
+        :param str url: OPeNDAP endpoint of the dataset
+        :param str das: Data Attribute Structure, e.g. from detect_opendap
+        :param str dds: Dataset Descriptor Structure
+        :param session: Object with a `get` method like requests.get to
+                        fetch the DAS and DDS with
+        '''
+        if das is None:
+            response = opendap.detect_opendap(url, session)
+            if response is None or response.status_code != 200:
+                raise opendap.DAPError("No DAS for {}".format(url))
+            das = response.text
+        containers = opendap.parse_das(das)
+        declarations = opendap.parse_dds(dds if dds is not None
+                                         else opendap.fetch_dds(url, session))
+
+        attributes = OrderedDict()
+        for name, container in containers.items():
+            if name == 'NC_GLOBAL' or name.endswith('_GLOBAL'):
+                attributes.update(container)
+        ds = cls(url, attributes)
+        ds._open_source = lambda: Dataset(url)
+        extra = containers.get('DODS_EXTRA', {})
+        unlimited = extra.get('Unlimited_Dimension')
+
+        for declaration in declarations:
+            name = declaration.name
+            grid, _, map_name = name.partition('.')
+            if map_name and grid in ds.variables:
+                # a grid map, a coordinate variable of the grid's dimension
+                # which is usually also declared on its own
+                name = map_name
+                if name in ds.variables:
+                    continue
+            dimensions = []
+            for i, (dim, size) in enumerate(zip(declaration.dimensions,
+                                                declaration.shape)):
+                if dim is None:
+                    dim = '{}_{}'.format(name, i)
+                if dim not in ds.dimensions:
+                    ds.dimensions[dim] = HeaderDimension(dim, size,
+                                                         dim == unlimited)
+                dimensions.append(dim)
+            if declaration.type in ('String', 'Url'):
+                # netCDF reads DAP strings as character arrays
+                dtype = np.dtype('S1')
+                dim = 'maxStrlen{}'.format(DAP_STRLEN)
+                if dim not in ds.dimensions:
+                    ds.dimensions[dim] = HeaderDimension(dim, DAP_STRLEN)
+                dimensions.append(dim)
+            else:
+                dtype = opendap.DAS_TYPES[declaration.type]
+            ds.variables[name] = HeaderVariable(
+                ds, name, dimensions, dtype,
+                containers.get(name, OrderedDict()))
+        return ds
+
+    @classmethod
+    def from_dataset(cls, ds, open_source=None):
+        '''
+        Copies the header of an open netCDF4 Dataset, so that checks can use
+        it without the netCDF library, e.g. on several threads at once.
+        Raises ValueError for datasets with groups, which aren't copied.
+
+        :param netCDF4.Dataset ds: An open netCDF dataset
+        :param open_source: Function of the copy returning the object its
+                            variable data is read from, with `variables`
+                            like a netCDF4 Dataset, or None if the copy only
+                            has the header
+        '''
+        if ds.groups:
+            raise ValueError("Can't copy the groups of {}".format(ds.filepath()))
+        ds_copy = cls(ds.filepath(), OrderedDict(
+            (name, ds.getncattr(name)) for name in ds.ncattrs()))
+        for name, dim in ds.dimensions.items():
+            ds_copy.dimensions[name] = HeaderDimension(name, len(dim),
+                                                       dim.isunlimited())
+        for name, var in ds.variables.items():
+            attributes = OrderedDict((attr, var.getncattr(attr))
+                                     for attr in var.ncattrs())
+            ds_copy.variables[name] = HeaderVariable(ds_copy, name,
+                                                     var.dimensions, var.dtype,
+                                                     attributes)
+            # e.g. the VLType of variable length strings
+            ds_copy.variables[name].datatype = var.datatype
+        if open_source is not None:
+            ds_copy._open_source = lambda: open_source(ds_copy)
+        return ds_copy
+
+    def filepath(self):
+        return self._path
+
+    def data_source(self):
+        '''
+        Returns the netCDF4 Dataset variable data is read from, opening it
+        on first use, or None if the dataset only has its header
+        '''
+        if self._source is None and self._open_source is not None:
+            self._source = self._open_source()
+        return self._source
+
+    def close(self):
+        if self._source is not None:
+            self._source.close()
+            self._source = None
+
+    @lru_cache(128)
+    def get_variables_by_attributes(self, **kwargs):
+        '''
+        Returns the variables matching all of the given attribute values, or
+        for which a callable given as the value returns True when passed the
+        attribute value (None if the attribute is missing).  Mirrors
+        netCDF4.Dataset.get_variables_by_attributes.
+        '''
+        matches = []
+        for var in self.variables.values():
+            has_value_flag = False
+            for name, value in kwargs.items():
+                if callable(value):
+                    has_value_flag = value(getattr(var, name, None))
+                    if has_value_flag is False:
+                        break
+                elif hasattr(var, name) and getattr(var, name) == value:
+                    has_value_flag = True
+                else:
+                    has_value_flag = False
+                    break
+            # all attribute name/value pairs must be met
+            if has_value_flag is True:
+                matches.append(var)
+        return matches
+
+    def __repr__(self):
+        return '<HeaderDataset {}>'.format(self._path)
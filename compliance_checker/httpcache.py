@@ -0,0 +1,203 @@
+'''
+On-disk HTTP cache for the metadata of remote datasets
+
+Regular runs over remote catalogues fetch the same OPeNDAP DAS and DDS and
+SOS documents every time, although most of them haven't changed.  HTTPCache
+keeps the bodies of responses which have an ETag or Last-Modified header on
+disk and revalidates them with conditional GETs, so that an unchanged
+document costs an empty 304 response.
+
+It also keeps the results of checking remote datasets which were loaded from
+cached documents alone, along with the validators of those documents.  As
+long as the documents revalidate unchanged, the results of running the same
+checks again are the same, and are reused instead.
+'''
+from __future__ import unicode_literals
+import hashlib
+import io
+import json
+import os
+import tempfile
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from compliance_checker import __version__
+from compliance_checker.base import Result
+from compliance_checker.cf.util import create_cached_data_dir
+
+# headers which describe the body as sent rather than as stored
+_TRANSFER_HEADERS = ('content-encoding', 'content-length', 'transfer-encoding')
+
+
+def _digest(key):
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def _write_atomic(path, data):
+    # readers never see half written files, even with concurrent runs
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    getattr(os, 'replace', os.rename)(tmp, path)
+
+
+def _to_json(obj):
+    # numpy scalars in scores and messages
+    try:
+        return obj.item()
+    except AttributeError:
+        raise TypeError("{!r} is not JSON serializable".format(obj))
+
+
+def _result_from_dict(d):
+    # inverse of Result.serialize, JSON having turned the tuples to lists
+    value = d['value']
+    return Result(d['weight'], tuple(value) if isinstance(value, list) else value,
+                  d['name'], d['msgs'],
+                  [_result_from_dict(child) for child in d['children']])
+
+
+class HTTPCache(object):
+    '''
+    Cache of HTTP responses and of the results of checking the datasets
+    loaded from them.  `get` can be used in place of `requests.get`.
+
+    :param str directory: Directory to keep the cache in, defaults to
+                          `http-cache` in the compliance checker data
+                          directory
+    :param requests.Session session: Session to make the requests with,
+                                     defaults to a new one
+    '''
+
+    def __init__(self, directory=None, session=None):
+        if directory is None:
+            directory = os.path.join(create_cached_data_dir(), 'http-cache')
+        self.directory = directory
+        self.session = session or requests.Session()
+        for kind in ('responses', 'results'):
+            path = os.path.join(directory, kind)
+            if not os.path.isdir(path):
+                os.makedirs(path)
+        # URL -> (ETag, Last-Modified) of the responses fetched through the
+        # cache, or None for responses which can't be revalidated
+        self.validators = {}
+
+    def _path(self, kind, key, extension):
+        return os.path.join(self.directory, kind, _digest(key) + extension)
+
+    def _load_entry(self, url):
+        path = self._path('responses', url, '.json')
+        try:
+            with io.open(path, encoding='utf-8') as f:
+                entry = json.load(f)
+            with open(self._path('responses', url, '.body'), 'rb') as f:
+                body = f.read()
+        except (IOError, OSError, ValueError):
+            return None, None
+        # digests could collide
+        if entry.get('url') != url:
+            return None, None
+        return entry, body
+
+    def get(self, url, **kwargs):
+        '''
+        Returns the response to a GET request of the URL, like requests.get.
+        Cached responses are revalidated with a conditional request and
+        returned from the cache if the server replies they're unchanged.
+        '''
+        entry, body = self._load_entry(url)
+        headers = dict(kwargs.pop('headers', None) or {})
+        if entry is not None:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+        response = self.session.get(url, headers=headers, **kwargs)
+
+        if response.status_code == 304 and entry is not None:
+            self.validators[url] = (entry['etag'], entry['last_modified'])
+            cached = requests.Response()
+            cached.url = url
+            cached.status_code = entry['status_code']
+            cached.headers = CaseInsensitiveDict(entry['headers'])
+            cached.encoding = entry['encoding']
+            cached._content = body
+            return cached
+
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if response.status_code == 200 and (etag or last_modified):
+            self.validators[url] = (etag, last_modified)
+            entry = {
+                'url': url,
+                'status_code': response.status_code,
+                'headers': dict((name, value) for name, value in response.headers.items()
+                                if name.lower() not in _TRANSFER_HEADERS),
+                'encoding': response.encoding,
+                'etag': etag,
+                'last_modified': last_modified,
+            }
+            _write_atomic(self._path('responses', url, '.body'), response.content)
+            _write_atomic(self._path('responses', url, '.json'),
+                          json.dumps(entry).encode('utf-8'))
+        else:
+            self.validators[url] = None
+        return response
+
+    def fingerprint(self, urls):
+        '''
+        Returns the validators of the responses to the URLs, last fetched
+        through the cache, or None if any of them can't be revalidated
+
+        :param list urls: URLs of the documents a dataset was loaded from
+        '''
+        validators = [self.validators.get(url) for url in urls]
+        if not urls or None in validators:
+            return None
+        return [[url] + list(v) for url, v in zip(urls, validators)]
+
+    def _results_path(self, options):
+        # the results of other versions of the compliance checker may
+        # differ; those of other versions of the checkers too, so
+        # CheckSuite.run_cached includes them in the options
+        key = json.dumps([__version__, options], sort_keys=True)
+        return self._path('results', key, '.json')
+
+    def load_results(self, options, fingerprint):
+        '''
+        Returns the results stored for the options and fingerprint, as
+        returned by CheckSuite.run, or None if there are none
+
+        :param options: JSON serializable options the results depend on,
+                        including the location of the dataset
+        :param list fingerprint: Fingerprint of the documents the dataset
+                                 was loaded from, see `fingerprint`
+        '''
+        if fingerprint is None:
+            return None
+        try:
+            with io.open(self._results_path(options), encoding='utf-8') as f:
+                stored = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        if stored['fingerprint'] != fingerprint:
+            return None
+        return dict((checker, ([_result_from_dict(r) for r in groups], {}))
+                    for checker, groups in stored['results'].items())
+
+    def store_results(self, options, fingerprint, score_groups):
+        '''
+        Stores the results of CheckSuite.run for the options and fingerprint.
+        Results with errors, or of datasets which can't be revalidated,
+        aren't stored.
+        '''
+        if fingerprint is None or any(errors for _, errors in score_groups.values()):
+            return
+        stored = {
+            'fingerprint': fingerprint,
+            'results': dict((checker, [r.serialize() for r in groups])
+                            for checker, (groups, _) in score_groups.items()),
+        }
+        _write_atomic(self._results_path(options),
+                      json.dumps(stored, default=_to_json).encode('utf-8'))
@@ -0,0 +1,802 @@
+'''
+Shared inputs for check methods
+
+Many checks need the same derived information about a dataset, such as which
+variable holds time or the range of the latitude data.  Check methods declare
+the inputs they use with the `requires` decorator and fetch them with
+`get_input`.  When checks are run through a CheckSuite, every input required
+by the selected checks is computed exactly once per dataset before any check
+runs, metadata-only inputs first and then all of the inputs which read
+variable data, back to back.  Outside of a CheckSuite run `get_input` simply
+computes the input on demand.
+
+Inputs which read variable data can also declare which reads they will make.
+For remote datasets those reads are then batched into as few OPeNDAP
+requests as possible before the inputs are computed, and the inputs get
+their data from `read_data`, see compliance_checker.remote.
+'''
+from __future__ import unicode_literals
+import os
+import sys
+import threading
+import weakref
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+import requests
+from netCDF4 import default_fillvals
+
+from compliance_checker import cfutil, chunks, remote
+from compliance_checker.protocols import netcdf, opendap
+from compliance_checker.util import isstring
+
+
+InputProvider = namedtuple('InputProvider', ['name', 'func', 'reads_data',
+                                             'reads', 'wanted'])
+
+# input name -> InputProvider, in registration order
+_providers = OrderedDict()
+
+# dataset -> InputCache, only populated while a CheckSuite is running
+_caches = weakref.WeakKeyDictionary()
+
+
+def input_provider(name, reads_data=False, reads=None, wanted=None):
+    '''
+    Decorator which registers a function of a dataset as the provider of a
+    named input.
+
+    :param str name: Name of the input checks refer to
+    :param bool reads_data: True if the function reads variable data rather
+                            than just the header
+    :param reads: Function of a dataset returning the (variable name, index)
+                  pairs the provider reads with `read_data`, so that reads
+                  of remote datasets can be batched
+    :param wanted: Function of a dataset returning False if the checks
+                   requiring the input won't use it, e.g. because the
+                   attributes it is compared with are missing.  Such inputs
+                   aren't computed ahead of time, only if a check asks for
+                   them.
+    '''
+    def _inner(func):
+        _providers[name] = InputProvider(name, func, reads_data, reads, wanted)
+        return func
+    return _inner
+
+
+def requires(*names):
+    '''
+    Decorator to declare the named inputs a check method uses, so that they
+    can be computed ahead of time by the CheckSuite.
+    '''
+    for name in names:
+        if name not in _providers:
+            raise KeyError("Unknown check input '{}'".format(name))
+
+    def _inner(func):
+        func._cc_requires = tuple(getattr(func, '_cc_requires', ())) + names
+        return func
+    return _inner
+
+
+def requires_with_data(*names):
+    '''
+    Decorator to declare named inputs a check method only uses when the
+    CheckSuite run validates data (`check_data`), see checking_data.
+    '''
+    for name in names:
+        if name not in _providers:
+            raise KeyError("Unknown check input '{}'".format(name))
+
+    def _inner(func):
+        func._cc_requires_with_data = (
+            tuple(getattr(func, '_cc_requires_with_data', ())) + names)
+        return func
+    return _inner
+
+
+def get_requirements(check_method, check_data=False):
+    '''
+    Returns the tuple of input names declared by a check method, including
+    those it only uses when validating data if check_data is True
+    '''
+    names = getattr(check_method, '_cc_requires', ())
+    if check_data:
+        names += getattr(check_method, '_cc_requires_with_data', ())
+    return names
+
+
+def reads_data(name):
+    '''
+    Returns True if the named input is computed from variable data
+    '''
+    return _providers[name].reads_data
+
+
+def _wanted(ds, name):
+    wanted = _providers[name].wanted
+    if wanted is None:
+        return True
+    try:
+        return bool(wanted(ds))
+    except Exception:
+        # left for the check to find out
+        return True
+
+
+class InputCache(object):
+    '''
+    Computed inputs for a single dataset.  Failures are remembered and raised
+    again to each check asking for the failed input, so they are reported
+    against the check just as if the check had computed the input itself.
+
+    :param chunks.Sample sample: Sample of the chunks of each variable the
+                                 inputs which read every value of variables
+                                 read instead, or None to read them all
+    :param chunks.MemoryBudget budget: Budget which the chunks of data read
+                                       are planned to fit in, or None to
+                                       read variables whole where they were
+    :param bool check_data: True if the run validates data, see
+                            checking_data
+    '''
+    def __init__(self, ds, sample=None, budget=None, check_data=False):
+        self._ds_ref = weakref.ref(ds)
+        self._values = {}
+        self._errors = {}
+        # (variable name, index) -> data read ahead of time
+        self.data = {}
+        self.sample = sample
+        self.budget = budget
+        self.check_data = check_data
+        # variable name -> (values read, values of the variable), for the
+        # variables only a sample was read of
+        self.sampled = {}
+        self._lock = threading.RLock()
+        # input name -> lock held while computing it
+        self._computing = {}
+
+    def get(self, name, ds=None):
+        '''
+        Returns the value of the named input, computing it if it hasn't
+        been yet.  Different inputs can be computed on several threads at
+        once.
+
+        :param str name: Name of the input
+        :param ds: Dataset to compute the input from, the dataset of the
+                   cache or a copy sharing it, see share.  None for the
+                   dataset of the cache.
+        '''
+        with self._lock:
+            computing = self._computing.setdefault(name, threading.RLock())
+        with computing:
+            if name not in self._values and name not in self._errors:
+                try:
+                    self._values[name] = _providers[name].func(
+                        self._ds_ref() if ds is None else ds)
+                except Exception:
+                    self._errors[name] = sys.exc_info()[1]
+        if name in self._errors:
+            raise self._errors[name]
+        return self._values[name]
+
+    def prefetch(self, names):
+        '''
+        Computes all of the named inputs which are wanted for the dataset,
+        metadata-only inputs first so that all variable data reads happen
+        together afterwards.
+        '''
+        ds = self._ds_ref()
+        ordered = sorted(set(name for name in names if _wanted(ds, name)),
+                         key=lambda n: (_providers[n].reads_data,
+                                        list(_providers).index(n)))
+        batched = False
+        for name in ordered:
+            if _providers[name].reads_data and not batched:
+                # all metadata-only inputs are known by now
+                self.batch_reads(ordered)
+                batched = True
+            try:
+                self.get(name)
+            except Exception:
+                pass
+
+    def batch_reads(self, names):
+        '''
+        Reads the data the named inputs declare they read from a remote
+        dataset, in as few requests as possible
+        '''
+        ds = self._ds_ref()
+        if not remote.is_remote(ds):
+            return
+        reads = []
+        for name in names:
+            provider = _providers[name]
+            if provider.reads is None:
+                continue
+            try:
+                reads.extend(provider.reads(ds))
+            except Exception:
+                # the input fails the same way when it is computed
+                pass
+        if self.sample is not None or self.budget is not None:
+            # variables which would be read whole are read in chunks instead
+            reads = [read for read in reads if read[1] is not Ellipsis]
+        if reads:
+            try:
+                self.data.update(remote.read_batched(ds, reads))
+            except (opendap.DAPError, IOError, requests.RequestException,
+                    ValueError) as e:
+                # the inputs read their data themselves then
+                remote.logger.warning("Batched reads of %s failed: %s",
+                                      ds.filepath(), e)
+
+
+def prefetch(ds, names, sample=None, budget=None, check_data=False):
+    '''
+    Creates the input cache for a dataset and computes the named inputs.
+    Returns the cache, or None if the dataset type can't be cached.  Given a
+    chunks.Sample, the inputs which would read every value of variables
+    read a sample of their chunks instead, see sample_note.  Given a
+    chunks.MemoryBudget, all data is read in chunks planned to fit in it.
+    With check_data, the run validates data, see checking_data.
+    '''
+    try:
+        cache = _caches[ds] = InputCache(ds, sample, budget, check_data)
+    except TypeError:
+        # not weak referenceable, inputs are computed on demand instead
+        return None
+    cache.prefetch(names)
+    return cache
+
+
+def share(ds, ds_copy):
+    '''
+    Makes a copy of a dataset, e.g. a header-only copy checks use on
+    several threads, use the inputs cached for the dataset.  Inputs which
+    haven't been computed yet are computed from whichever of the two a check
+    asks for them with.  Release the copy when done.
+    '''
+    cache = _caches.get(ds)
+    if cache is not None:
+        _caches[ds_copy] = cache
+
+
+def release(ds):
+    '''
+    Discards any inputs cached for a dataset
+    '''
+    try:
+        _caches.pop(ds, None)
+    except TypeError:
+        pass
+
+
+def get_input(ds, name):
+    '''
+    Returns the value of a named input for a dataset, using the value
+    precomputed by a CheckSuite run if there is one.
+
+    :param netCDF4.Dataset ds: An open netCDF dataset
+    :param str name: Name of the input
+    '''
+    cache = _caches.get(ds)
+    if cache is None:
+        return _providers[name].func(ds)
+    return cache.get(name, ds)
+
+
+def sample_note(ds, name, invalid=None, count=None):
+    '''
+    Returns a note that the values of a variable an input was computed from
+    are only a sample of them, see chunks.describe_sample, or None if every
+    value was read
+
+    :param netCDF4.Dataset ds: An open netCDF dataset
+    :param str name: Name of the variable
+    :param int invalid: Number of invalid values found in the sample
+    :param int count: Number of values of the sample checked
+    '''
+    cache = _caches.get(ds)
+    if cache is None or name not in cache.sampled:
+        return None
+    read, total = cache.sampled[name]
+    return chunks.describe_sample(read, total, invalid, count)
+
+
+def checking_data(ds):
+    '''
+    Returns True if the CheckSuite run checking a dataset validates data
+    (`check_data`), so that the inputs declared with requires_with_data
+    are computed for it
+    '''
+    cache = _caches.get(ds)
+    return cache is not None and cache.check_data
+
+
+def _sample(ds):
+    # the sample of the chunks to read of the CheckSuite run, if any
+    cache = _caches.get(ds)
+    return None if cache is None else cache.sample
+
+
+def _budget(ds):
+    # the memory budget of the CheckSuite run, if any
+    cache = _caches.get(ds)
+    return None if cache is None else cache.budget
+
+
+def _record_coverage(ds, coverage):
+    cache = _caches.get(ds)
+    if cache is not None:
+        with cache._lock:
+            cache.sampled.update(coverage)
+
+
+def _reduce(ds, reducers):
+    '''
+    Streams variables through reducers like chunks.reduce_variables,
+    reading a sample of their chunks if the CheckSuite run samples them,
+    in chunks fitting its memory budget
+    '''
+    with chunks.RawReader(ds, get_input(ds, 'classic_views'), _sample(ds)) as reader:
+        chunks.reduce_variables(reader, reducers, budget=_budget(ds))
+    _record_coverage(ds, reader.coverage)
+
+
+def read_chunks(ds, name, sampled=False):
+    '''
+    Yields the values of a variable as netCDF4 reads them, masked and
+    scaled: whole, like read_data, or chunk by chunk if the CheckSuite run
+    has a memory budget, in chunks planned to fit in it.  With sampled, only
+    the chunks of the sample of the run are read, and noted for
+    sample_note.
+
+    :param netCDF4.Dataset ds: An open netCDF dataset
+    :param str name: Name of the variable
+    :param bool sampled: Read only a sample of the chunks if the run
+                         samples them
+    '''
+    sample = _sample(ds) if sampled else None
+    budget = _budget(ds)
+    variable = ds.variables[name]
+    if (sample is None and budget is None) or not variable.shape:
+        yield read_data(ds, name)
+        return
+    reader = chunks.RawReader(ds, sample=sample)
+    max_bytes = chunks.DEFAULT_CHUNK_BYTES
+    if budget is not None:
+        max_bytes = budget.plan(variable.dtype)
+    index = reader.chunk_index(name, max_bytes)
+    _record_coverage(ds, reader.coverage)
+    for i in index:
+        values = variable[i]
+        with chunks.held(budget, [values]):
+            yield values
+
+
+def read_data(ds, name, index=Ellipsis):
+    '''
+    Returns `ds.variables[name][index]`, or `[:]` for Ellipsis, using the
+    data read ahead of time by a CheckSuite run if there is any.
+
+    :param netCDF4.Dataset ds: An open netCDF dataset
+    :param str name: Name of the variable
+    :param index: Ellipsis for the whole variable or an integer index
+    '''
+    cache = _caches.get(ds)
+    if cache is not None and (name, index) in cache.data:
+        return cache.data[(name, index)]
+    if index is Ellipsis:
+        return ds.variables[name][:]
+    return ds.variables[name][index]
+
+
+###############################################################################
+#
+# Providers
+#
+###############################################################################
+
+def _find_extent_variables(ds, possible_units, standard_name, axis):
+    '''
+    Returns the names of variables which may hold the data for an ACDD
+    geospatial extent, best candidates first.  Variables must have units and
+    are ranked by matching units, standard_name and axis.
+    '''
+    candidates = []
+    for name, var in ds.variables.items():
+        # must have units
+        if not hasattr(var, 'units'):
+            continue
+        score = sum((var.units in possible_units,
+                     getattr(var, 'standard_name', None) == standard_name,
+                     getattr(var, 'axis', None) == axis))
+        if score > 0:
+            candidates.append((score, name))
+
+    return [name for score, name in sorted(candidates, key=lambda c: c[0],
+                                           reverse=True)]
+
+
+# data models netCDF4 reports for classic, 64-bit offset and 64-bit data files
+_CLASSIC_MODELS = ('NETCDF3_CLASSIC', 'NETCDF3_64BIT_OFFSET',
+                   'NETCDF3_64BIT_DATA')
+
+# variable attributes which make netCDF4 transform the values it reads
+_SCALE_ATTRS = ('scale_factor', 'add_offset', '_Unsigned')
+
+
+def _nothing_masked(variable, vmin, vmax):
+    '''
+    Returns True if netCDF4 wouldn't mask any of the values of a variable
+    whose raw data lies within [vmin, vmax]: none of the values it masks as
+    fill is in that range and the range is within the valid range.
+    '''
+    attrs = variable.ncattrs()
+    fills = [default_fillvals.get(variable.dtype.str[1:])]
+    for name in ('_FillValue', 'missing_value'):
+        if name in attrs:
+            fills.extend(np.ravel(variable.getncattr(name)).tolist())
+    valid_min = valid_max = None
+    if 'valid_range' in attrs:
+        valid_min, valid_max = np.ravel(variable.getncattr('valid_range'))[:2]
+    if 'valid_min' in attrs:
+        valid_min = variable.getncattr('valid_min')
+    if 'valid_max' in attrs:
+        valid_max = variable.getncattr('valid_max')
+    try:
+        # comparisons with NaN are False, so NaN extents or fill values are
+        # never taken as unmasked
+        return (all(fill is None or fill < vmin or fill > vmax for fill in fills) and
+                (valid_min is None or vmin >= valid_min) and
+                (valid_max is None or vmax <= valid_max))
+    except (TypeError, ValueError):
+        # e.g. attributes of the wrong type
+        return False
+
+
+def _mapped_extents(ds, name, ignore_nan):
+    '''
+    Returns the minimum and maximum of the data of a variable computed over
+    its memory mapped view, without copying the data, or None if the view
+    can't give the values netCDF4 would read: the variable isn't mapped, is
+    empty or not numeric, is scaled, or may have values netCDF4 masks.
+
+    :param bool ignore_nan: Ignore NaNs, otherwise they are propagated
+    '''
+    view = get_input(ds, 'classic_views').get(name)
+    if view is None or view.size == 0 or view.dtype.kind not in 'iuf':
+        return None
+    variable = ds.variables[name]
+    if any(attr in _SCALE_ATTRS for attr in variable.ncattrs()):
+        return None
+    if ignore_nan:
+        vmin = np.fmin.reduce(view, axis=None)
+        vmax = np.fmax.reduce(view, axis=None)
+    else:
+        vmin, vmax = view.min(), view.max()
+    if not _nothing_masked(variable, vmin, vmax):
+        return None
+    return vmin, vmax
+
+
+def _chunked_extents(ds, name, ignore_nan):
+    '''
+    Returns the minimum and maximum of the unmasked values of a variable,
+    read with read_chunks, or None if it has none.
+
+    :param bool ignore_nan: Ignore NaNs, otherwise they are propagated
+    '''
+    vmin = vmax = None
+    for values in read_chunks(ds, name, sampled=True):
+        values = np.ma.compressed(values)
+        if ignore_nan and values.dtype.kind == 'f':
+            values = values[~np.isnan(values)]
+        if values.size == 0:
+            continue
+        low, high = values.min(), values.max()
+        vmin = low if vmin is None else np.minimum(vmin, low)
+        vmax = high if vmax is None else np.maximum(vmax, high)
+    if vmin is None:
+        return None
+    return vmin, vmax
+
+
+def _variable_extents(ds, names):
+    '''
+    Reads each variable once and returns a 2-tuple of dicts of variable name
+    to the minimum and maximum of its data, ignoring NaNs.  Variables which
+    are entirely NaN are omitted.
+    '''
+    obs_mins = {}
+    obs_maxs = {}
+    for name in names:
+        extents = None
+        if _sample(ds) is None:
+            extents = _mapped_extents(ds, name, ignore_nan=True)
+        if extents is None:
+            extents = _chunked_extents(ds, name, ignore_nan=True)
+        if extents is not None:
+            obs_mins[name], obs_maxs[name] = extents
+    return obs_mins, obs_maxs
+
+
+@input_provider('classic_views')
+def classic_views(ds):
+    '''
+    Memory mapped, zero-copy views of the raw data of each variable of a
+    local classic format file, see netcdf.map_classic_variables.  Empty for
+    any other dataset, including classic format data served over OPeNDAP.
+    '''
+    if getattr(ds, 'data_model', None) not in _CLASSIC_MODELS:
+        return {}
+    try:
+        path = ds.filepath()
+    except ValueError:
+        # in-memory and diskless datasets have no path
+        return {}
+    if not os.path.isfile(path):
+        return {}
+    try:
+        return netcdf.map_classic_variables(path)
+    except (netcdf.ClassicHeaderError, IOError, ValueError):
+        return {}
+
+
+@input_provider('latitude_candidates')
+def latitude_candidates(ds):
+    # imported here, as the CF checks import this module
+    from compliance_checker.cf.util import _possibleyunits
+    return _find_extent_variables(ds, _possibleyunits, 'latitude', 'Y')
+
+
+@input_provider('longitude_candidates')
+def longitude_candidates(ds):
+    from compliance_checker.cf.util import _possiblexunits
+    return _find_extent_variables(ds, _possiblexunits, 'longitude', 'X')
+
+
+@input_provider('time_variable')
+def time_variable(ds):
+    return cfutil.get_time_variable(ds)
+
+
+@input_provider('z_variable')
+def z_variable(ds):
+    return cfutil.get_z_variable(ds)
+
+
+def _whole(input_name):
+    # reads of each variable named by a metadata input, in full
+    return lambda ds: [(name, Ellipsis) for name in get_input(ds, input_name)]
+
+
+def _has_attributes(*names):
+    # the extents are only compared with the global attributes giving them
+    return lambda ds: all(hasattr(ds, name) for name in names)
+
+
+def _z_reads(ds):
+    z_name = get_input(ds, 'z_variable')
+    if z_name is None or not ds.variables[z_name].dimensions:
+        # scalars are read by the check itself
+        return []
+    return [(z_name, Ellipsis)]
+
+
+@input_provider('latitude_extents', reads_data=True,
+                reads=_whole('latitude_candidates'),
+                wanted=_has_attributes('geospatial_lat_min', 'geospatial_lat_max'))
+def latitude_extents(ds):
+    return _variable_extents(ds, get_input(ds, 'latitude_candidates'))
+
+
+@input_provider('longitude_extents', reads_data=True,
+                reads=_whole('longitude_candidates'),
+                wanted=_has_attributes('geospatial_lon_min', 'geospatial_lon_max'))
+def longitude_extents(ds):
+    return _variable_extents(ds, get_input(ds, 'longitude_candidates'))
+
+
+@input_provider('vertical_extents', reads_data=True, reads=_z_reads,
+                wanted=lambda ds: (_has_attributes('geospatial_vertical_min',
+                                                   'geospatial_vertical_max')(ds) and
+                                   bool(_z_reads(ds))))
+def vertical_extents(ds):
+    '''
+    Minimum and maximum of the unmasked values of the vertical coordinate,
+    or None if there is none
+    '''
+    z_name = get_input(ds, 'z_variable')
+    if z_name is None:
+        return None
+    if _sample(ds) is None:
+        extents = _mapped_extents(ds, z_name, ignore_nan=False)
+        if extents is not None:
+            return extents
+    # The array may have fill values, which is allowed in the case of point
+    # features
+    extents = _chunked_extents(ds, z_name, ignore_nan=False)
+    if extents is None:
+        raise ValueError("{} has no unmasked values".format(z_name))
+    return extents
+
+
+def _time_reads(ds):
+    time_variable = get_input(ds, 'time_variable')
+    if time_variable is None:
+        return []
+    return [(time_variable, 0), (time_variable, -1)]
+
+
+@input_provider('time_endpoints', reads_data=True, reads=_time_reads,
+                wanted=_has_attributes('time_coverage_start', 'time_coverage_end'))
+def time_endpoints(ds):
+    '''
+    The first and last raw values of the time variable, or None if there is
+    none.  Time should be monotonically increasing, so this avoids reading
+    the entire array.
+    '''
+    time_variable = get_input(ds, 'time_variable')
+    if time_variable is None:
+        return None
+    return (read_data(ds, time_variable, 0),
+            read_data(ds, time_variable, -1))
+
+
+def _numeric(value):
+    # raw values of a numeric attribute, or None
+    value = np.ravel(value)
+    if value.dtype.kind not in 'iuf':
+        return None
+    return value
+
+
+@input_provider('value_violations', reads_data=True)
+def value_violations(ds):
+    '''
+    Counts of the values of each variable outside of its valid range, and
+    of each flag variable which aren't valid flags, as dicts of variable
+    name to chunks.RangeCounter and chunks.FlagCounter.  Every value of the
+    variables is streamed chunk by chunk, see compliance_checker.chunks.
+    '''
+    ranges, flags, reducers = {}, {}, {}
+    for name, variable in ds.variables.items():
+        if getattr(variable.dtype, 'kind', None) not in ('i', 'u', 'f'):
+            continue
+        attrs = variable.ncattrs()
+        valid_min = valid_max = None
+        if 'valid_range' in attrs:
+            valid_range = _numeric(variable.valid_range)
+            if valid_range is not None and valid_range.size == 2:
+                valid_min, valid_max = valid_range
+        else:
+            if 'valid_min' in attrs and _numeric(variable.valid_min) is not None:
+                valid_min = _numeric(variable.valid_min)[0]
+            if 'valid_max' in attrs and _numeric(variable.valid_max) is not None:
+                valid_max = _numeric(variable.valid_max)[0]
+
+        flag_values = flag_masks = None
+        if 'flag_values' in attrs:
+            flag_values = _numeric(variable.flag_values)
+        if 'flag_masks' in attrs and variable.dtype.kind in 'iu':
+            flag_masks = _numeric(variable.flag_masks)
+            if flag_masks is not None and flag_masks.dtype.kind not in 'iu':
+                flag_masks = None
+
+        missing = chunks.missing_values(variable)
+        if valid_min is not None or valid_max is not None:
+            ranges[name] = chunks.RangeCounter(missing, valid_min, valid_max)
+            reducers.setdefault(name, []).append(ranges[name])
+        if flag_values is not None or flag_masks is not None:
+            flags[name] = chunks.FlagCounter(missing, flag_values, flag_masks)
+            reducers.setdefault(name, []).append(flags[name])
+
+    _reduce(ds, reducers)
+    return ranges, flags
+
+
+def _dimension_size(ds, names):
+    # number of elements of the named dimensions, or None if any is missing
+    if not names or any(name not in ds.dimensions for name in names):
+        return None
+    return int(np.prod([len(ds.dimensions[name]) for name in names]))
+
+
+@input_provider('index_violations', reads_data=True)
+def index_violations(ds):
+    '''
+    Reductions of the variables which lay out ragged and gathered arrays, as
+    dicts of variable name to chunks.CountTotal for the count variables of
+    contiguous ragged arrays, and to chunks.RangeCounter for the index
+    variables of indexed ragged arrays and for compression variables.  The
+    range of an index variable is the positions along the dimensions it
+    indexes.  Each variable is streamed chunk by chunk, see
+    compliance_checker.chunks.  Variables which aren't integers, or whose
+    attributes don't name dimensions, are left to the attribute checks.
+    '''
+    counts, indices, reducers = {}, {}, {}
+    for name, variable in ds.variables.items():
+        if getattr(variable.dtype, 'kind', None) not in ('i', 'u'):
+            continue
+        attrs = variable.ncattrs()
+        size = None
+        if 'sample_dimension' in attrs and variable.sample_dimension in ds.dimensions:
+            counts[name] = chunks.CountTotal()
+            reducers.setdefault(name, []).append(counts[name])
+        if 'instance_dimension' in attrs:
+            size = _dimension_size(ds, [variable.instance_dimension])
+        elif 'compress' in attrs and isstring(variable.compress):
+            size = _dimension_size(ds, cfutil.parse_name_list(variable.compress))
+        if size is not None:
+            # fill values don't index anything either
+            indices[name] = chunks.RangeCounter([], 0, size - 1)
+            reducers.setdefault(name, []).append(indices[name])
+
+    _reduce(ds, reducers)
+    return counts, indices
+
+
+@input_provider('coordinate_values', reads_data=True)
+def coordinate_values(ds):
+    '''
+    Reductions of the values of the numeric coordinate variables, as a dict
+    of variable name to chunks.MonotonicCounter, and a dict of the name of
+    each coordinate variable with a boundary (bounds or climatology)
+    variable to chunks.BoundsCounter.  A coordinate variable is streamed
+    chunk by chunk along with its boundary variable, see
+    compliance_checker.chunks.
+    '''
+    order, cells, reducers = {}, {}, {}
+    for name in cfutil.get_coordinate_variables(ds):
+        variable = ds.variables[name]
+        if getattr(variable.dtype, 'kind', None) not in ('i', 'u', 'f'):
+            continue
+        missing = chunks.missing_values(variable)
+        order[name] = chunks.MonotonicCounter(missing)
+        key = name
+        attrs = variable.ncattrs()
+        boundary = variable.bounds if 'bounds' in attrs else getattr(variable, 'climatology', None)
+        if isstring(boundary) and boundary in ds.variables:
+            bounds = ds.variables[boundary]
+            if (getattr(bounds.dtype, 'kind', None) in ('i', 'u', 'f') and
+                    bounds.ndim == 2 and bounds.shape[0] == variable.shape[0]):
+                cells[name] = chunks.BoundsCounter(missing, chunks.packing(variable),
+                                                   chunks.packing(bounds))
+                key = (name, boundary)
+        reducers[key] = [order[name]] + ([cells[name]] if key != name else [])
+
+    _reduce(ds, reducers)
+    return order, cells
+
+
+def streamed_extents(ds, name):
+    '''
+    Returns the lowest and highest values of a coordinate variable, masked
+    and scaled as netCDF4 reads them, from its values streamed for the
+    coordinate data checks if the CheckSuite run validates data, otherwise
+    None.  Checks using it declare coordinate_values with
+    requires_with_data.
+
+    :param netCDF4.Dataset ds: An open netCDF dataset
+    :param str name: Name of the coordinate variable
+    '''
+    if not checking_data(ds):
+        return None
+    try:
+        order, _ = get_input(ds, 'coordinate_values')
+    except Exception:
+        # left for the coordinate data checks to report
+        return None
+    counter = order.get(name)
+    if counter is None or counter.minimum is None:
+        return None
+    try:
+        values = remote.mask_and_scale(ds.variables[name],
+                                       np.array([counter.minimum, counter.maximum]))
+    except ValueError:
+        return None
+    if np.ma.is_masked(values):
+        # outside of the valid range
+        return None
+    return values.min(), values.max()
@@ -2,7 +2,7 @@
 Check for IOOS-approved attributes
 '''
 from __future__ import unicode_literals
-from compliance_checker.base import BaseCheck, BaseNCCheck, BaseSOSGCCheck, BaseSOSDSCheck, check_has, Result
+from compliance_checker.base import BaseCheck, BaseNCCheck, BaseSOSGCCheck, BaseSOSDSCheck, check_has, Result, max_priority
 from owslib.namespaces import Namespaces
 from lxml.etree import XPath
 from compliance_checker.cfutil import get_geophysical_variables
@@ -145,6 +145,7 @@ class IOOS0_1Check(IOOSNCCheck):
             self._has_var_attr(ds, 'platform', 'comment', 'Station Description'),
         ]
 
+    @max_priority(BaseCheck.MEDIUM)
     def check_variable_names(self, ds):
         """
         Ensures all variables have a standard_name set.
@@ -160,6 +161,7 @@ class IOOS0_1Check(IOOSNCCheck):
 
         return Result(BaseCheck.MEDIUM, (count, len(ds.variables)), 'Variable Names', msgs)
 
+    @max_priority(BaseCheck.LOW)
     def check_altitude_units(self, ds):
         """
         If there's a variable named z, it must have units.
@@ -176,6 +178,7 @@ class IOOS0_1Check(IOOSNCCheck):
 
         return Result(BaseCheck.LOW, (0, 0), 'Altitude Units', ["Dataset has no 'z' variable"])
 
+    @max_priority(BaseCheck.MEDIUM)
     def check_variable_units(self, ds):
         """
         Ensures all variables have units.
@@ -308,6 +311,7 @@ class IOOS1_1Check(IOOSNCCheck):
                 ]
         return results
 
+    @max_priority(BaseCheck.MEDIUM)
     def check_geophysical_vars_fill_value(self, ds):
         '''
         Check that geophysical variables contain fill values.
@@ -2,8 +2,15 @@
 '''
 compliance_checker/protocols/netcdf.py
 
-Functions to assist in determining if the URL points to a netCDF file
+Functions to assist in determining if the URL points to a netCDF file, and
+to read the header and map the data of classic format netCDF files without
+the netCDF library
 '''
+import mmap
+import struct
+from collections import OrderedDict, namedtuple
+
+import numpy as np
 
 
 def is_netcdf(url):
@@ -40,8 +47,9 @@ def is_classic_netcdf(file_buffer):
 
     :param str file_buffer: Byte-array of the first 4 bytes of a file
     '''
-    # CDF.
-    if file_buffer == b'\x43\x44\x46\x01':
+    # CDF. (classic), CDF\x02 (64-bit offset) or CDF\x05 (64-bit data)
+    if file_buffer in (b'\x43\x44\x46\x01', b'\x43\x44\x46\x02',
+                       b'\x43\x44\x46\x05'):
         return True
     return False
 
@@ -57,3 +65,262 @@ def is_hdf5(file_buffer):
     if file_buffer == b'\x89\x48\x44\x46':
         return True
     return False
+
+
+# Header tags from the classic format specification
+_ABSENT = 0
+NC_DIMENSION = 0x0A
+NC_VARIABLE = 0x0B
+NC_ATTRIBUTE = 0x0C
+
+STREAMING = 0xFFFFFFFF
+
+# nc_type -> big endian numpy dtype.  Types 7 and up are only valid in CDF-5
+NC_TYPES = {
+    1: np.dtype('i1'),      # NC_BYTE
+    2: np.dtype('S1'),      # NC_CHAR
+    3: np.dtype('>i2'),     # NC_SHORT
+    4: np.dtype('>i4'),     # NC_INT
+    5: np.dtype('>f4'),     # NC_FLOAT
+    6: np.dtype('>f8'),     # NC_DOUBLE
+    7: np.dtype('u1'),      # NC_UBYTE
+    8: np.dtype('>u2'),     # NC_USHORT
+    9: np.dtype('>u4'),     # NC_UINT
+    10: np.dtype('>i8'),    # NC_INT64
+    11: np.dtype('>u8'),    # NC_UINT64
+}
+
+ClassicHeader = namedtuple('ClassicHeader', ['version', 'numrecs',
+                                             'dimensions', 'attributes',
+                                             'variables', 'header_size'])
+ClassicDimension = namedtuple('ClassicDimension', ['name', 'size'])
+ClassicVariable = namedtuple('ClassicVariable', ['name', 'dimensions',
+                                                 'attributes', 'dtype',
+                                                 'vsize', 'begin'])
+
+
+class ClassicHeaderError(ValueError):
+    '''
+    Raised when a file is not a valid classic format netCDF file
+    '''
+
+
+class _HeaderReader(object):
+    '''
+    Sequential big endian reader over the header of a classic format netCDF
+    file.  CDF-1 uses 32 bit offsets, CDF-2 64 bit offsets, and CDF-5 also
+    uses 64 bit sizes and counts.
+    '''
+    def __init__(self, buf, version):
+        self.buf = buf
+        self.pos = 4
+        self.size_fmt = '>Q' if version == 5 else '>I'
+        self.offset_fmt = '>I' if version == 1 else '>Q'
+
+    def _unpack(self, fmt):
+        try:
+            value, = struct.unpack_from(fmt, self.buf, self.pos)
+        except struct.error:
+            raise ClassicHeaderError("Truncated netCDF header")
+        self.pos += struct.calcsize(fmt)
+        return value
+
+    def int32(self):
+        return self._unpack('>i')
+
+    def size(self):
+        return self._unpack(self.size_fmt)
+
+    def offset(self):
+        return self._unpack(self.offset_fmt)
+
+    def padded_bytes(self, nbytes):
+        start = self.pos
+        if start + nbytes > len(self.buf):
+            raise ClassicHeaderError("Truncated netCDF header")
+        # values are padded to 4 byte boundaries
+        self.pos += nbytes + (-nbytes % 4)
+        return self.buf[start:start + nbytes]
+
+    def name(self):
+        return self.padded_bytes(self.size()).decode('utf-8')
+
+    def list_header(self, expected_tag):
+        tag = self.int32()
+        nelems = self.size()
+        if tag == _ABSENT and nelems == 0:
+            return 0
+        if tag != expected_tag:
+            raise ClassicHeaderError("Unexpected tag {} in netCDF header".format(tag))
+        return nelems
+
+    def nc_type(self):
+        nc_type = self.int32()
+        try:
+            return NC_TYPES[nc_type]
+        except KeyError:
+            raise ClassicHeaderError("Unknown nc_type {}".format(nc_type))
+
+    def attributes(self):
+        attrs = OrderedDict()
+        for _ in range(self.list_header(NC_ATTRIBUTE)):
+            name = self.name()
+            dtype = self.nc_type()
+            nelems = self.size()
+            raw = self.padded_bytes(nelems * dtype.itemsize)
+            attrs[name] = _attribute_value(raw, dtype)
+        return attrs
+
+
+def _attribute_value(raw, dtype):
+    '''
+    Converts raw attribute bytes into the value netCDF4-python would return:
+    a string for character data, a scalar for single values and an array
+    otherwise.
+    '''
+    if dtype.char == 'S':
+        return bytes(raw).decode('utf-8', 'replace').replace('\x00', '')
+    values = np.frombuffer(raw, dtype=dtype).astype(dtype.newbyteorder('='))
+    if values.shape == (1,):
+        return values[0]
+    return values
+
+
+def parse_classic_header(buf):
+    '''
+    Parses the header of a classic, 64-bit offset or 64-bit data (CDF-5)
+    netCDF file from a buffer holding at least the whole header.
+
+    :param buf: bytes, memoryview or mmap of the start of the file
+    :rtype: ClassicHeader
+    '''
+    magic = bytes(buf[:4])
+    if not is_classic_netcdf(magic):
+        raise ClassicHeaderError("Not a classic format netCDF file")
+    version = ord(magic[3:4])
+    reader = _HeaderReader(buf, version)
+
+    numrecs = reader.size()
+    if version != 5 and numrecs == STREAMING:
+        numrecs = None
+
+    dimensions = []
+    for _ in range(reader.list_header(NC_DIMENSION)):
+        dimensions.append(ClassicDimension(reader.name(), reader.size()))
+
+    attributes = reader.attributes()
+
+    variables = []
+    for _ in range(reader.list_header(NC_VARIABLE)):
+        name = reader.name()
+        dimids = [reader.size() for _ in range(reader.size())]
+        try:
+            dims = tuple(dimensions[i].name for i in dimids)
+        except IndexError:
+            raise ClassicHeaderError("Variable {} refers to an unknown dimension".format(name))
+        var_attrs = reader.attributes()
+        dtype = reader.nc_type()
+        vsize = reader.size()
+        begin = reader.offset()
+        variables.append(ClassicVariable(name, dims, var_attrs, dtype, vsize,
+                                         begin))
+
+    return ClassicHeader(version, numrecs, dimensions, attributes, variables,
+                         reader.pos)
+
+
+def read_classic_header(path):
+    '''
+    Reads the header of a classic format netCDF file without the netCDF
+    library.  The file is memory mapped, so only the pages holding the
+    header are actually read from disk.
+
+    :param str path: Path to the netCDF file
+    :rtype: ClassicHeader
+    '''
+    with open(path, 'rb') as f:
+        try:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty files can't be mapped
+            raise ClassicHeaderError("Not a classic format netCDF file")
+        try:
+            return parse_classic_header(buf)
+        finally:
+            buf.close()
+
+
+def _c_strides(shape, itemsize):
+    strides = []
+    stride = itemsize
+    for length in reversed(shape):
+        strides.insert(0, stride)
+        stride *= length
+    return tuple(strides)
+
+
+def map_classic_variables(path):
+    '''
+    Memory maps the data of a classic, 64-bit offset or 64-bit data netCDF
+    file without the netCDF library.  Returns an OrderedDict of variable name
+    to a read-only numpy array viewing the data of the variable in place, in
+    the big endian byte order of the file.  Record variables are strided
+    views over the interleaved records.  Nothing is copied: data is only
+    paged in from disk as the arrays are used, and reductions over them run
+    directly against the page cache.
+
+    The values are raw, without the fill value masking and scaling netCDF4
+    applies when reading variables.
+
+    :param str path: Path to the netCDF file
+    '''
+    header = read_classic_header(path)
+    try:
+        data = np.memmap(path, dtype=np.uint8, mode='r')
+    except ValueError:
+        raise ClassicHeaderError("Not a classic format netCDF file")
+
+    sizes = OrderedDict((dim.name, dim.size) for dim in header.dimensions)
+    # a zero length dimension in the header is the record dimension
+    record_dims = set(name for name, size in sizes.items() if size == 0)
+
+    def record_slab(var):
+        # bytes of one record of a record variable
+        return var.dtype.itemsize * int(np.prod([sizes[d] for d in
+                                                 var.dimensions[1:]]))
+
+    record_vars = [var for var in header.variables
+                   if var.dimensions and var.dimensions[0] in record_dims]
+    if len(record_vars) == 1:
+        # records of a single record variable are not padded
+        recsize = record_slab(record_vars[0])
+    else:
+        recsize = sum(record_slab(var) + (-record_slab(var) % 4)
+                      for var in record_vars)
+
+    numrecs = header.numrecs
+    if numrecs is None:
+        # still being written in streaming mode, count the complete records
+        start = min(var.begin for var in record_vars) if record_vars else 0
+        numrecs = (data.size - start) // recsize if recsize else 0
+
+    views = OrderedDict()
+    for var in header.variables:
+        shape = [sizes[d] for d in var.dimensions]
+        if var in record_vars:
+            shape[0] = numrecs
+            strides = ((recsize,) +
+                       _c_strides(shape[1:], var.dtype.itemsize))
+            nbytes = (numrecs - 1) * recsize + record_slab(var) if numrecs else 0
+        else:
+            strides = _c_strides(shape, var.dtype.itemsize)
+            nbytes = var.dtype.itemsize * int(np.prod(shape))
+        # begin may point past the end of the file when there is no data
+        if nbytes and var.begin + nbytes > data.size:
+            raise ClassicHeaderError("Data of variable {} extends past the "
+                                     "end of the file".format(var.name))
+        view = np.ndarray(tuple(shape), dtype=var.dtype, buffer=data,
+                          offset=min(var.begin, data.size),
+                          strides=tuple(strides))
+        views[var.name] = view
+    return views
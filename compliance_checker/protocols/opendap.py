@@ -2,10 +2,22 @@
 '''
 compliance_checker/protocols/opendap.py
 
-Functions to assist in determining if the URL is an OPeNDAP endpoint
+Functions to assist in determining if the URL is an OPeNDAP endpoint, to
+parse the metadata of one from its DAS and DDS, and to read the data of
+several variables from one in a single DAP2 request
 '''
+import re
+import struct
+from collections import OrderedDict, namedtuple
+
+import numpy as np
 import requests
 
+try:
+    from urllib.parse import quote, unquote
+except ImportError:
+    from urllib import quote, unquote
+
 
 def is_opendap(url):
     '''
@@ -13,14 +25,336 @@ def is_opendap(url):
 
     :param str url: URL for a remote OPeNDAP endpoint
     '''
+    return detect_opendap(url) is not None
+
+
+def detect_opendap(url, session=None):
+    '''
+    Returns the response to the Data Attribute Structure request of the URL
+    if it is a valid OPeNDAP URL, otherwise None.  The DAS of a successful
+    response can be passed on to parse_das.
+
+    :param str url: URL for a remote OPeNDAP endpoint
+    :param session: Object with a `get` method like requests.get to fetch
+                    the DAS with, e.g. an HTTPCache
+    '''
     # If the server replies to a Data Attribute Structure request
     das_url = url + '.das'
-    response = requests.get(das_url, allow_redirects=True)
+    response = (session or requests).get(das_url, allow_redirects=True)
     if 'xdods-server' in response.headers:
-        return True
+        return response
     # Check if it is an access restricted ESGF thredds service
     if response.status_code == 401 and \
         'text/html' in response.headers['content-type'] and \
             'The following URL requires authentication:' in response.text:
-        return True
-    return False
+        return response
+    return None
+
+
+# DAP2 base type -> XDR data type on the wire.  16 bit integers are sent as
+# 32 bit XDR integers, bytes as packed opaque data.
+DAP_TYPES = {
+    'Byte': np.dtype('u1'),
+    'Int16': np.dtype('>i4'),
+    'UInt16': np.dtype('>u4'),
+    'Int32': np.dtype('>i4'),
+    'UInt32': np.dtype('>u4'),
+    'Float32': np.dtype('>f4'),
+    'Float64': np.dtype('>f8'),
+}
+
+# DAP2 base type -> data type of attributes of that type
+DAS_TYPES = {
+    'Byte': np.dtype('u1'),
+    'Int16': np.dtype('i2'),
+    'UInt16': np.dtype('u2'),
+    'Int32': np.dtype('i4'),
+    'UInt32': np.dtype('u4'),
+    'Float32': np.dtype('f4'),
+    'Float64': np.dtype('f8'),
+}
+
+# dimensions is a tuple with a name, or None for anonymous dimensions, for
+# each length in shape
+DAPVariable = namedtuple('DAPVariable', ['name', 'type', 'shape',
+                                         'dimensions'])
+
+
+class DAPError(ValueError):
+    '''
+    Raised when a DAP2 data response is an error or can't be decoded
+    '''
+
+
+def constraint_expression(projections):
+    '''
+    Returns the DAP2 constraint expression projecting the given variables,
+    e.g. `lat,time[0:9:9]`, URL encoded.
+
+    :param list projections: (variable name, hyperslab) pairs.  The hyperslab
+                             is None for the whole variable, or a list of
+                             (start, stride, stop) tuples, one per dimension,
+                             with stop inclusive.
+    '''
+    terms = []
+    for name, hyperslab in projections:
+        term = name
+        for start, stride, stop in hyperslab or ():
+            term += '[{}:{}:{}]'.format(start, stride, stop)
+        terms.append(term)
+    return quote(','.join(terms), safe=',')
+
+
+def _tokens(dds):
+    return re.findall(r'[{}\[\]=;:]|[^\s{}\[\]=;:]+', dds)
+
+
+def parse_dds(dds):
+    '''
+    Parses the DDS of a DAP2 dataset or data response into a list of
+    DAPVariables, in the order their data is sent.  Grids are returned as
+    their array, their maps are returned after it with the names qualified
+    by the grid name.  Structures and sequences aren't supported.
+
+    :param str dds: Dataset Descriptor Structure
+    '''
+    tokens = _tokens(dds)
+    pos = [0]
+
+    def peek():
+        try:
+            return tokens[pos[0]]
+        except IndexError:
+            raise DAPError("Truncated DDS")
+
+    def take(expected=None):
+        token = peek()
+        if expected is not None and token != expected:
+            raise DAPError("Expected '{}' in DDS, got '{}'".format(expected, token))
+        pos[0] += 1
+        return token
+
+    def declaration():
+        base_type = take()
+        if base_type == 'Grid':
+            take('{')
+            take('ARRAY')
+            take(':')
+            array = declaration()
+            take('MAPS')
+            take(':')
+            maps = []
+            while peek() != '}':
+                maps.append(declaration())
+            take('}')
+            name = unquote(take())
+            take(';')
+            return [array[0]._replace(name=name)] + [
+                m._replace(name=name + '.' + m.name)
+                for decl in maps for m in decl]
+        if base_type not in DAS_TYPES and base_type not in ('String', 'Url'):
+            raise DAPError("Unsupported DAP type {}".format(base_type))
+        # names are escaped as in URLs
+        name = unquote(take())
+        shape = []
+        dimensions = []
+        while peek() == '[':
+            take('[')
+            # [name = size] or just [size]
+            size = take()
+            dimension = None
+            if peek() == '=':
+                take('=')
+                dimension = unquote(size)
+                size = take()
+            take(']')
+            shape.append(int(size))
+            dimensions.append(dimension)
+        take(';')
+        return [DAPVariable(name, base_type, tuple(shape), tuple(dimensions))]
+
+    take('Dataset')
+    take('{')
+    variables = []
+    while peek() != '}':
+        variables.extend(declaration())
+    return variables
+
+
+def _das_tokens(das):
+    return re.findall(r'"(?:[^"\\]|\\.)*"|[{};,]|[^\s{};,"]+', das)
+
+
+def _das_value(base_type, token):
+    if token.startswith('"'):
+        token = token[1:-1]
+        if base_type in ('String', 'Url'):
+            return re.sub(r'\\(.)', r'\1', token)
+    return token
+
+
+def _attribute_value(base_type, name, values):
+    if base_type in ('String', 'Url'):
+        # netCDF has no string array attributes
+        return '\n'.join(values)
+    if base_type not in DAS_TYPES:
+        raise DAPError("Unsupported DAP attribute type {}".format(base_type))
+    dtype = DAS_TYPES[base_type]
+    try:
+        value = np.array([float(v) if dtype.kind == 'f' else int(v)
+                          for v in values]).astype(dtype)
+    except ValueError:
+        raise DAPError("Bad {} value in DAS for {}".format(base_type, name))
+    if value.size == 1:
+        return value[0]
+    return value
+
+
+def parse_das(das):
+    '''
+    Parses a DAS into an OrderedDict of attribute container name to an
+    OrderedDict of its attributes, the way netCDF4 returns them: single
+    numeric values as numpy scalars, several as numpy arrays and strings as
+    str.  Attributes of containers nested in a container are named
+    `inner.name`, and attributes outside of any container are returned in
+    the NC_GLOBAL container.
+
+    :param str das: Data Attribute Structure
+    '''
+    tokens = _das_tokens(das)
+    pos = [0]
+
+    def peek(ahead=0):
+        try:
+            return tokens[pos[0] + ahead]
+        except IndexError:
+            raise DAPError("Truncated DAS")
+
+    def take(expected=None):
+        token = peek()
+        if expected is not None and token != expected:
+            raise DAPError("Expected '{}' in DAS, got '{}'".format(expected, token))
+        pos[0] += 1
+        return token
+
+    def attribute(attributes, prefix):
+        base_type = take()
+        name = unquote(take())
+        values = [_das_value(base_type, take())]
+        while peek() == ',':
+            take(',')
+            values.append(_das_value(base_type, take()))
+        take(';')
+        attributes[prefix + name] = _attribute_value(base_type, name, values)
+
+    def container(attributes, prefix):
+        # the attributes of a container, after its opening brace
+        while peek() != '}':
+            if peek(1) == '{':
+                name = unquote(take())
+                take('{')
+                container(attributes, prefix + name + '.')
+            else:
+                attribute(attributes, prefix)
+        take('}')
+
+    take('Attributes')
+    take('{')
+    containers = OrderedDict()
+    while peek() != '}':
+        if peek(1) == '{':
+            name = unquote(take())
+            take('{')
+            container(containers.setdefault(name, OrderedDict()), '')
+        else:
+            attribute(containers.setdefault('NC_GLOBAL', OrderedDict()), '')
+    return containers
+
+
+def _decode(buf, offset, variable):
+    '''
+    Decodes the XDR data of a variable at offset, returning the array and the
+    offset after it
+    '''
+    if variable.type not in DAP_TYPES:
+        raise DAPError("Can't decode DAP type {}".format(variable.type))
+    wire = DAP_TYPES[variable.type]
+    if not variable.shape:
+        # scalars have no length prefix, and bytes are sent as 32 bit ints
+        if variable.type == 'Byte':
+            wire = np.dtype('>u4')
+        end = offset + wire.itemsize
+        values = np.frombuffer(buf[offset:end], dtype=wire)
+        if values.size != 1:
+            raise DAPError("Truncated DAP data")
+        return values.reshape(()), end
+
+    count = int(np.prod(variable.shape))
+    try:
+        length, length2 = struct.unpack_from('>II', buf, offset)
+    except struct.error:
+        raise DAPError("Truncated DAP data")
+    if length != count or length2 != count:
+        raise DAPError("Unexpected length {} for {}".format(length, variable.name))
+    offset += 8
+    end = offset + count * wire.itemsize
+    values = np.frombuffer(buf[offset:end], dtype=wire)
+    if values.size != count:
+        raise DAPError("Truncated DAP data")
+    if variable.type == 'Byte':
+        # opaque data is padded to 4 bytes
+        end += -count % 4
+    return values.reshape(variable.shape), end
+
+
+def parse_dods(content):
+    '''
+    Decodes a DAP2 data (.dods) response into an OrderedDict of variable name
+    to array of its values, as sent on the wire: 16 bit integers are
+    returned as 32 bit integers and bytes as unsigned.
+
+    :param bytes content: Body of the response
+    '''
+    separator = re.search(b'\r?\nData:\r?\n', content)
+    if separator is None:
+        raise DAPError(content[:200].decode('utf-8', 'replace'))
+    dds = content[:separator.start()].decode('utf-8', 'replace')
+    buf = content[separator.end():]
+    values = OrderedDict()
+    offset = 0
+    for variable in parse_dds(dds):
+        values[variable.name], offset = _decode(buf, offset, variable)
+    return values
+
+
+def fetch_dds(url, session=None):
+    '''
+    Returns the Dataset Descriptor Structure of an OPeNDAP dataset
+
+    :param str url: OPeNDAP endpoint of the dataset
+    :param session: Object with a `get` method like requests.get to fetch
+                    the DDS with
+    '''
+    response = (session or requests).get(url + '.dds', allow_redirects=True)
+    if response.status_code != 200:
+        raise DAPError("DDS request failed with status {}".format(
+            response.status_code))
+    return response.text
+
+
+def fetch_data(url, projections):
+    '''
+    Reads the given projections of the variables of an OPeNDAP dataset with
+    a single DAP2 data request.  Returns an OrderedDict of variable name to
+    array, see parse_dods.  A variable can only be projected once per request.
+
+    :param str url: OPeNDAP endpoint of the dataset
+    :param list projections: (variable name, hyperslab) pairs, see
+                             constraint_expression
+    '''
+    response = requests.get(url + '.dods?' + constraint_expression(projections),
+                            allow_redirects=True)
+    if response.status_code != 200:
+        raise DAPError("DAP data request failed with status {}".format(
+            response.status_code))
+    return parse_dods(response.content)
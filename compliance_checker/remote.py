@@ -0,0 +1,421 @@
+'''
+Batched reads of variable data from OPeNDAP datasets
+
+Reading a remote variable through netCDF4 costs a round trip to the server
+for every `var[...]`, which dominates the time taken to check datasets on
+high latency servers.  Instead, the reads all of the selected checks will
+make are collected up front, see compliance_checker.inputs, and planned into
+as few DAP2 data requests as possible: every variable read in full or at a
+set of evenly spaced indices is projected once, e.g. `lat,lon,time[0:9:9]`
+reads the first and last of ten times along with the whole of lat and lon.
+The values are masked and scaled the way netCDF4 would have returned them.
+
+The netCDF library isn't thread-safe, so checks running on several threads
+can't read a remote dataset through netCDF4 at once.  They are given a
+header-only copy of the dataset instead, see threaded_copy, whose variable
+data is read with DAP2 data requests of its own, which any number of threads
+can make at the same time.
+'''
+from __future__ import unicode_literals
+import logging
+import numbers
+from collections import OrderedDict
+
+import numpy as np
+from netCDF4 import default_fillvals
+
+from compliance_checker.header import HeaderDataset
+from compliance_checker.protocols import opendap
+
+logger = logging.getLogger(__name__)
+
+
+def is_remote(ds):
+    '''
+    Returns True if the dataset was opened from an OPeNDAP URL
+    '''
+    try:
+        path = ds.filepath()
+    except (AttributeError, ValueError):
+        return False
+    return path.startswith(('http://', 'https://'))
+
+
+def _equal(data, value):
+    # NaN fill values match NaN data
+    if np.isnan(value):
+        return np.isnan(data)
+    return data == value
+
+
+def _safecast(variable, name):
+    '''
+    Returns the values of a masking attribute cast to the data type of the
+    variable, or None if the variable doesn't have it or its values can't be
+    cast exactly, in which case netCDF4 ignores the attribute
+    '''
+    if name not in variable.ncattrs():
+        return None
+    value = np.asarray(variable.getncattr(name))
+    if value.dtype.kind not in 'biuf':
+        # e.g. strings, which never compare equal to the cast values
+        return None
+    try:
+        cast = value.astype(variable.dtype)
+    except (TypeError, ValueError):
+        return None
+    # NaNs compare equal here, array_equal only learnt equal_nan in numpy 1.19
+    same = cast == value
+    if cast.dtype.kind == 'f' and value.dtype.kind == 'f':
+        same |= np.isnan(cast) & np.isnan(value)
+    if not np.all(same):
+        return None
+    return np.ravel(cast)
+
+
+def fill_values(variable):
+    '''
+    Returns the raw values which mark missing data of a variable, as
+    netCDF4 masks them: its _FillValue, or the default fill value of its
+    data type, and its missing_value
+
+    :param netCDF4.Variable variable: Variable to get the values of
+    '''
+    values = []
+    if '_FillValue' in variable.ncattrs():
+        fill_value = _safecast(variable, '_FillValue')
+        if fill_value is not None:
+            values.extend(fill_value)
+    elif variable.dtype.str[1:] in default_fillvals:
+        values.append(default_fillvals[variable.dtype.str[1:]])
+    missing_value = _safecast(variable, 'missing_value')
+    if missing_value is not None:
+        values.extend(missing_value)
+    return values
+
+
+def mask_and_scale(variable, raw):
+    '''
+    Returns raw values of a variable as netCDF4 would return them when
+    reading it: as a masked array with fill values, missing values and
+    values outside the valid range masked, and then unpacked with
+    scale_factor and add_offset.  Raises ValueError for variables whose
+    values can't be converted exactly the same way.
+
+    :param netCDF4.Variable variable: Variable the values were read from
+    :param numpy.ndarray raw: Values in the variable's data type
+    '''
+    attrs = variable.ncattrs()
+    # variable length strings have the dtype str
+    kind = getattr(variable.dtype, 'kind', None)
+    if kind is None or kind not in 'iuf' or '_Unsigned' in attrs:
+        raise ValueError("Can't convert the values of {}".format(variable.name))
+    data = np.asarray(raw).astype(variable.dtype)
+
+    mask = np.zeros(data.shape, dtype=bool)
+    if getattr(variable, 'mask', True):
+        for fill in fill_values(variable):
+            mask |= _equal(data, fill)
+
+        valid_min = valid_max = None
+        valid_range = _safecast(variable, 'valid_range')
+        if valid_range is not None and valid_range.size == 2:
+            valid_min, valid_max = valid_range
+        if _safecast(variable, 'valid_min') is not None:
+            valid_min = _safecast(variable, 'valid_min')[0]
+        if _safecast(variable, 'valid_max') is not None:
+            valid_max = _safecast(variable, 'valid_max')[0]
+        if valid_min is not None:
+            mask |= data < valid_min
+        if valid_max is not None:
+            mask |= data > valid_max
+
+    if getattr(variable, 'scale', True):
+        scale_factor = (variable.getncattr('scale_factor')
+                        if 'scale_factor' in attrs else None)
+        add_offset = (variable.getncattr('add_offset')
+                      if 'add_offset' in attrs else None)
+        if scale_factor is not None and add_offset is not None:
+            if scale_factor != 1.0 or add_offset != 0.0:
+                data = data * scale_factor + add_offset
+            else:
+                data = data.astype(np.asarray(scale_factor).dtype)
+        elif scale_factor is not None and scale_factor != 1.0:
+            data = data * scale_factor
+        elif add_offset is not None and add_offset != 0.0:
+            data = data + add_offset
+
+    return np.ma.masked_array(data, mask=mask)
+
+
+def _hyperslabs(indices):
+    '''
+    Splits sorted, distinct indices into the fewest (start, stride, stop)
+    hyperslabs reading exactly those indices
+    '''
+    slabs = []
+    i = 0
+    while i < len(indices):
+        if i + 1 == len(indices):
+            slabs.append((indices[i], 1, indices[i]))
+            break
+        stride = indices[i + 1] - indices[i]
+        j = i + 1
+        while j + 1 < len(indices) and indices[j + 1] - indices[j] == stride:
+            j += 1
+        slabs.append((indices[i], stride, indices[j]))
+        i = j + 1
+    return slabs
+
+
+def plan_reads(ds, reads):
+    '''
+    Plans the reads of a dataset into DAP2 data requests.  Returns a list of
+    requests, each an OrderedDict of variable name to the hyperslab
+    projected, None for the whole variable, and a dict of each planned read
+    to (variable name, hyperslab, position in the hyperslab) to find its
+    value in the responses.  A variable is projected at most once per
+    request, so variables read at unevenly spaced indices need more than
+    one.  Variables which can't be read this way aren't planned.
+
+    :param netCDF4.Dataset ds: An open netCDF dataset
+    :param list reads: (variable name, index) pairs, where the index is
+                       Ellipsis for the whole variable, or an integer index
+                       into a one dimensional variable
+    '''
+    by_variable = OrderedDict()
+    for name, index in reads:
+        variable = ds.variables.get(name)
+        if variable is None:
+            continue
+        try:
+            mask_and_scale(variable, np.zeros(0, dtype=variable.dtype))
+        except ValueError:
+            continue
+        if index is not Ellipsis and variable.ndim != 1:
+            continue
+        by_variable.setdefault(name, []).append(index)
+
+    projections = OrderedDict()
+    located = {}
+    for name, indices in by_variable.items():
+        if Ellipsis in indices:
+            projections[name] = [None]
+            for index in indices:
+                located[(name, index)] = (name, None, None)
+            continue
+        size = len(ds.variables[name])
+        if size == 0:
+            continue
+        wrapped = sorted(set(index % size for index in indices))
+        slabs = _hyperslabs(wrapped)
+        projections[name] = slabs
+        for index in indices:
+            i = index % size
+            for start, stride, stop in slabs:
+                if start <= i <= stop and (i - start) % stride == 0:
+                    located[(name, index)] = (name, (start, stride, stop),
+                                              (i - start) // stride)
+                    break
+
+    batches = []
+    for name, slabs in projections.items():
+        for k, slab in enumerate(slabs):
+            if k == len(batches):
+                batches.append(OrderedDict())
+            batches[k][name] = slab
+    return batches, located
+
+
+def read_batched(ds, reads):
+    '''
+    Reads variable data of a remote dataset in as few DAP2 requests as
+    possible.  Returns a dict of (variable name, index) to the value
+    `ds.variables[name][index]` would return, for the reads which could be
+    batched; the others are left for netCDF4.  Failed requests are logged
+    and their reads left out.
+
+    :param netCDF4.Dataset ds: An open netCDF dataset
+    :param list reads: (variable name, index) pairs, see plan_reads
+    '''
+    batches, located = plan_reads(ds, reads)
+    fetched = {}
+    for projections in batches:
+        try:
+            arrays = opendap.fetch_data(ds.filepath(), [
+                (name, None if slab is None else [slab])
+                for name, slab in projections.items()])
+        except (opendap.DAPError, IOError) as e:
+            logger.warning("Batched read of %s failed: %s", ds.filepath(), e)
+            continue
+        for name, slab in projections.items():
+            if name in arrays:
+                fetched[(name, slab)] = mask_and_scale(ds.variables[name],
+                                                       arrays[name])
+
+    values = {}
+    for (name, index), (_, slab, position) in located.items():
+        array = fetched.get((name, slab))
+        if array is None:
+            continue
+        if slab is None:
+            values[(name, index)] = array if index is Ellipsis else array[index]
+        else:
+            # netCDF4 returns single values as 0-d arrays
+            values[(name, index)] = array[position:position + 1].reshape(())
+    return values
+
+
+def hyperslabs(shape, index):
+    '''
+    Converts an index of a variable of the shape, as netCDF4 takes it, into
+    the DAP2 hyperslab reading it, a list of (start, stride, stop) tuples,
+    and the index of the values read which drops the dimensions indexed by
+    an integer.  Returns None for indexes a hyperslab can't read, e.g.
+    lists of indices, negative strides or those selecting nothing.
+
+    :param tuple shape: Shape of the variable
+    :param index: Index of the values to read
+    '''
+    if not isinstance(index, tuple):
+        index = (index,)
+    ellipses = [i for i, key in enumerate(index) if key is Ellipsis]
+    if len(ellipses) > 1:
+        return None
+    if ellipses:
+        i = ellipses[0]
+        index = (index[:i] + (slice(None),) * (len(shape) - len(index) + 1) +
+                 index[i + 1:])
+    if len(index) > len(shape):
+        return None
+    index = index + (slice(None),) * (len(shape) - len(index))
+    slabs, dropped = [], []
+    for key, size in zip(index, shape):
+        if isinstance(key, slice):
+            start, stop, stride = key.indices(size)
+            count = len(range(start, stop, stride))
+            if stride < 1 or count == 0:
+                return None
+            slabs.append((start, stride, start + (count - 1) * stride))
+            dropped.append(slice(None))
+        elif isinstance(key, numbers.Integral) and not isinstance(key, bool):
+            position = key + size if key < 0 else key
+            if not 0 <= position < size:
+                return None
+            slabs.append((position, 1, position))
+            dropped.append(0)
+        else:
+            return None
+    return slabs, tuple(dropped)
+
+
+class DAPVariable(object):
+    '''
+    Variable of a DAPSource, reading its values when indexed
+    '''
+
+    def __init__(self, source, name):
+        self._source = source
+        self.name = name
+
+    def __getitem__(self, key):
+        return self._source.read(self.name, key)
+
+
+class DAPSource(object):
+    '''
+    Reads the variable data of a header-only copy of a remote netCDF4
+    Dataset, see threaded_copy, with a DAP2 data request for each read.
+    Several threads can read at once.  Reads which can't be made that way,
+    e.g. of strings, are made through the dataset itself while holding
+    `lock`, which every other user of the dataset must hold too.
+
+    :param header.HeaderDataset ds_copy: Header-only copy of the dataset
+    :param netCDF4.Dataset ds: The dataset
+    :param threading.Lock lock: Lock guarding the use of the dataset
+    '''
+
+    def __init__(self, ds_copy, ds, lock):
+        self.ds_copy = ds_copy
+        self.ds = ds
+        self.lock = lock
+        self.variables = OrderedDict((name, DAPVariable(self, name))
+                                     for name in ds_copy.variables)
+
+    def close(self):
+        # the dataset is closed by its owner
+        pass
+
+    def read(self, name, index, raw=False):
+        '''
+        Returns the values of a variable at an index, as
+        `ds.variables[name][index]` would, or the raw values in the
+        variable's data type.
+
+        :param str name: Variable name
+        :param index: Index of the values to read
+        :param bool raw: Neither mask nor scale the values
+        '''
+        variable = self.ds_copy.variables[name]
+        planned = hyperslabs(variable.shape, index)
+        if planned is not None:
+            try:
+                mask_and_scale(variable, np.zeros(0, dtype=variable.dtype))
+            except ValueError:
+                planned = None
+        if planned is not None:
+            slabs, dropped = planned
+            try:
+                arrays = opendap.fetch_data(self.ds_copy.filepath(),
+                                            [(name, slabs or None)])
+            except (opendap.DAPError, IOError) as e:
+                logger.warning("Read of %s from %s failed: %s", name,
+                               self.ds_copy.filepath(), e)
+            else:
+                if name in arrays:
+                    values = np.asarray(arrays[name])[dropped]
+                    if raw:
+                        return values.astype(variable.dtype)
+                    return mask_and_scale(variable, values)
+        with self.lock:
+            variable = self.ds.variables[name]
+            if not raw:
+                return variable[index]
+            mask, scale = (getattr(variable, 'mask', True),
+                           getattr(variable, 'scale', True))
+            variable.set_auto_maskandscale(False)
+            try:
+                return np.ma.getdata(variable[index])
+            finally:
+                variable.set_auto_mask(mask)
+                variable.set_auto_scale(scale)
+
+
+def threaded_copy(ds, lock):
+    '''
+    Returns a header-only copy of a remote netCDF4 Dataset which checks can
+    use on several threads at once, reading its variable data through a
+    DAPSource, or None if the dataset isn't remote or can't be copied.
+
+    :param netCDF4.Dataset ds: An open netCDF dataset
+    :param threading.Lock lock: Lock every other user of the dataset holds
+                                while using it
+    '''
+    if not is_remote(ds):
+        return None
+    try:
+        ds_copy = HeaderDataset.from_dataset(
+            ds, lambda ds_copy: DAPSource(ds_copy, ds, lock))
+    except ValueError:
+        return None
+    ds_copy.data_source()
+    return ds_copy
+
+
+def dap_source(ds):
+    '''
+    Returns the DAPSource the variable data of a dataset is read from, see
+    threaded_copy, or None if it is read some other way
+    '''
+    source = getattr(ds, '_source', None)
+    return source if isinstance(source, DAPSource) else None
@@ -7,6 +7,9 @@ import json
 from collections import OrderedDict
 from contextlib import contextmanager
 from compliance_checker.suite import CheckSuite
+from compliance_checker.chunks import MemoryBudget, Sample, format_bytes, peak_rss
+from compliance_checker.httpcache import HTTPCache
+from compliance_checker.summary import Summary
 import six
 
 
@@ -34,7 +37,10 @@ class ComplianceChecker(object):
     @classmethod
     def run_checker(cls, ds_loc, checker_names, verbose, criteria,
                     skip_checks=None, output_filename='-',
-                    output_format=['text']):
+                    output_format=['text'], max_workers=None,
+                    metadata_only=False, fail_fast=None, only_checks=None,
+                    sections=None, http_cache=False, crawl_sos=None,
+                    check_data=False, sample=None, max_memory=None):
         """
         Static check runner.
 
@@ -45,10 +51,29 @@ class ComplianceChecker(object):
         @param  output_filename Path to the file for output
         @param  skip_checks     Names of checks to skip
         @param  output_format   Format of the output(s)
+        @param  max_workers     Number of threads for concurrent data-reading checks
+        @param  metadata_only   Skip checks which read variable data
+        @param  fail_fast       Stop checking a dataset once a check fails at or above this priority
+        @param  only_checks     Names of the only checks to run
+        @param  sections        Sections of the standards to check, e.g. ['4', '5.6']
+        @param  http_cache      Cache the metadata of remote datasets and reuse the results of unchanged ones
+        @param  crawl_sos       Treat the locations as SOS GetCapabilities URLs and also check the DescribeSensor documents of their procedures, fetching this many at once
+        @param  check_data      Also run the checks which validate every value of the variables
+        @param  sample          Read only this fraction (a float) or number (an int) of the chunks of each variable the checks read in full
+        @param  max_memory      Memory in bytes which the chunks of data read at once are planned to fit in
 
         @returns                If the tests failed (based on the criteria)
         """
-        cs = CheckSuite()
+        # define a score limit to truncate the ouput to the strictness level
+        # specified by the user.  Results below it aren't computed at all.
+        limit = cls.criteria_limit(criteria)
+        cs = CheckSuite(max_workers=max_workers, metadata_only=metadata_only,
+                        fail_fast=fail_fast, only_checks=only_checks,
+                        sections=sections, limit=limit,
+                        http_cache=HTTPCache() if http_cache else None,
+                        check_data=check_data,
+                        sample=Sample(sample) if sample else None,
+                        memory_budget=MemoryBudget(max_memory) if max_memory else None)
         # using OrderedDict is important here to preserve the order
         # of multiple datasets which may be passed in
         score_dict = OrderedDict()
@@ -62,27 +87,18 @@ class ComplianceChecker(object):
         if isinstance(output_format, six.string_types):
             output_format = [output_format]
 
-        for loc in locs: # loop through each dataset and run specified checks
-            ds = cs.load_dataset(loc)
-
-            score_groups = cs.run(ds, skip_checks, *checker_names)
-            # TODO: consider wrapping in a proper context manager instead
-            if hasattr(ds, 'close'):
-                ds.close()
-
-            if not score_groups:
-                raise ValueError("No checks found, please check the name of the checker(s) and that they are installed")
-            else:
-                score_dict[loc] = score_groups
+        for ds_loc in locs: # loop through each dataset and run specified checks
+            for loc, ds in cls.load_datasets(cs, ds_loc, crawl_sos):
+                score_groups = cs.run_cached(ds, loc, skip_checks, *checker_names)
+                cls.report_memory(cs, loc)
+                # TODO: consider wrapping in a proper context manager instead
+                if hasattr(ds, 'close'):
+                    ds.close()
 
-        # define a score limit to truncate the ouput to the strictness level
-        # specified by the user
-        if criteria == 'normal':
-            limit = 2
-        elif criteria == 'strict':
-            limit = 1
-        elif criteria == 'lenient':
-            limit = 3
+                if not score_groups:
+                    raise ValueError("No checks found, please check the name of the checker(s) and that they are installed")
+                else:
+                    score_dict[loc] = score_groups
 
         for out_fmt in output_format:
             if out_fmt == 'text':
@@ -120,6 +136,167 @@ class ComplianceChecker(object):
 
         return cs.passtree(groups, limit), errors_occurred
 
+    @classmethod
+    def run_summary(cls, ds_loc, checker_names, verbose, criteria,
+                    skip_checks=None, output_filename='-',
+                    output_format=['text'], max_workers=None,
+                    metadata_only=False, fail_fast=None, only_checks=None,
+                    sections=None, top_k=10, merge_summaries=None,
+                    http_cache=False, crawl_sos=None, check_data=False,
+                    sample=None, max_memory=None, batch_attributes=False):
+        """
+        Runs the checks like run_checker, but instead of a report for each
+        dataset writes a single summary of the results of all of them.  The
+        results of each dataset are added to the summary and discarded as
+        soon as it has been checked.  Datasets which fail to load are
+        recorded in the summary and the others are still checked.
+
+        @param  ds_loc          Dataset location (url or file), or list of them
+        @param  checker_names   List of string names to run, should match keys of checkers dict (empty list means run all)
+        @param  verbose         Verbosity of the output (0, 1, 2)
+        @param  criteria        Determines failure (lenient, normal, strict)
+        @param  output_filename Path to the file for output
+        @param  skip_checks     Names of checks to skip
+        @param  output_format   Format of the summary, 'text' or 'json'
+        @param  max_workers     Number of threads for concurrent data-reading checks
+        @param  metadata_only   Skip checks which read variable data
+        @param  fail_fast       Stop checking a dataset once a check fails at or above this priority
+        @param  only_checks     Names of the only checks to run
+        @param  sections        Sections of the standards to check, e.g. ['4', '5.6']
+        @param  top_k           Number of lowest scoring datasets to list
+        @param  merge_summaries Paths of JSON summaries of other runs to merge in
+        @param  http_cache      Cache the metadata of remote datasets and reuse the results of unchanged ones
+        @param  crawl_sos       Treat the locations as SOS GetCapabilities URLs and also check the DescribeSensor documents of their procedures, fetching this many at once
+        @param  check_data      Also run the checks which validate every value of the variables
+        @param  sample          Read only this fraction (a float) or number (an int) of the chunks of each variable the checks read in full
+        @param  max_memory      Memory in bytes which the chunks of data read at once are planned to fit in
+        @param  batch_attributes Evaluate the attribute checks of the local netCDF files for all of them at once
+
+        @returns                If the tests failed (based on the criteria)
+                                and if any check raised an error or any
+                                dataset could not be loaded
+        """
+        limit = cls.criteria_limit(criteria)
+        cs = CheckSuite(max_workers=max_workers, metadata_only=metadata_only,
+                        fail_fast=fail_fast, only_checks=only_checks,
+                        sections=sections, limit=limit,
+                        http_cache=HTTPCache() if http_cache else None,
+                        check_data=check_data,
+                        sample=Sample(sample) if sample else None,
+                        memory_budget=MemoryBudget(max_memory) if max_memory else None)
+        if isinstance(ds_loc, six.string_types):
+            ds_loc = [ds_loc]
+        if not isinstance(output_format, six.string_types):
+            output_format = output_format[0]
+        if output_format not in ('text', 'json', 'json_new'):
+            raise TypeError('Invalid summary format %s' % output_format)
+
+        if batch_attributes and not crawl_sos:
+            cs.batch_attribute_checks(ds_loc)
+
+        summary = Summary(limit, top_k)
+        for filename in merge_summaries or []:
+            summary.merge(Summary.load(filename, top_k))
+
+        all_passed = True
+        errors_occurred = False
+        for location in ds_loc:
+            for loc, ds in cls.load_summarized(cs, location, summary, crawl_sos):
+                score_groups = cs.run_cached(ds, loc, skip_checks, *checker_names)
+                cls.report_memory(cs, loc)
+                if hasattr(ds, 'close'):
+                    ds.close()
+                if not score_groups:
+                    raise ValueError("No checks found, please check the name of the checker(s) and that they are installed")
+
+                for checker_name, (groups, errors) in score_groups.items():
+                    passed = cs.passtree(groups, limit)
+                    all_passed = all_passed and passed
+                    errors_occurred = errors_occurred or bool(errors)
+                    checker_summary = summary.checker(
+                        checker_name, cs._get_check_versioned_name(checker_name),
+                        cs.checkers[checker_name]._cc_display_headers)
+                    checker_summary.add(loc, groups, errors, passed, limit)
+        errors_occurred = errors_occurred or bool(summary.load_error_count)
+
+        if output_filename == '-':
+            if output_format == 'text':
+                summary.text_output(2 * cs.col_width)
+            else:
+                print(summary.to_json())
+        else:
+            with io.open(output_filename, 'w', encoding='utf-8') as f:
+                if output_format == 'text':
+                    with stdout_redirector(f):
+                        summary.text_output(2 * cs.col_width)
+                else:
+                    f.write(summary.to_json())
+
+        return all_passed, errors_occurred
+
+    @classmethod
+    def load_datasets(cls, cs, ds_loc, crawl_sos=None):
+        '''
+        Returns the (location, dataset) pairs to check for a dataset
+        location: just the dataset itself, or when crawling SOS services,
+        the GetCapabilities document and the DescribeSensor documents of its
+        procedures as they are fetched
+
+        @param  cs              CheckSuite to load the datasets with
+        @param  ds_loc          Dataset location (url or file)
+        @param  crawl_sos       Number of concurrent DescribeSensor requests, None to not crawl
+        '''
+        if crawl_sos:
+            return cs.crawl_sos(ds_loc, crawl_sos)
+        return [(ds_loc, cs.load_dataset(ds_loc))]
+
+    @classmethod
+    def load_summarized(cls, cs, ds_loc, summary, crawl_sos=None):
+        '''
+        Yields the (location, dataset) pairs to check for a dataset location
+        like load_datasets, but records a location which fails to load in
+        the summary, and reports it on stderr, rather than raising
+
+        @param  cs              CheckSuite to load the datasets with
+        @param  ds_loc          Dataset location (url or file)
+        @param  summary         Summary to record the failure in
+        @param  crawl_sos       Number of concurrent DescribeSensor requests, None to not crawl
+        '''
+        try:
+            for loc, ds in cls.load_datasets(cs, ds_loc, crawl_sos):
+                yield loc, ds
+        except Exception as e:
+            print("Could not load {}: {}".format(ds_loc, e), file=sys.stderr)
+            summary.add_load_error(ds_loc, e)
+
+    @classmethod
+    def report_memory(cls, cs, loc):
+        '''
+        Reports the peak memory of the chunks of data read while checking a
+        dataset, as estimated against the memory budget of the suite, and
+        the peak memory of the process so far to stderr
+
+        @param  cs              CheckSuite the dataset was checked with
+        @param  loc             Location of the dataset
+        '''
+        budget = cs.memory_budget
+        if budget is None:
+            return
+        rss = peak_rss()
+        print("Peak memory of the data read from {}: {} of the {} budget "
+              "(peak process memory {})".format(
+                  loc, format_bytes(budget.peak), format_bytes(budget.limit),
+                  'unknown' if rss is None else format_bytes(rss)),
+              file=sys.stderr)
+        budget.reset_peak()
+
+    @classmethod
+    def criteria_limit(cls, criteria):
+        '''
+        Returns the lowest priority reported for the criteria
+        '''
+        return {'strict': 1, 'normal': 2, 'lenient': 3}[criteria]
+
     @classmethod
     def stdout_output(cls, cs, score_dict, verbose, limit):
         '''
@@ -0,0 +1,254 @@
+'''
+Compliance checker daemon
+
+Starting the compliance checker has a fixed cost: interpreter startup,
+scanning the entry points for checker plugins, importing the scientific
+libraries and parsing the CF standard name table.  For systems which check
+files one at a time this setup dominates the run time.
+
+`serve` keeps all of that loaded in a long running process which accepts
+check requests over HTTP on localhost.  A request takes the same options as
+`ComplianceChecker.run_checker` and the response is JSON holding the return
+values of the run and the report it wrote to stdout and stderr.  The
+client the command line tool uses to hand its work to a running daemon is in
+compliance_checker.client.
+
+The daemon only listens on the loopback interface, and check requests must
+carry a random token which `serve` writes to a file only the user running
+the daemon can read, so other users of the machine can't have it read or
+write files on that user's behalf.
+
+Requests are handled one at a time, in the order they arrive.
+'''
+from __future__ import print_function, unicode_literals
+import binascii
+import hmac
+import io
+import json
+import os
+import socket
+import sys
+import traceback
+from contextlib import contextmanager
+
+import six
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+from compliance_checker import __version__
+from compliance_checker.client import (DEFAULT_ADDRESS, TOKEN_HEADER,
+                                       parse_address, token_path)
+from compliance_checker.runner import ComplianceChecker, CheckSuite
+
+
+# run_checker keyword arguments accepted in a check request
+CHECK_OPTIONS = ('ds_loc', 'checker_names', 'verbose', 'criteria',
+                 'skip_checks', 'output_filename', 'output_format',
+                 'max_workers', 'metadata_only', 'fail_fast', 'only_checks',
+                 'sections', 'http_cache', 'crawl_sos',
+                 'check_data', 'sample', 'max_memory')
+
+
+@contextmanager
+def capture_output():
+    '''
+    Redirects stdout and stderr to string buffers for the duration of the
+    block, yielding the two buffers.
+    '''
+    stream_type = io.BytesIO if six.PY2 else io.StringIO
+    old_stdout, old_stderr = sys.stdout, sys.stderr
+    sys.stdout, sys.stderr = stream_type(), stream_type()
+    try:
+        yield sys.stdout, sys.stderr
+    finally:
+        sys.stdout, sys.stderr = old_stdout, old_stderr
+
+
+@contextmanager
+def working_directory(path):
+    '''
+    Changes the working directory for the duration of the block
+    '''
+    old_path = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(old_path)
+
+
+def is_loopback(host):
+    '''
+    Returns True if every address the host name resolves to is a loopback
+    address
+
+    :param str host: Host name or address
+    '''
+    if not host:
+        # binds to every interface
+        return False
+    try:
+        infos = socket.getaddrinfo(host, None)
+    except socket.gaierror:
+        return False
+    addresses = set(info[4][0] for info in infos)
+    return bool(addresses) and all(a.startswith('127.') or a == '::1'
+                                   for a in addresses)
+
+
+def check_paths(options, cwd):
+    '''
+    Checks the working directory and the output file names of a check
+    request, raising a ValueError if the directory isn't an existing
+    absolute path or an output file would be written to a directory which
+    doesn't exist.
+
+    :param dict options: Keyword arguments to ComplianceChecker.run_checker
+    :param str cwd: Working directory of the client
+    '''
+    if not (isinstance(cwd, six.string_types) and os.path.isabs(cwd) and
+            os.path.isdir(cwd)):
+        raise ValueError("The working directory must be an absolute path to "
+                         "an existing directory: {!r}".format(cwd))
+    output_filename = options.get('output_filename', '-')
+    if not isinstance(output_filename, six.string_types):
+        raise ValueError("Invalid output file name: {!r}".format(
+                         output_filename))
+    if output_filename == '-':
+        return
+    path = os.path.normpath(os.path.join(cwd, output_filename))
+    if not os.path.isdir(os.path.dirname(path)):
+        raise ValueError("The directory of the output file doesn't exist: "
+                         "{}".format(path))
+
+
+def run_check_request(options, cwd=None):
+    '''
+    Runs the checker with the options of a check request and returns the
+    response as a dict.  Output written to stdout and stderr by the run is
+    returned in the response rather than printed.
+
+    :param dict options: Keyword arguments to ComplianceChecker.run_checker
+    :param str cwd: Working directory of the client, which relative dataset
+                    and output paths are resolved against
+    '''
+    unknown = set(options) - set(CHECK_OPTIONS)
+    if unknown:
+        raise ValueError("Unknown check options: {}".format(
+                         ', '.join(sorted(unknown))))
+    cwd = cwd or os.getcwd()
+    check_paths(options, cwd)
+
+    with working_directory(cwd), \
+            capture_output() as (stdout, stderr):
+        passed, errors = ComplianceChecker.run_checker(**options)
+
+    return {
+        'passed': bool(passed),
+        'errors': bool(errors),
+        'stdout': stdout.getvalue(),
+        'stderr': stderr.getvalue(),
+    }
+
+
+class CheckRequestHandler(BaseHTTPRequestHandler):
+    '''
+    HTTP handler for the daemon.
+
+    POST /check   runs a check request, the body being a JSON object of
+                  run_checker keyword arguments and optionally the
+                  client's working directory as "cwd".  The request must
+                  carry the token of the server in its TOKEN_HEADER header.
+    GET /status   reports the version and the loaded checkers
+    '''
+
+    def do_GET(self):
+        if self.path != '/status':
+            self.send_json(404, {'error': 'Not found: {}'.format(self.path)})
+            return
+        self.send_json(200, {
+            'version': __version__,
+            'checkers': sorted(CheckSuite.checkers),
+            'pid': os.getpid(),
+        })
+
+    def do_POST(self):
+        if self.path != '/check':
+            self.send_json(404, {'error': 'Not found: {}'.format(self.path)})
+            return
+        token = self.headers.get(TOKEN_HEADER) or ''
+        if not hmac.compare_digest(token.encode('utf-8'),
+                                   self.server.token.encode('utf-8')):
+            self.send_json(403, {'error': 'Invalid or missing daemon token'})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            options = json.loads(self.rfile.read(length).decode('utf-8'))
+            cwd = options.pop('cwd', None)
+            response = run_check_request(options, cwd)
+        except Exception as e:
+            self.send_json(500, {
+                'error': '{}: {}'.format(type(e).__name__, e),
+                'traceback': traceback.format_exc(),
+            })
+        else:
+            self.send_json(200, response)
+
+    def send_json(self, status, body):
+        content = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+def make_server(address=DEFAULT_ADDRESS, token=None):
+    '''
+    Loads all of the available checkers and returns an HTTPServer bound to
+    the address, ready to serve check requests carrying the token, which is
+    set as its `token` attribute.  Raises a ValueError if the address isn't
+    a loopback address.
+
+    :param address: (host, port) tuple or "host:port" string
+    :param str token: Token authenticating check requests, random by default
+    '''
+    address = parse_address(address)
+    if not is_loopback(address[0]):
+        raise ValueError("The daemon only listens on the loopback interface, "
+                         "not on {!r}".format(address[0]))
+    CheckSuite.load_all_available_checkers()
+    server = HTTPServer(address, CheckRequestHandler)
+    server.token = token or binascii.hexlify(os.urandom(16)).decode('ascii')
+    return server
+
+
+def write_token(path, token):
+    '''
+    Writes the token to a file only the current user can read
+    '''
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    # the file may predate us with looser permissions
+    os.chmod(path, 0o600)
+    with io.open(fd, 'w', encoding='utf-8') as f:
+        f.write(six.text_type(token))
+
+
+def serve(address=DEFAULT_ADDRESS):
+    '''
+    Runs the daemon until it is interrupted
+
+    :param address: (host, port) tuple or "host:port" string
+    '''
+    server = make_server(address)
+    host, port = server.server_address[:2]
+    path = token_path((host, port))
+    write_token(path, server.token)
+    print("Compliance checker daemon listening on {}:{}".format(host, port),
+          file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.remove(path)
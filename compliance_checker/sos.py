@@ -0,0 +1,290 @@
+'''
+Lightweight SOS documents
+
+The SOS checks only evaluate XPaths against the root element of a
+GetCapabilities or DescribeSensor (SensorML) document.  Building the owslib
+object model of a document for them parses it twice and holds far more than
+they look at, which adds up for multi-megabyte GetCapabilities documents of
+large networks.  Instead the document is parsed once with lxml's iterparse,
+and elements which can't be selected by the XPaths of the registered
+checkers, e.g. the observation offerings of every station, are pruned as
+soon as they have been parsed.
+
+A whole service can also be crawled: the procedures of the offerings of a
+GetCapabilities document are listed with describe_sensor_urls, and their
+DescribeSensor documents fetched concurrently with fetch_concurrently.
+'''
+from __future__ import unicode_literals
+import inspect
+import io
+import re
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from lxml import etree
+from owslib.sos import SensorObservationService
+from owslib.swe.sensor.sml import SensorML
+try:
+    from urllib.parse import urlencode
+except ImportError:
+    from urllib import urlencode
+
+CAPABILITIES_TAG = '{http://www.opengis.net/sos/1.0}Capabilities'
+SENSORML_TAG = '{http://www.opengis.net/sensorML/1.0.1}SensorML'
+
+NAMESPACES = {
+    'sos': 'http://www.opengis.net/sos/1.0',
+    'ows': 'http://www.opengis.net/ows/1.1',
+    'xlink': 'http://www.w3.org/1999/xlink',
+}
+
+# parts of a GetCapabilities document needed to crawl the service
+_PROCEDURES = ("/sos:Capabilities/sos:Contents/sos:ObservationOfferingList/"
+               "sos:ObservationOffering/sos:procedure/@xlink:href")
+_DESCRIBE_SENSOR = ("/sos:Capabilities/ows:OperationsMetadata/"
+                    "ows:Operation[@name='DescribeSensor']")
+CRAWL_XPATHS = [_PROCEDURES, _DESCRIBE_SENSOR]
+
+# DescribeSensor output format used if the service doesn't list one
+SENSORML_FORMAT = 'text/xml;subtype="sensorML/1.0.1"'
+
+# element name, optionally with a namespace prefix, and predicates which
+# only test attributes of the element
+_STEP = re.compile(r'''^(?:[\w.-]+:)?([\w.-]+)((?:\[@[\w.:-]+(?:\s*=\s*(?:"[^"]*"|'[^']*'))?\])*)(\[.*\])?$''')
+
+
+class SOSDocument(object):
+    '''
+    A parsed SOS document, exposing its (possibly pruned) root element as
+    `_root` like the owslib objects the SOS checks were written against
+
+    :param root: Root element of the document
+    '''
+
+    def __init__(self, root):
+        self._root = root
+
+    def __repr__(self):
+        return '<{} {}>'.format(type(self).__name__, self._root.tag)
+
+
+class CapabilitiesDocument(SOSDocument):
+    '''
+    SOS GetCapabilities response
+    '''
+
+
+class SensorMLDocument(SOSDocument):
+    '''
+    SOS DescribeSensor response
+    '''
+
+
+def _split_steps(path):
+    # splits on the slashes outside of predicates
+    steps, depth, start = [], 0, 0
+    for i, c in enumerate(path):
+        if c == '[':
+            depth += 1
+        elif c == ']':
+            depth -= 1
+        elif c == '/' and depth == 0:
+            steps.append(path[start:i])
+            start = i + 1
+    steps.append(path[start:])
+    return steps
+
+
+def element_paths(xpaths):
+    '''
+    Returns the element paths the XPaths can select from, as a set of the
+    paths of the elements which must be kept, and a set of paths of elements
+    whose whole subtree must be kept.  Paths are tuples of element local
+    names from the root.  Returns None if an XPath is too complex to tell,
+    in which case the whole document has to be kept.
+
+    :param list xpaths: XPath expressions, as strings
+    '''
+    keep, whole = set(), set()
+    for xpath in xpaths:
+        steps = _split_steps(xpath)
+        # relative paths, and the empty steps of descendant axes (//)
+        if steps[0] or '' in steps[1:]:
+            return None
+        path = ()
+        for step in steps[1:]:
+            if step.startswith('@') or step in ('text()', 'node()'):
+                # attributes and text of the element above
+                whole.add(path)
+                break
+            match = _STEP.match(step)
+            if match is None:
+                # axes, wildcards and functions
+                return None
+            path += (match.group(1),)
+            keep.add(path)
+            if match.group(3):
+                # predicates testing the children of the element
+                whole.add(path)
+                break
+        else:
+            whole.add(path)
+    return keep, whole
+
+
+def checker_xpaths(checker_classes):
+    '''
+    Returns the XPaths the attribute checks of the checker classes evaluate,
+    as strings, or None if any of their checks can't be analysed, e.g.
+    because it isn't an attribute check
+
+    :param list checker_classes: Checker classes
+    '''
+    xpaths = []
+    for checker_class in checker_classes:
+        try:
+            checker = checker_class()
+        except Exception:
+            return None
+        for name, method in inspect.getmembers(checker, inspect.ismethod):
+            if not name.startswith('check_'):
+                continue
+            if not hasattr(method, '_cc_attr_check'):
+                return None
+            func = method._cc_attr_check[0]
+            try:
+                attributes = func(checker, None)
+            except Exception:
+                # the attribute list depends on the dataset
+                return None
+            for spec in attributes:
+                if isinstance(spec, tuple) and isinstance(spec[1], etree.XPath):
+                    xpaths.append(spec[1].path)
+    return xpaths
+
+
+def parse_document(doc, paths=None):
+    '''
+    Parses a GetCapabilities or SensorML document in a single pass, keeping
+    only the elements on the given paths.  Raises ValueError for other
+    documents.
+
+    :param bytes doc: The XML document
+    :param tuple paths: (keep, whole) sets of element paths as returned by
+                        element_paths, or None to keep the whole document
+    '''
+    keep, whole = paths if paths is not None else (None, None)
+    # (path, whole subtree kept, kept) of each open element
+    stack = []
+    root = None
+    for event, elem in etree.iterparse(io.BytesIO(doc), events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = elem
+                if elem.tag not in (CAPABILITIES_TAG, SENSORML_TAG):
+                    raise ValueError("Unrecognized XML root element: {}".format(elem.tag))
+            if keep is None:
+                continue
+            parent_path, parent_whole, _ = stack[-1] if stack else ((), False, True)
+            path = parent_path + (etree.QName(elem).localname,)
+            in_whole = parent_whole or path in whole
+            stack.append((path, in_whole, in_whole or path in keep))
+        elif keep is not None:
+            _, _, kept = stack.pop()
+            parent = elem.getparent()
+            if not kept and parent is not None:
+                parent.remove(elem)
+    if root.tag == CAPABILITIES_TAG:
+        return CapabilitiesDocument(root)
+    return SensorMLDocument(root)
+
+
+def owslib_document(ds, doc):
+    '''
+    Returns the owslib object of a document parsed whole by parse_document,
+    a SensorObservationService or a SensorML, with `_root` set to the root
+    element of the document
+
+    :param SOSDocument ds: The parsed document
+    :param bytes doc: The XML document
+    '''
+    if isinstance(ds, CapabilitiesDocument):
+        owslib_ds = SensorObservationService(None, xml=doc)
+        # SensorObservationService does not store the etree doc root
+        owslib_ds._root = ds._root
+        return owslib_ds
+    return SensorML(ds._root)
+
+
+def describe_sensor_urls(ds, url):
+    '''
+    Returns an OrderedDict of each procedure of the offerings of a
+    GetCapabilities document to the URL of its DescribeSensor document.  The
+    request is sent to the endpoint the document gives for DescribeSensor
+    GET requests, or to the GetCapabilities URL if it gives none.
+
+    :param ds: GetCapabilities document, a CapabilitiesDocument parsed with
+               at least CRAWL_XPATHS kept or a SensorObservationService
+    :param str url: URL the document was fetched from
+    '''
+    root = ds._root
+    operation = root.xpath(_DESCRIBE_SENSOR, namespaces=NAMESPACES)
+    endpoints = operation[0].xpath('ows:DCP/ows:HTTP/ows:Get/@xlink:href',
+                                   namespaces=NAMESPACES) if operation else []
+    endpoint = endpoints[0] if endpoints else url.split('?')[0]
+    formats = operation[0].xpath("ows:Parameter[@name='outputFormat']//ows:Value/text()",
+                                 namespaces=NAMESPACES) if operation else []
+    output_format = next((f for f in formats if 'sensorML' in f), SENSORML_FORMAT)
+
+    if not endpoint.endswith(('?', '&')):
+        endpoint += '&' if '?' in endpoint else '?'
+    urls = OrderedDict()
+    for procedure in root.xpath(_PROCEDURES, namespaces=NAMESPACES):
+        urls[procedure] = endpoint + urlencode([
+            ('service', 'SOS'), ('version', '1.0.0'),
+            ('request', 'DescribeSensor'), ('procedure', procedure),
+            ('outputFormat', output_format)])
+    return urls
+
+
+def fetch_concurrently(urls, max_workers, session=None):
+    '''
+    Fetches URLs on up to max_workers threads, yielding (key, response,
+    error) for each as it arrives, where error is the exception raised if
+    the request failed.  Only max_workers requests are in flight at once,
+    so that closing the generator early only waits for those to finish.
+
+    :param dict urls: Key, e.g. a procedure, to URL
+    :param int max_workers: Number of concurrent requests
+    :param session: Object with a `get` method like requests.get to make
+                    the requests with, e.g. an HTTPCache.  Defaults to a
+                    session with a connection pool for every worker.
+    '''
+    if session is None:
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=max_workers)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+    items = iter(urls.items())
+    futures = {}
+    pool = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        while True:
+            for key, url in items:
+                futures[pool.submit(session.get, url, allow_redirects=True)] = key
+                if len(futures) >= max_workers:
+                    break
+            if not futures:
+                break
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                key = futures.pop(future)
+                try:
+                    yield key, future.result(), None
+                except IOError as e:
+                    yield key, None, e
+    finally:
+        for future in futures:
+            future.cancel()
+        pool.shutdown(wait=True)
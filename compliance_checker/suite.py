@@ -9,17 +9,21 @@ import sys
 import subprocess
 import inspect
 import itertools
+import threading
 from operator import itemgetter
 from netCDF4 import Dataset
-from lxml import etree as ET
+from lxml import etree
 from distutils.version import StrictVersion
 from compliance_checker.base import fix_return_value, Result, GenericFile
-from owslib.sos import SensorObservationService
-from owslib.swe.sensor.sml import SensorML
 from compliance_checker.protocols import opendap, netcdf, cdl
-from compliance_checker.base import BaseCheck
+from compliance_checker import batch, inputs, remote
+from compliance_checker.base import BaseCheck, BaseSOSGCCheck, BaseSOSDSCheck
 from compliance_checker import MemoizedDataset
+from compliance_checker.header import HeaderDataset
+from compliance_checker import sos
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import closing
 import warnings
 try:
     from urlparse import urlparse
@@ -40,10 +44,80 @@ if sys.stderr.encoding is None:
 class CheckSuite(object):
 
     checkers = {}       # Base dict of checker names to BaseCheck derived types, override this in your CheckSuite implementation
+    checker_packages = {}  # checker class -> version of the package it was loaded from
     templates_root = 'compliance_checker'  # modify to load alternative Jinja2 templates
 
-    def __init__(self):
+    def __init__(self, max_workers=None, metadata_only=False, fail_fast=None,
+                 only_checks=None, sections=None, limit=None,
+                 http_cache=None, check_data=False, sample=None,
+                 memory_budget=None):
+        """
+        @param int max_workers: number of threads used to run checks marked
+                                with `io_bound` concurrently.  None or 1 runs
+                                every check sequentially on the calling
+                                thread.  The netCDF library isn't
+                                thread-safe, so only checks of remote
+                                datasets read through it run at once, see
+                                _iter_checks.
+        @param bool metadata_only: only evaluate checks which can be answered
+                                   from dimensions, attributes and data
+                                   types.  Checks which read variable data
+                                   are skipped.
+        @param int fail_fast: stop checking a dataset as soon as a check
+                              fails at or above this priority
+                              (BaseCheck.HIGH, MEDIUM or LOW).  None runs
+                              every check.  Raised to the limit if it is
+                              below it, so that checking never stops on a
+                              failure the report leaves out.
+        @param list only_checks: names of the check methods to run, e.g.
+                                 `check_units`.  None runs all of them.
+        @param list sections: sections of the standards to check, e.g.
+                              `['4', '5.6']`, each selecting the checks of
+                              the section and its subsections.  Only applies
+                              to checkers which number their checks by
+                              section; others run all of their checks.
+        @param int limit: lowest priority of the results to keep, as for
+                          the reports.  Checks which can only return results
+                          below it aren't run and their other results below
+                          it are discarded.  None keeps every result.
+        @param HTTPCache http_cache: cache which the metadata of remote
+                                     datasets is fetched through, and which
+                                     keeps the results of checking those
+                                     loaded from it alone.  None fetches
+                                     everything anew.
+        @param bool check_data: also run the checks marked with
+                                `validates_data`, which read every value of
+                                the variables they check.  They can be run
+                                without it by naming them in `only_checks`.
+        @param chunks.Sample sample: read only a sample of the chunks of the
+                                     variables the checks would read in
+                                     full, making their results approximate.
+                                     None reads every value.
+        @param chunks.MemoryBudget memory_budget: budget which the chunks of
+                                                  data read by the checks
+                                                  are planned to fit in.
+                                                  None reads variables whole
+                                                  where they always were.
+        """
         self.col_width = 40
+        self.max_workers = max_workers
+        self.metadata_only = metadata_only
+        if fail_fast is not None and limit is not None:
+            fail_fast = max(fail_fast, limit)
+        self.fail_fast = fail_fast
+        self.only_checks = only_checks
+        self.sections = sections
+        self.limit = limit
+        self.http_cache = http_cache
+        self.check_data = check_data
+        self.sample = sample
+        self.memory_budget = memory_budget
+        # remote dataset location -> URLs of the documents it was loaded
+        # from, when it was loaded from documents alone
+        self._sources = {}
+        # results of the attribute checks of many local files, see
+        # batch_attribute_checks
+        self._batch = None
 
     @classmethod
     def _get_generator_plugins(cls):
@@ -86,6 +160,7 @@ class CheckSuite(object):
         for x in working_set.iter_entry_points('compliance_checker.suites'):
             try:
                 xl = x.resolve()
+                cls.checker_packages[xl] = x.dist.version if x.dist else None
                 cls.checkers[':'.join((xl._cc_spec, xl._cc_spec_version))] = xl
             # TODO: remove this once all checkers move over to the new
             #       _cc_spec, _cc_spec_version
@@ -133,6 +208,42 @@ class CheckSuite(object):
 
         return returned_checks
 
+    def _select_checks(self, checker, checks):
+        """
+        Keeps only the checks selected by name with `only_checks` or by
+        section with `sections`.  Checks validating the data are only kept
+        with `check_data`, or when named in `only_checks`.
+        @param checker: Checker instance
+        @param list checks: list of (bound check method, max_level) tuples
+        """
+        if not self.check_data:
+            checks = [(c, max_level) for c, max_level in checks
+                      if not getattr(c, '_cc_validates_data', False) or
+                      c.__func__.__name__ in (self.only_checks or ())]
+        if self.only_checks is not None:
+            checks = [(c, max_level) for c, max_level in checks
+                      if c.__func__.__name__ in self.only_checks]
+        if self.sections is not None and checker._cc_check_sections:
+            def in_sections(c):
+                section = checker._cc_check_sections.get(c.__func__.__name__)
+                return section is not None and any(
+                    section == s or section.startswith(s + '.')
+                    for s in self.sections)
+            checks = [(c, max_level) for c, max_level in checks
+                      if in_sections(c)]
+        return checks
+
+    @staticmethod
+    def _reads_data(check_method):
+        """
+        Returns True if a check method reads variable data, either because it
+        is marked as `io_bound` or because it requires an input which does.
+        """
+        if getattr(check_method, '_cc_io_bound', False):
+            return True
+        return any(inputs.reads_data(name)
+                   for name in inputs.get_requirements(check_method))
+
     def _run_check(self, check_method, ds, max_level):
         """
         Runs a check and appends a result to the values list.
@@ -141,24 +252,149 @@ class CheckSuite(object):
         @param int max_level: check level
         @return list: list of Result objects
         """
-        val = check_method(ds)
+        limit = self.limit
+
+        def keep(res):
+            return ((max_level is None or res.weight > max_level) and
+                    (limit is None or res.weight >= limit))
+
+        val = None
+        if self._batch is not None:
+            val = self._batch.results(type(check_method.__self__),
+                                      check_method.__func__.__name__)
+        if val is None:
+            val = check_method(ds)
         if isinstance(val, list):
             check_val = []
             for v in val:
                 res = fix_return_value(v, check_method.__func__.__name__,
                                        check_method, check_method.__self__)
-                if max_level is None or res.weight > max_level:
+                if keep(res):
                     check_val.append(res)
 
             return check_val
         else:
             check_val = fix_return_value(val, check_method.__func__.__name__,
                                          check_method, check_method.__self__)
-            if max_level is None or check_val.weight > max_level:
+            if keep(check_val):
                 return [check_val]
             else:
                 return []
 
+    def _iter_checks(self, checks, ds):
+        """
+        Runs each check against the dataset, concurrently if this suite has
+        more than one worker, yielding (index into checks, list of Result
+        objects, error) as each check completes.  The error is None, or an
+        (exception, traceback) tuple if the check raised and produced no
+        results.  Closing the generator early cancels the checks which
+        haven't started and waits for the running ones to finish.
+
+        The netCDF-C and HDF5 libraries aren't thread-safe, so checks of a
+        remote dataset read through netCDF4 are run on a header-only copy of
+        it, which reads variable data with DAP2 requests of its own, see
+        remote.threaded_copy.  Checks of other datasets read through netCDF4
+        take turns using it, one check at a time, and those which aren't
+        thread-safe always run on the dataset itself.
+        @param list checks: list of (bound check method, max_level) tuples
+        @param netCDF4 dataset ds
+        """
+        concurrent = self.max_workers is not None and self.max_workers > 1
+        lock = ds_copy = None
+        if concurrent and isinstance(ds, Dataset):
+            ds_copy = remote.threaded_copy(ds, threading.Lock())
+            if ds_copy is None:
+                lock = threading.Lock()
+        shared = ds if ds_copy is None else ds_copy
+
+        def run_one(i, checked=ds):
+            check_method, max_level = checks[i]
+            try:
+                if lock is None:
+                    res = self._run_check(check_method, checked, max_level)
+                else:
+                    with lock:
+                        res = self._run_check(check_method, checked, max_level)
+                return i, res, None
+            except Exception as e:
+                return i, None, (e, sys.exc_info()[2])
+
+        if concurrent:
+            pooled, local, deferred = [], [], []
+            for i, (c, _) in enumerate(checks):
+                if not getattr(c, '_cc_thread_safe', True):
+                    deferred.append(i)
+                elif getattr(c, '_cc_io_bound', False):
+                    pooled.append(i)
+                else:
+                    local.append(i)
+
+            if ds_copy is not None:
+                inputs.share(ds, ds_copy)
+            executor = ThreadPoolExecutor(self.max_workers)
+            pending = set()
+            try:
+                pending.update(executor.submit(run_one, i, shared)
+                               for i in pooled)
+                # CPU bound checks gain nothing from threads, run them here
+                # while the pool waits on reads
+                for i in local:
+                    yield run_one(i, shared)
+                    done = set(f for f in pending if f.done())
+                    pending -= done
+                    for f in done:
+                        yield f.result()
+                for f in as_completed(list(pending)):
+                    pending.discard(f)
+                    yield f.result()
+                for i in deferred:
+                    yield run_one(i)
+            finally:
+                for f in pending:
+                    f.cancel()
+                executor.shutdown(wait=True)
+                if ds_copy is not None:
+                    inputs.release(ds_copy)
+                    ds_copy.close()
+        else:
+            for i in range(len(checks)):
+                yield run_one(i)
+
+    def _run_checks(self, checks, ds):
+        """
+        Runs each check against the dataset, concurrently if this suite has
+        more than one worker.  Results and errors are always collected in the
+        order of `checks`, regardless of the order in which they complete.
+        @param list checks: list of (bound check method, max_level) tuples
+        @param netCDF4 dataset ds
+        @return tuple: list of Result objects and a dict of check method
+                       name -> (exception, traceback)
+        """
+        outcomes = [None] * len(checks)
+        for i, res, err in self._iter_checks(checks, ds):
+            outcomes[i] = (res, err)
+        return self._collect(checks, outcomes)
+
+    @staticmethod
+    def _collect(checks, outcomes):
+        """
+        Gathers the outcomes of checks, in the order of `checks`, into a list
+        of Result objects and a dict of check method name -> (exception,
+        traceback).  Checks which weren't run have None as their outcome.
+        """
+        vals = []
+        errs = {}   # check method name -> (exc, traceback)
+        for (c, _), outcome in zip(checks, outcomes):
+            if outcome is None:
+                continue
+            res, err = outcome
+            if err is None:
+                vals.extend(res)
+            else:
+                errs[c.__func__.__name__] = err
+
+        return vals, errs
+
     def _get_check_versioned_name(self, check_name):
         """
         The compliance checker allows the user to specify a
@@ -244,15 +480,21 @@ class CheckSuite(object):
 
 
 
-    def run(self, ds, skip_checks, *checker_names):
+    def _get_checker_checks(self, ds, skip_checks, checker_names):
         """
-        Runs this CheckSuite on the dataset with all the passed Checker instances.
+        Instantiates and sets up the valid checkers for the dataset and
+        prepares the input cache of the dataset, and the results of its
+        attribute checks if they were batched.
 
-        Returns a dictionary mapping checker names to a 2-tuple of their grouped scores and errors/exceptions while running checks.
+        Returns a list of (checker name, list of (bound check method,
+        max_level) tuples).
         """
-
-        ret_val = {}
         checkers = self._get_valid_checkers(ds, checker_names)
+        if self._batch is not None:
+            try:
+                self._batch.select(ds.filepath())
+            except (AttributeError, ValueError):
+                self._batch.select(None)
 
         if skip_checks is not None:
             skip_check_dict = CheckSuite._process_skip_checks(skip_checks)
@@ -262,20 +504,127 @@ class CheckSuite(object):
         if len(checkers) == 0:
             print("No valid checkers found for tests '{}'".format(",".join(checker_names)))
 
+        limit = self.limit
+        checker_checks = []
         for checker_name, checker_class in checkers:
 
             checker = checker_class() # instantiate a Checker object
+            if limit is not None:
+                checker.priority_limit = limit
             checker.setup(ds)         # setup method to prep
 
-            checks = self._get_checks(checker, skip_check_dict)
-            vals = []
-            errs = {}   # check method name -> (exc, traceback)
+            checks = self._select_checks(checker,
+                                         self._get_checks(checker, skip_check_dict))
+            if self.metadata_only:
+                checks = [(c, max_level) for c, max_level in checks
+                          if not self._reads_data(c)]
+            if limit is not None:
+                # don't run checks whose results would all be discarded
+                checks = [(c, max_level) for c, max_level in checks
+                          if getattr(c, '_cc_max_priority', BaseCheck.HIGH) >= limit]
+            checker_checks.append((checker_name, checks))
+
+        # compute the inputs shared between the selected checks exactly once.
+        # When failing fast they are computed as the checks ask for them, as
+        # checking may stop before they are needed.
+        required = [name for _, checks in checker_checks
+                    for c, _ in checks
+                    for name in inputs.get_requirements(c, self.check_data)]
+        if required or self.memory_budget is not None:
+            inputs.prefetch(ds, [] if self.fail_fast else required,
+                            sample=self.sample, budget=self.memory_budget,
+                            check_data=self.check_data)
+
+        return checker_checks
+
+    def _iter_checker_checks(self, checker_checks, ds):
+        """
+        Runs the checks of each checker in turn, yielding (index into
+        checker_checks, index into the checker's checks, list of Result
+        objects, error) as each check completes.
+        """
+        for k, (checker_name, checks) in enumerate(checker_checks):
+            with closing(self._iter_checks(checks, ds)) as outcomes:
+                for i, res, err in outcomes:
+                    yield k, i, res, err
 
-            for c, max_level in checks:
-                try:
-                    vals.extend(self._run_check(c, ds, max_level))
-                except Exception as e:
-                    errs[c.__func__.__name__] = (e, sys.exc_info()[2])
+    def _fails_fast(self, results):
+        """
+        Returns True if checking should stop because one of the results of a
+        check failed at or above the fail_fast priority
+        """
+        if self.fail_fast is None or not results:
+            return False
+        for r in results:
+            if r.weight < self.fail_fast or r.value is None:
+                continue
+            if isinstance(r.value, tuple):
+                if r.value[0] < r.value[1]:
+                    return True
+            elif not r.value:
+                return True
+        return False
+
+    def iter_run(self, ds, skip_checks, *checker_names):
+        """
+        Runs this CheckSuite on the dataset like `run`, but yields the results
+        of each check as soon as it completes, as a tuple of (checker name,
+        check method name, list of Result objects, error).  The error is
+        None, or an (exception, traceback) tuple if the check raised.  The
+        results are those returned by the check, not yet grouped and scored.
+        Checks run concurrently may complete in any order.
+
+        Stopping the iteration early stops checking the dataset.  The
+        fail_fast priority of the suite isn't applied, callers decide when to
+        stop.
+        """
+        checker_checks = self._get_checker_checks(ds, skip_checks,
+                                                  checker_names)
+        try:
+            with closing(self._iter_checker_checks(checker_checks, ds)) as outcomes:
+                for k, i, res, err in outcomes:
+                    checker_name, checks = checker_checks[k]
+                    yield (checker_name, checks[i][0].__func__.__name__,
+                           res or [], err)
+        finally:
+            inputs.release(ds)
+
+    def run(self, ds, skip_checks, *checker_names):
+        """
+        Runs this CheckSuite on the dataset with all the passed Checker instances.
+
+        Returns a dictionary mapping checker names to a 2-tuple of their grouped scores and errors/exceptions while running checks.
+
+        If the suite has a fail_fast priority, checking stops as soon as a
+        check fails at or above it.  Only the checkers which were started
+        are returned then, with the results of the checks which completed.
+        """
+
+        ret_val = {}
+        checker_checks = self._get_checker_checks(ds, skip_checks,
+                                                  checker_names)
+        outcomes = [[None] * len(checks) for _, checks in checker_checks]
+        stopped = False
+
+        try:
+            with closing(self._iter_checker_checks(checker_checks, ds)) as it:
+                for k, i, res, err in it:
+                    outcomes[k][i] = (res, err)
+                    if self._fails_fast(res):
+                        stopped = True
+                        checker_name, checks = checker_checks[k]
+                        print("Stopped checking after {} failed in {}".format(
+                              checks[i][0].__func__.__name__, checker_name),
+                              file=sys.stderr)
+                        break
+        finally:
+            inputs.release(ds)
+
+        for (checker_name, checks), checker_outcomes in zip(checker_checks,
+                                                            outcomes):
+            if stopped and not any(checker_outcomes):
+                continue
+            vals, errs = self._collect(checks, checker_outcomes)
 
             # score the results we got back
             groups = self.scores(vals)
@@ -284,6 +633,71 @@ class CheckSuite(object):
 
         return ret_val
 
+    def batch_attribute_checks(self, locations):
+        """
+        Evaluates the attribute checks, those using `check_has`, of the
+        local netCDF files among the dataset locations for all of them at
+        once, see compliance_checker.batch.  When this suite then runs each
+        of those files, in the order given, these checks take their results
+        from the batch instead of evaluating the attributes of each file
+        again.  The results are the same either way.
+
+        @param list locations: dataset locations which will be checked
+        """
+        paths = [location for location in locations
+                 if os.path.isfile(location) and netcdf.is_netcdf(location)]
+        self._batch = None
+        if paths:
+            table = batch.AttributeTable.from_paths(paths)
+            self._batch = batch.BatchResults(table, self.limit)
+
+    def _checker_versions(self, checker_names):
+        """
+        Returns the version of each of the named checkers, or of all of them
+        if none are named, and of the package it was loaded from, as a dict
+        of checker name -> [checker version, package version]
+        """
+        versions = {}
+        for name in checker_names or self.checkers:
+            checker = self.checkers.get(name)
+            if checker is not None:
+                versions[name] = [getattr(checker, '_cc_checker_version', None),
+                                  self.checker_packages.get(checker)]
+        return versions
+
+    def run_cached(self, ds, ds_str, skip_checks, *checker_names):
+        """
+        Runs the checks like `run`, but with an http_cache, reuses the
+        results of an earlier run of the same checks on a remote dataset
+        whose documents revalidated unchanged when it was loaded with
+        `load_dataset`, and keeps the results of this run for the next.
+
+        @param ds_str: location the dataset was loaded from
+        """
+        if self.http_cache is None or ds_str not in self._sources:
+            return self.run(ds, skip_checks, *checker_names)
+
+        fingerprint = self.http_cache.fingerprint(self._sources[ds_str])
+        options = {
+            'ds_loc': ds_str,
+            'checker_names': list(checker_names),
+            'skip_checks': skip_checks,
+            'metadata_only': self.metadata_only,
+            'fail_fast': self.fail_fast,
+            'only_checks': self.only_checks,
+            'sections': self.sections,
+            'limit': self.limit,
+            'check_data': self.check_data,
+            'sample': self.sample and self.sample.size,
+            # the results of other versions of the checkers may differ
+            'checker_versions': self._checker_versions(checker_names),
+        }
+        score_groups = self.http_cache.load_results(options, fingerprint)
+        if score_groups is None:
+            score_groups = self.run(ds, skip_checks, *checker_names)
+            self.http_cache.store_results(options, fingerprint, score_groups)
+        return score_groups
+
     @classmethod
     def passtree(cls, groups, limit):
         for r in groups:
@@ -565,24 +979,87 @@ class CheckSuite(object):
         return "\n".join(proc_strs)
 
 
-    def process_doc(self, doc):
+    def _sos_checker_classes(self):
+        """
+        Returns the loaded checker classes, and their subclasses, which check
+        SOS documents
+        """
+        classes = set()
+        queue = list(self.checkers.values())
+        while queue:
+            a = queue.pop()
+            if a in classes:
+                continue
+            classes.add(a)
+            queue.extend(a.__subclasses__())
+        return [a for a in classes if issubclass(a, (BaseSOSGCCheck, BaseSOSDSCheck))]
+
+    def process_doc(self, doc, extra_xpaths=None):
         """
         Attempt to parse an xml string conforming to either an SOS or SensorML
         dataset and return the results
-        """
-        xml_doc = ET.fromstring(doc)
-        if xml_doc.tag == "{http://www.opengis.net/sos/1.0}Capabilities":
-            ds = SensorObservationService(None, xml=doc)
-            # SensorObservationService does not store the etree doc root,
-            # so maybe use monkey patching here for now?
-            ds._root = xml_doc
 
-        elif xml_doc.tag == "{http://www.opengis.net/sensorML/1.0.1}SensorML":
-            ds = SensorML(xml_doc)
+        The document is parsed once, keeping only the elements the XPaths of
+        the loaded SOS checkers, and any extra XPaths given, can select.  If
+        they can't be pruned to, the checks may rely on more than the XPaths
+        and get the owslib objects of the whole document, see
+        sos.owslib_document.
+        """
+        xpaths = sos.checker_xpaths(self._sos_checker_classes())
+        if xpaths is None:
+            paths = None
         else:
-            raise ValueError("Unrecognized XML root element: {}".format(xml_doc.tag))
+            paths = sos.element_paths(xpaths + list(extra_xpaths or []))
+        ds = sos.parse_document(doc, paths)
+        if paths is None:
+            ds = sos.owslib_document(ds, doc)
         return ds
 
+    def crawl_sos(self, url, max_workers=8):
+        """
+        Loads an SOS GetCapabilities document and the DescribeSensor
+        documents of the procedures of all of its offerings, fetched on up to
+        max_workers threads at once.  Yields (location, dataset) pairs: the
+        GetCapabilities document first, then the DescribeSensor documents as
+        they arrive, so that they can be checked while the others are still
+        being fetched.  DescribeSensor documents which can't be fetched or
+        parsed are reported on stderr and skipped.
+
+        @param str url: URL of the GetCapabilities document
+        @param int max_workers: number of concurrent DescribeSensor requests
+        """
+        self._sources.pop(url, None)
+        response = (self.http_cache or requests).get(url, allow_redirects=True)
+        response.raise_for_status()
+        ds = self.process_doc(response.content, sos.CRAWL_XPATHS)
+        if not isinstance(ds, tuple(BaseSOSGCCheck.supported_ds)):
+            raise ValueError("{} is not an SOS GetCapabilities document".format(url))
+        self._sources[url] = [url]
+        yield url, ds
+
+        urls = sos.describe_sensor_urls(ds, url)
+        session = None
+        if self.http_cache is not None:
+            # a connection for each worker
+            adapter = requests.adapters.HTTPAdapter(pool_maxsize=max_workers)
+            self.http_cache.session.mount('http://', adapter)
+            self.http_cache.session.mount('https://', adapter)
+            session = self.http_cache
+        for procedure, response, error in sos.fetch_concurrently(urls, max_workers,
+                                                                 session):
+            location = urls[procedure]
+            try:
+                if error is not None:
+                    raise error
+                response.raise_for_status()
+                ds = self.process_doc(response.content)
+            except (IOError, ValueError, etree.XMLSyntaxError) as e:
+                print("Could not load the DescribeSensor document of {}: {}".format(
+                      procedure, e), file=sys.stderr)
+                continue
+            self._sources[location] = [location]
+            yield location, ds
+
     def generate_dataset(self, cdl_path):
         '''
         Use ncgen to generate a netCDF file from a .cdl file
@@ -618,13 +1095,29 @@ class CheckSuite(object):
         :param str ds_str: URL to the remote resource
         '''
 
-        if opendap.is_opendap(ds_str):
+        self._sources.pop(ds_str, None)
+        das = opendap.detect_opendap(ds_str, self.http_cache)
+        if das is not None:
+            if self.metadata_only and das.status_code == 200:
+                # Build the dataset from the DAS fetched to detect the
+                # service and the DDS, without the netCDF library.
+                # Structures and sequences fall through to netCDF4.
+                try:
+                    ds = HeaderDataset.from_opendap(ds_str, das.text,
+                                                    session=self.http_cache)
+                except (opendap.DAPError, IOError):
+                    pass
+                else:
+                    self._sources[ds_str] = [ds_str + '.das', ds_str + '.dds']
+                    return ds
             return Dataset(ds_str)
         else:
             # Check if the HTTP response is XML, if it is, it's likely SOS so
             # we'll attempt to parse the response as SOS
-            response = requests.get(ds_str, allow_redirects=True)
+            response = (self.http_cache or requests).get(ds_str,
+                                                         allow_redirects=True)
             if 'text/xml' in response.headers['content-type']:
+                self._sources[ds_str] = [ds_str]
                 return self.process_doc(response.content)
 
             raise ValueError("Unknown service with content-type: {}".format(response.headers['content-type']))
@@ -639,6 +1132,14 @@ class CheckSuite(object):
             ds_str = self.generate_dataset(ds_str)
 
         if netcdf.is_netcdf(ds_str):
+            if self.metadata_only:
+                # Read classic format headers directly, without the netCDF
+                # library.  Anything else (e.g. HDF5) falls through to
+                # netCDF4, which only reads the header on open.
+                try:
+                    return HeaderDataset.from_classic(ds_str)
+                except netcdf.ClassicHeaderError:
+                    pass
             return MemoizedDataset(ds_str)
 
         # Assume this is just a Generic File if it exists
@@ -657,80 +1158,35 @@ class CheckSuite(object):
 
     def _group_raw(self, raw_scores, cur=None, level=1):
         """
-        Internal recursive method to group raw scores into a cascading score summary.
+        Internal method to group raw scores into a cascading score summary.
         Only top level items are tallied for scores.
+
+        Results are inserted into a tree keyed by (name component, weight) in
+        a single pass by walking each Result's name; the Result objects
+        themselves are never copied.  Scores and messages are then aggregated
+        bottom up.
         @param list raw_scores: list of raw scores (Result objects)
         """
-
-        # BEGIN INTERNAL FUNCS ########################################
-        def trim_groups(r):
-            if isinstance(r.name, tuple) or isinstance(r.name, list):
-                new_name = r.name[1:]
-            else:
-                new_name = []
-
-            return Result(r.weight, r.value, new_name, r.msgs)
-
-        # CHECK FOR TERMINAL CONDITION: all raw_scores.name are single length
-        # @TODO could have a problem here with scalar name, but probably still works
-        terminal = [len(x.name) for x in raw_scores]
-        if terminal == [0] * len(raw_scores):
+        # CHECK FOR TERMINAL CONDITION: all raw_scores.name are zero length
+        if all(len(r.name) == 0 for r in raw_scores):
             return []
 
-        def group_func(r):
-            """
-            Takes a Result object and slices off the first element of its name
-            if its's a tuple. Otherwise, does nothing to the name. Returns the
-            Result's name and weight in a tuple to be used for sorting in that
-            order in a groupby function.
-            @param Result r
-            @return tuple (str, int)
-            """
-            if isinstance(r.name, tuple) or isinstance(r.name, list):
-                if len(r.name) == 0:
-                    retval = ''
-                else:
-                    retval = r.name[0:1][0]
-            else:
-                retval = r.name
-            return retval, r.weight
-        # END INTERNAL FUNCS ##########################################
-
-        # NOTE until this point, *ALL* Results in raw_scores are
-        # individual Result objects.
-
-        # sort then group by name, then by priority weighting
-        grouped = itertools.groupby(sorted(raw_scores, key=group_func),
-                                    key=group_func)
-
-        # NOTE: post-grouping, grouped looks something like
-        # [(('Global Attributes', 1), <itertools._grouper at 0x7f10982b5390>),
-        #  (('Global Attributes', 3), <itertools._grouper at 0x7f10982b5438>),
-        #  (('Not a Global Attr', 1), <itertools._grouper at 0x7f10982b5470>)]
-        #  (('Some Variable', 2),     <itertools._grouper at 0x7f10982b5400>),
-
-        ret_val = []
-
-        for k, v in grouped: # iterate through the grouped tuples
-
-            k = k[0]         # slice ("name", weight_val) --> "name"
-            v = list(v)      # from itertools._grouper to list
-
-            cv = self._group_raw(list(map(trim_groups, v)), k, level + 1)
-            if len(cv):
-                # if this node has children, max weight of children + sum of all the scores
-                max_weight = max([x.weight for x in cv])
-                sum_scores = tuple(map(sum, list(zip(*([x.value for x in cv])))))
-                msgs = []
-
+        root = _GroupNode()
+        for idx, r in enumerate(raw_scores):
+            if isinstance(r.name, (tuple, list)):
+                path = r.name
             else:
-                max_weight = max([x.weight for x in v])
-                sum_scores = tuple(map(sum, list(zip(*([self._translate_value(x.value) for x in v])))))
-                msgs = sum([x.msgs for x in v], [])
-
-            ret_val.append(Result(name=k, weight=max_weight, value=sum_scores, children=cv, msgs=msgs))
-
-        return ret_val
+                # scalar names never have children
+                path = (r.name,)
+            node = root
+            for part in path:
+                node = node.child(part, r.weight)
+            if node is root:
+                # an empty tuple/list name groups under ''
+                node = root.child('', r.weight)
+            node.ended.append((idx, r))
+
+        return root.to_results(self._translate_value)
 
     def _translate_value(self, val):
         """
@@ -745,3 +1201,64 @@ class CheckSuite(object):
             return (0, 0)
 
         return val
+
+
+class _GroupNode(object):
+    """
+    Node of the tree built by CheckSuite._group_raw.  Children are keyed by
+    (name, weight) tuples, mirroring the sort/group key used for output.
+    """
+    __slots__ = ('children', 'ended')
+
+    def __init__(self):
+        self.children = {}
+        self.ended = []    # (insertion index, Result) whose names end here
+
+    def child(self, name, weight):
+        key = (name, weight)
+        node = self.children.get(key)
+        if node is None:
+            node = self.children[key] = _GroupNode()
+        return node
+
+    def to_results(self, translate):
+        """
+        Converts the children of this node into a list of grouped Results
+        sorted by name and weight.
+        """
+        ret_val = []
+        for key in sorted(self.children):
+            name, weight = key
+            node = self.children[key]
+            if node.children and node.ended:
+                # Results which end at a node that also has deeper results
+                # are grouped under an unnamed child, in original order
+                sub = node.child('', weight)
+                sub.ended = sorted(node.ended + sub.ended, key=itemgetter(0))
+                node.ended = []
+
+            if node.children:
+                cv = node.to_results(translate)
+                scored = possible = 0
+                for c in cv:
+                    scored += c.value[0]
+                    possible += c.value[1]
+                max_weight = max(c.weight for c in cv)
+                msgs = []
+            else:
+                cv = []
+                scored = possible = 0
+                msgs = []
+                max_weight = None
+                for _, r in node.ended:
+                    s, p = translate(r.value)
+                    scored += s
+                    possible += p
+                    msgs.extend(r.msgs)
+                    if max_weight is None or r.weight > max_weight:
+                        max_weight = r.weight
+
+            ret_val.append(Result(name=name, weight=max_weight,
+                                  value=(scored, possible), children=cv,
+                                  msgs=msgs))
+        return ret_val
@@ -0,0 +1,332 @@
+'''
+Archive-level summaries of compliance checker results
+
+A Summary aggregates the grouped results of each dataset into running
+counters as soon as the dataset has been checked, so the result trees can be
+discarded and memory use doesn't grow with the number of datasets.  It keeps,
+for every checker:
+
+- the number of datasets checked, which passed, and which had checks raise
+  errors
+- how often each top level result failed, by name and priority
+- how often each check method raised an error
+- a histogram and the mean, minimum and maximum of the dataset scores
+- the k lowest scoring datasets
+
+and the number of datasets which could not be loaded at all, with the
+first k of them and their errors.
+
+Summaries are serialized to JSON and summaries from separate runs can be
+merged.
+'''
+from __future__ import print_function, unicode_literals
+import heapq
+import io
+import json
+from collections import defaultdict
+
+
+# number of equal width bins in the score histogram
+HISTOGRAM_BINS = 10
+
+
+def dataset_score(groups, limit):
+    '''
+    Returns the (scored points, possible points) of a dataset over the results
+    at or above the priority limit, as in the reports
+
+    :param list groups: Grouped results of a checker
+    :param int limit: Lowest priority counted
+    '''
+    scored = possible = 0
+    for res in groups:
+        if res.weight < limit or res.value[1] == 0:
+            continue
+        scored += res.value[0]
+        possible += res.value[1]
+    return scored, possible
+
+
+class CheckerSummary(object):
+    '''
+    Running totals for the results of one checker
+    '''
+
+    def __init__(self, testname=None, scoreheader=None, top_k=10):
+        self.testname = testname
+        self.scoreheader = scoreheader or {}
+        self.top_k = top_k
+        self.datasets = 0
+        self.passed = 0
+        self.errored = 0
+        # (result name, weight) -> [failed, checked]
+        self.failures = defaultdict(lambda: [0, 0])
+        # check method name -> count of datasets it raised an error for
+        self.errors = defaultdict(int)
+        self.histogram = [0] * HISTOGRAM_BINS
+        self.score_sum = 0.0
+        self.score_min = None
+        self.score_max = None
+        # max heap, through negated scores, of the lowest scoring datasets
+        self._worst = []
+
+    def add(self, source_name, groups, errors, passed, limit):
+        '''
+        Adds the results of a dataset
+
+        :param str source_name: Dataset location
+        :param list groups: Grouped results of the checker
+        :param dict errors: Check method names to the errors they raised
+        :param bool passed: True if the dataset passed at the limit
+        :param int limit: Lowest priority counted
+        '''
+        self.datasets += 1
+        self.passed += bool(passed)
+        self.errored += bool(errors)
+        for check_name in errors:
+            self.errors[check_name] += 1
+
+        for res in groups:
+            if res.weight < limit or res.value[1] == 0:
+                continue
+            counts = self.failures[(res.name, res.weight)]
+            counts[0] += res.value[0] < res.value[1]
+            counts[1] += 1
+
+        scored, possible = dataset_score(groups, limit)
+        score = float(scored) / possible if possible else 1.0
+        self._add_score(score)
+        self._add_worst(score, source_name, scored, possible)
+
+    def _add_score(self, score, count=1):
+        self.histogram[min(int(score * HISTOGRAM_BINS), HISTOGRAM_BINS - 1)] += count
+        self.score_sum += score * count
+        if self.score_min is None or score < self.score_min:
+            self.score_min = score
+        if self.score_max is None or score > self.score_max:
+            self.score_max = score
+
+    def _add_worst(self, score, source_name, scored, possible):
+        entry = (-score, source_name, scored, possible)
+        if len(self._worst) < self.top_k:
+            heapq.heappush(self._worst, entry)
+        elif entry > self._worst[0]:
+            heapq.heapreplace(self._worst, entry)
+
+    @property
+    def worst(self):
+        '''
+        List of (score, source name, scored points, possible points) of the
+        lowest scoring datasets, worst first
+        '''
+        return [(-neg_score, source, scored, possible) for neg_score, source,
+                scored, possible in sorted(self._worst, reverse=True)]
+
+    def merge(self, other):
+        '''
+        Adds the totals of another CheckerSummary to this one
+        '''
+        self.testname = self.testname or other.testname
+        self.scoreheader = self.scoreheader or other.scoreheader
+        self.datasets += other.datasets
+        self.passed += other.passed
+        self.errored += other.errored
+        for key, (failed, checked) in other.failures.items():
+            counts = self.failures[key]
+            counts[0] += failed
+            counts[1] += checked
+        for check_name, count in other.errors.items():
+            self.errors[check_name] += count
+        self.histogram = [a + b for a, b in zip(self.histogram, other.histogram)]
+        self.score_sum += other.score_sum
+        for score in (other.score_min, other.score_max):
+            if score is not None:
+                self._add_score(score, count=0)
+        for score, source, scored, possible in other.worst:
+            self._add_worst(score, source, scored, possible)
+
+    def to_dict(self):
+        failures = sorted(self.failures.items(),
+                          key=lambda f: (-f[1][0], -f[0][1], f[0][0]))
+        return {
+            'testname': self.testname,
+            'scoreheader': self.scoreheader,
+            'datasets': self.datasets,
+            'passed': self.passed,
+            'errored': self.errored,
+            'failures': [{'name': name, 'weight': weight, 'failed': failed,
+                          'checked': checked}
+                         for (name, weight), (failed, checked) in failures],
+            'errors': dict(self.errors),
+            'score_histogram': self.histogram,
+            'score_mean': self.score_sum / self.datasets if self.datasets else None,
+            'score_sum': self.score_sum,
+            'score_min': self.score_min,
+            'score_max': self.score_max,
+            'worst': [{'source_name': source, 'score': score,
+                       'scored_points': scored, 'possible_points': possible}
+                      for score, source, scored, possible in self.worst],
+        }
+
+    @classmethod
+    def from_dict(cls, d, top_k=10):
+        # JSON object keys are always strings
+        scoreheader = {int(k): v for k, v in d['scoreheader'].items()}
+        summary = cls(d['testname'], scoreheader, top_k)
+        summary.datasets = d['datasets']
+        summary.passed = d['passed']
+        summary.errored = d['errored']
+        for f in d['failures']:
+            summary.failures[(f['name'], f['weight'])] = [f['failed'], f['checked']]
+        summary.errors.update(d['errors'])
+        summary.histogram = list(d['score_histogram'])
+        summary.score_sum = d['score_sum']
+        summary.score_min = d['score_min']
+        summary.score_max = d['score_max']
+        for w in d['worst']:
+            summary._add_worst(w['score'], w['source_name'],
+                               w['scored_points'], w['possible_points'])
+        return summary
+
+
+class Summary(object):
+    '''
+    Running totals for the results of all checkers over many datasets
+
+    :param int limit: Lowest priority counted, as for the reports
+    :param int top_k: Number of lowest scoring datasets kept per checker,
+                      and of the datasets which failed to load
+    '''
+
+    def __init__(self, limit=2, top_k=10):
+        self.limit = limit
+        self.top_k = top_k
+        self.checkers = {}
+        # number of datasets which failed to load, and (source name, error
+        # message) of the first top_k of them
+        self.load_error_count = 0
+        self.load_errors = []
+
+    def add_load_error(self, source_name, error):
+        '''
+        Records a dataset which could not be loaded, and so wasn't checked
+
+        :param str source_name: Dataset location
+        :param Exception error: The error raised loading it
+        '''
+        self.load_error_count += 1
+        if len(self.load_errors) < self.top_k:
+            self.load_errors.append((source_name, '{}: {}'.format(
+                                     type(error).__name__, error)))
+
+    def checker(self, checker_name, testname=None, scoreheader=None):
+        '''
+        Returns the CheckerSummary of a checker, creating it if needed
+        '''
+        if checker_name not in self.checkers:
+            self.checkers[checker_name] = CheckerSummary(testname, scoreheader,
+                                                         self.top_k)
+        return self.checkers[checker_name]
+
+    def merge(self, other):
+        '''
+        Adds the totals of another Summary to this one.  Both must have been
+        computed with the same priority limit.
+        '''
+        if other.limit != self.limit:
+            raise ValueError("Can't merge summaries computed with different "
+                             "criteria (limits {} and {})".format(self.limit,
+                                                                  other.limit))
+        for checker_name, checker_summary in other.checkers.items():
+            self.checker(checker_name).merge(checker_summary)
+        self.load_error_count += other.load_error_count
+        self.load_errors.extend(
+            other.load_errors[:self.top_k - len(self.load_errors)])
+
+    def to_dict(self):
+        return {
+            'limit': self.limit,
+            'checkers': {name: s.to_dict() for name, s in self.checkers.items()},
+            'load_error_count': self.load_error_count,
+            'load_errors': [{'source_name': source, 'error': error}
+                            for source, error in self.load_errors],
+        }
+
+    @classmethod
+    def from_dict(cls, d, top_k=10):
+        summary = cls(d['limit'], top_k)
+        for name, checker_dict in d['checkers'].items():
+            summary.checkers[name] = CheckerSummary.from_dict(checker_dict,
+                                                              top_k)
+        # summaries written before load errors were recorded have none
+        load_errors = d.get('load_errors', [])
+        summary.load_error_count = d.get('load_error_count', len(load_errors))
+        summary.load_errors = [(e['source_name'], e['error'])
+                               for e in load_errors[:top_k]]
+        return summary
+
+    @classmethod
+    def load(cls, filename, top_k=10):
+        '''
+        Reads a summary written in JSON format
+
+        :param str filename: Path to the summary
+        '''
+        with io.open(filename, encoding='utf-8') as f:
+            return cls.from_dict(json.load(f), top_k)
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2, sort_keys=True,
+                          ensure_ascii=False)
+
+    def text_output(self, width=80):
+        '''
+        Prints the summary as a plain text report
+        '''
+        for checker_name in sorted(self.checkers):
+            s = self.checkers[checker_name]
+            print('\n')
+            print("-" * width)
+            print('{:^{width}}'.format("IOOS Compliance Checker Summary", width=width))
+            print('{:^{width}}'.format(s.testname or checker_name, width=width))
+            print("-" * width)
+            print("Datasets checked: {}".format(s.datasets))
+            print("Datasets passing: {}".format(s.passed))
+            print("Datasets with check errors: {}".format(s.errored))
+            if s.datasets:
+                print("Mean score: {:.1%} (min {:.1%}, max {:.1%})".format(
+                      s.score_sum / s.datasets, s.score_min, s.score_max))
+
+            print("\nScore distribution")
+            for i, count in enumerate(s.histogram):
+                print("  {:>4.0%} - {:>4.0%}  {:>8}".format(
+                      float(i) / HISTOGRAM_BINS, float(i + 1) / HISTOGRAM_BINS,
+                      count))
+
+            failures = [f for f in s.to_dict()['failures'] if f['failed']]
+            if failures:
+                print("\nFailures")
+            for f in failures:
+                priority = s.scoreheader.get(f['weight'], f['weight'])
+                print("  {:>8} of {:<8} {} ({})".format(
+                      f['failed'], f['checked'], f['name'], priority))
+
+            if s.errors:
+                print("\nChecks which raised errors")
+            for check_name, count in sorted(s.errors.items(),
+                                            key=lambda e: (-e[1], e[0])):
+                print("  {:>8}  {}".format(count, check_name))
+
+            if s.worst:
+                print("\nLowest scoring datasets")
+            for score, source, scored, possible in s.worst:
+                print("  {:>6.1%}  {}/{}  {}".format(score, scored, possible,
+                                                     source))
+
+        if self.load_error_count:
+            print('\n')
+            print("-" * width)
+            print("Datasets which could not be loaded: {}".format(
+                  self.load_error_count))
+        for source, error in self.load_errors:
+            print("  {}  {}".format(source, error))
@@ -1,5 +1,20 @@
 from netCDF4 import Dataset
+import numpy as np
+import re
+import six
+import struct
 import tempfile
+import threading
+import time
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import unquote
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urllib import unquote
 
 class MockNetCDF(Dataset):
     """
@@ -43,3 +58,137 @@ class MockVariable(object):
             self.ndim = copy_var.ndim
             for att in copy_var.ncattrs():
                 setattr(self, att, getattr(copy_var, att))
+
+
+# netCDF data type -> DAP2 base type and its XDR data type on the wire
+DAP_TYPES = {
+    'f8': ('Float64', '>f8'),
+    'f4': ('Float32', '>f4'),
+    'i4': ('Int32', '>i4'),
+    'i2': ('Int16', '>i4'),
+    'u1': ('Byte', 'u1'),
+}
+
+
+class OPeNDAPHandler(BaseHTTPRequestHandler):
+    '''
+    Answers DAP2 requests for the numeric variables of a netCDF file,
+    waiting `server.delay` seconds before sending each data response
+    '''
+
+    def _das(self):
+        def container(name, obj):
+            lines = ['    {} {{'.format(name)]
+            for attr in obj.ncattrs():
+                value = obj.getncattr(attr)
+                if isinstance(value, six.string_types):
+                    lines.append('        String {} "{}";'.format(attr, value))
+                    continue
+                value = np.ravel(value)
+                lines.append('        {} {} {};'.format(
+                    DAP_TYPES[value.dtype.str[1:]][0], attr,
+                    ', '.join(repr(v.item()) for v in value)))
+            return lines + ['    }']
+        lines = ['Attributes {']
+        for name, var in self.server.nc.variables.items():
+            lines += container(name, var)
+        lines += container('NC_GLOBAL', self.server.nc) + ['}']
+        return '\n'.join(lines)
+
+    def _dds(self, shapes):
+        lines = ['Dataset {']
+        for name, shape in shapes:
+            var = self.server.nc.variables[name]
+            lines.append('    {} {}{};'.format(
+                DAP_TYPES[var.dtype.str[1:]][0], name,
+                ''.join('[{} = {}]'.format(dim, size)
+                        for dim, size in zip(var.dimensions, shape))))
+        return '\n'.join(lines + ['} data;'])
+
+    def _projections(self, constraint):
+        projections = []
+        for term in filter(None, unquote(constraint).split(',')):
+            name = re.match(r'[^\[]+', term).group(0)
+            index = []
+            for slab in re.findall(r'\[([^\]]*)\]', term):
+                parts = [int(part) for part in slab.split(':')]
+                start, stride, stop = (parts if len(parts) == 3 else
+                                       (parts[0], 1, parts[-1]))
+                index.append(slice(start, stop + 1, stride))
+            projections.append((name, tuple(index)))
+        return projections or [(name, ()) for name in self.server.nc.variables]
+
+    def do_GET(self):
+        path, _, constraint = self.path.partition('?')
+        if path.endswith('.das'):
+            body = self._das().encode('utf-8')
+        elif path.endswith('.dds'):
+            with self.server.lock:
+                shapes = [(name, self.server.nc.variables[name][index].shape)
+                          for name, index in self._projections(constraint)]
+            body = self._dds(shapes).encode('utf-8')
+        elif path.endswith('.dods'):
+            self.server.started()
+            time.sleep(self.server.delay)
+            with self.server.lock:
+                arrays = [(name, np.ma.getdata(self.server.nc.variables[name][index]))
+                          for name, index in self._projections(constraint)]
+            body = self._dds([(name, values.shape) for name, values in arrays])
+            body = body.encode('utf-8') + b'\nData:\n'
+            for name, values in arrays:
+                wire = DAP_TYPES[values.dtype.str[1:]][1]
+                if values.ndim:
+                    body += struct.pack('>II', values.size, values.size)
+                body += values.astype(wire).tobytes()
+                if wire == 'u1':
+                    body += b'\0' * (-values.size % 4)
+            self.server.finished()
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('XDODS-Server', 'dods/3.2')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class OPeNDAPServer(ThreadingMixIn, HTTPServer):
+    '''
+    Local OPeNDAP server of a netCDF file, recording the most data requests
+    it ever answered at once.  Use as a context manager.
+    '''
+    daemon_threads = True
+
+    def __init__(self, path, delay=0):
+        HTTPServer.__init__(self, ('localhost', 0), OPeNDAPHandler)
+        self.nc = Dataset(path)
+        self.nc.set_auto_maskandscale(False)
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.running = 0
+        self.most = 0
+        self.url = 'http://localhost:{}/data'.format(self.server_port)
+
+    def started(self):
+        with self.lock:
+            self.running += 1
+            self.most = max(self.most, self.running)
+
+    def finished(self):
+        with self.lock:
+            self.running -= 1
+
+    def __enter__(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
+        self.nc.close()
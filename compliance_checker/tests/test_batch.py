@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+compliance_checker/tests/test_batch.py
+'''
+import unittest
+from collections import OrderedDict
+
+from pkg_resources import resource_filename
+
+from compliance_checker.acdd import ACDD1_1Check, ACDD1_3Check
+from compliance_checker.batch import (AttributeTable, attribute_checks,
+                                      run_attribute_checks)
+from compliance_checker.header import HeaderDataset
+from compliance_checker.ioos import IOOS1_1Check
+from compliance_checker.suite import CheckSuite
+
+
+def result_key(result):
+    return (result.weight, result.value, result.name, result.msgs,
+            result.check_method.__name__)
+
+
+class TestBatch(unittest.TestCase):
+    '''
+    Test suite for attribute checks over many datasets at once
+    '''
+
+    def setUp(self):
+        self.datasets = [
+            HeaderDataset('complete.nc', OrderedDict([
+                ('title', 'Title'), ('keywords', 'ocean'),
+                ('summary', 'Summary'), ('creator_type', 'person'),
+                ('Conventions', 'CF-1.6, ACDD-1.3'),
+                ('geospatial_bounds', 'POINT(1 2)')])),
+            HeaderDataset('blank.nc', OrderedDict([
+                ('title', '  '), ('creator_type', 'nobody'),
+                ('Conventions', 'ACDD-1.1'), ('geospatial_bounds', 'blob')])),
+            HeaderDataset('empty.nc'),
+            HeaderDataset('complete2.nc', OrderedDict([
+                ('title', 'Title'), ('keywords', 'ocean'),
+                ('summary', 'Summary'), ('creator_type', 'person'),
+                ('Conventions', 'CF-1.6, ACDD-1.3')])),
+        ]
+
+    def test_table(self):
+        table = AttributeTable.from_datasets(self.datasets)
+        title = table.column('title')
+        # each distinct value is stored once
+        self.assertEqual(title.values, ['Title', '  '])
+        self.assertEqual(title.codes.tolist(), [0, 1, -1, 0])
+        self.assertEqual(title.present.tolist(), [True, True, False, True])
+        self.assertEqual(table.column('no_such_attribute').present.tolist(),
+                         [False] * 4)
+
+        ds = table.dataset(1)
+        self.assertEqual(ds.filepath(), 'blank.nc')
+        self.assertEqual(ds.creator_type, 'nobody')
+        self.assertFalse(hasattr(ds, 'keywords'))
+        self.assertEqual(ds.ncattrs(), ['title', 'creator_type',
+                                        'Conventions', 'geospatial_bounds'])
+
+    def test_from_paths(self):
+        path = resource_filename('compliance_checker',
+                                 'tests/data/bad_units.nc')
+        table = AttributeTable.from_paths([path])
+        ds = table.dataset(0)
+        self.assertIn('time', ds.variables)
+        self.assertEqual(ds.variables['time'].units,
+                         CheckSuite().load_dataset(path).variables['time'].units)
+
+    def test_run_attribute_checks(self):
+        table = AttributeTable.from_datasets(self.datasets)
+        for checker in (ACDD1_1Check(), ACDD1_3Check(), IOOS1_1Check()):
+            results = run_attribute_checks(checker, table)
+            for ds, ds_results in zip(self.datasets, results):
+                for check_name, method in attribute_checks(checker):
+                    expected = CheckSuite()._run_check(method, ds, None)
+                    self.assertEqual([result_key(r) for r in ds_results[check_name]],
+                                     [result_key(r) for r in expected])
+
+        results = run_attribute_checks(ACDD1_3Check(), table, ['check_high'])
+        self.assertEqual(list(results[0]), ['check_high'])
+
+    def test_batch_attribute_checks(self):
+        # a suite running the files in turn takes the attribute checks from
+        # the batch, with the same results as evaluating them file by file
+        paths = [resource_filename('compliance_checker', 'tests/data/' + name)
+                 for name in ('bad_units.nc', 'bad_region.nc',
+                              'bad_data_type.nc', 'no_such_file.nc')]
+
+        def run(batched):
+            cs = CheckSuite(limit=1)
+            cs.load_all_available_checkers()
+            if batched:
+                cs.batch_attribute_checks(paths)
+            runs = []
+            for path in paths[:-1]:
+                groups, errors = cs.run(cs.load_dataset(path), [],
+                                        'acdd:1.3', 'ioos:1.1')['acdd:1.3']
+                runs.append(([g.serialize() for g in groups], sorted(errors)))
+            return cs, runs
+
+        cs, batched = run(True)
+        self.assertEqual(batched, run(False)[1])
+        self.assertEqual(len(cs._batch.table), 3)
+        self.assertTrue(cs._batch._checkers)
+        # files which can't be opened are left to fail when checked
+        self.assertEqual(AttributeTable.from_paths(paths).unreadable, {3})
@@ -1043,3 +1043,46 @@ class TestCF(BaseTestCase):
         self.assertTrue(units_temporal('hours since 2000-01-01'))
         self.assertFalse(units_temporal('hours'))
         self.assertFalse(units_temporal('days since the big bang'))
+
+    def test_parse_cell_methods(self):
+        parsed = cfutil.parse_cell_methods('lat: lon: mean where land (interval: 1 hr) time: maximum')
+        self.assertTrue(parsed.well_formed)
+        self.assertEqual([m.names for m in parsed.methods], [('lat', 'lon'), ('time',)])
+        self.assertEqual([m.method for m in parsed.methods], ['mean', 'maximum'])
+        self.assertEqual(parsed.methods[0].where, 'land')
+        self.assertEqual(parsed.methods[0].paren_contents, 'interval: 1 hr')
+        self.assertFalse(cfutil.parse_cell_methods('mean').well_formed)
+        # identical attribute values share a single parse
+        self.assertIs(parsed, cfutil.parse_cell_methods('lat: lon: mean where land (interval: 1 hr) time: maximum'))
+
+        info = cfutil.parse_cell_methods_info('interval: 1 hr comment: sampled hourly')
+        self.assertTrue(info.well_formed)
+        self.assertEqual(info.items, (('interval:', '1 hr'), ('comment:', 'sampled hourly')))
+        self.assertEqual(cfutil.parse_cell_methods_info('just a comment').items, ())
+
+    def test_parse_attribute_grammars(self):
+        self.assertEqual(cfutil.parse_name_list(' lat  lon '), ('lat', 'lon'))
+        self.assertEqual(cfutil.parse_cell_measures('area: cell_area'),
+                         ('area', 'cell_area'))
+        self.assertIsNone(cfutil.parse_cell_measures('area:cell_area'))
+
+        parsed = cfutil.parse_formula_terms('sigma: lev ps: PS ptop: PTOP')
+        self.assertTrue(parsed.well_formed)
+        self.assertEqual(parsed.terms, (('sigma', 'lev'), ('ps', 'PS'), ('ptop', 'PTOP')))
+        self.assertFalse(cfutil.parse_formula_terms('sigma: lev  ps: PS').well_formed)
+
+    def test_lazy_setup(self):
+        # setup only records the dataset, the variable classifications are
+        # found, and cached even when empty, when first asked for
+        dataset = MockTimeSeries()
+        dataset.variables['time'].standard_name = 'time'
+        self.cf.setup(dataset)
+        self.assertNotIn(dataset, self.cf._coord_vars)
+        self.assertNotIn(dataset, self.cf._clim_vars)
+
+        self.assertEqual(self.cf._find_coord_vars(dataset), ['time'])
+        self.assertIn(dataset, self.cf._coord_vars)
+        self.assertEqual(self.cf._find_clim_vars(dataset), [])
+        self.assertIn(dataset, self.cf._clim_vars)
+        self.assertEqual(self.cf._std_names._version,
+                         self.cf._std_name_table._version)
@@ -0,0 +1,401 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+compliance_checker/tests/test_chunks.py
+'''
+import os
+import shutil
+import tempfile
+import unittest
+from collections import defaultdict
+
+import numpy as np
+from netCDF4 import Dataset
+
+from compliance_checker import chunks, inputs
+from compliance_checker.acdd import ACDD1_3Check
+from compliance_checker.cf.cf import CFBaseCheck
+from compliance_checker.suite import CheckSuite
+
+
+def write_flags_and_ranges(path, data_format):
+    with Dataset(path, 'w', format=data_format) as nc:
+        nc.createDimension('time', None)
+        nc.createDimension('depth', 3)
+        temp = nc.createVariable('temp', 'i2', ('time', 'depth'), fill_value=-1)
+        temp.valid_range = np.array([0, 100], dtype='i2')
+        temp.scale_factor = 0.5
+        qc = nc.createVariable('qc', 'i1', ('time',))
+        qc.flag_values = np.array([1, 2, 4], dtype='i1')
+        qc.flag_meanings = 'good suspect bad'
+        bits = nc.createVariable('bits', 'i4', ('time',))
+        bits.flag_masks = np.array([1, 2, 4], dtype='i4')
+        bits.flag_meanings = 'a b c'
+        for variable in nc.variables.values():
+            variable.set_auto_maskandscale(False)
+        temp[:] = np.array([[0, 50, 100], [101, -1, 99], [-5, 7, -1],
+                            [1, 2, 3]], dtype='i2')
+        qc[:] = [1, 2, 3, 4]
+        bits[:] = [0, 7, 8, 5]
+
+
+def write_ragged(path, counts, index, compressed):
+    with Dataset(path, 'w', format='NETCDF4') as nc:
+        nc.createDimension('station', 3)
+        nc.createDimension('obs', 10)
+        nc.createDimension('y', 4)
+        nc.createDimension('x', 5)
+        nc.createDimension('list', len(compressed))
+        row_size = nc.createVariable('row_size', 'i4', ('station',))
+        row_size.sample_dimension = 'obs'
+        row_size[:] = counts
+        station_index = nc.createVariable('station_index', 'i4', ('obs',))
+        station_index.instance_dimension = 'station'
+        station_index[:] = index
+        landpoint = nc.createVariable('list', 'i4', ('list',))
+        landpoint.compress = 'y x'
+        landpoint[:] = compressed
+
+
+def write_coordinates(path, time, bounds):
+    with Dataset(path, 'w', format='NETCDF3_CLASSIC') as nc:
+        nc.createDimension('time', len(time))
+        nc.createDimension('nv', 2)
+        nc.time_coverage_start = '2017-01-01T00:00:00Z'
+        nc.time_coverage_end = '2017-01-11T00:00:00Z'
+        var = nc.createVariable('time', 'i2', ('time',))
+        var.units = 'hours since 2017-01-01'
+        var.standard_name = 'time'
+        var.scale_factor = 2.
+        var.bounds = 'time_bnds'
+        var[:] = time
+        bnds = nc.createVariable('time_bnds', 'f8', ('time', 'nv'))
+        bnds[:] = bounds
+
+
+class TestChunks(unittest.TestCase):
+    '''
+    Test suite for streaming the raw values of variables in chunks
+    '''
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+
+    def open(self, data_format):
+        path = os.path.join(self.tmpdir, data_format + '.nc')
+        write_flags_and_ranges(path, data_format)
+        ds = Dataset(path)
+        self.addCleanup(ds.close)
+        return ds
+
+    def test_chunk_slices(self):
+        data = np.arange(5 * 6 * 7).reshape(5, 6, 7)
+        for max_bytes in (1, 7, 8, 41, 42, 100, 2000, 10000):
+            index = list(chunks.chunk_slices(data.shape, 1, max_bytes))
+            pieces = [data[i].ravel() for i in index]
+            # whole chunks in C order
+            np.testing.assert_array_equal(np.concatenate(pieces), data.ravel())
+            self.assertTrue(all(p.size <= max(max_bytes, 7) for p in pieces))
+        # rounded down to whole storage chunks
+        index = list(chunks.chunk_slices((100,), 1, 25, chunking=[10]))
+        self.assertEqual(index[:2], [(slice(0, 20),), (slice(20, 40),)])
+        self.assertEqual(list(chunks.chunk_slices((), 8)), [()])
+        self.assertEqual(list(chunks.chunk_slices((0, 4), 8)), [])
+
+    def test_storage_chunk_slices(self):
+        # one index per storage chunk, across every dimension
+        data = np.arange(10 * 9 * 8).reshape(10, 9, 8)
+        index = list(chunks.storage_chunk_slices(data.shape, [4, 3, 8]))
+        self.assertEqual(len(index), 3 * 3 * 1)
+        self.assertEqual(index[1], (slice(0, 4), slice(3, 6), slice(0, 8)))
+        self.assertEqual(index[-1], (slice(8, 10), slice(6, 9), slice(0, 8)))
+        self.assertEqual(sum(data[i].size for i in index), data.size)
+
+        path = os.path.join(self.tmpdir, 'tiled.nc')
+        with Dataset(path, 'w', format='NETCDF4') as nc:
+            nc.createDimension('t', 20)
+            nc.createDimension('y', 40)
+            nc.createDimension('x', 60)
+            nc.createVariable('v', 'f4', ('t', 'y', 'x'), chunksizes=(2, 10, 20))
+        with Dataset(path) as ds:
+            reader = chunks.RawReader(ds, sample=chunks.Sample(0.1))
+            sampled = reader.chunk_index('v')
+            self.assertEqual(len(sampled), 12)
+            self.assertTrue(all(i[0].stop - i[0].start == 2 and
+                                i[1].stop - i[1].start == 10 and
+                                i[2].stop - i[2].start == 20 for i in sampled))
+            self.assertEqual(reader.coverage['v'], (12 * 400, 20 * 40 * 60))
+
+    def check_counts(self, ds):
+        ranges, flags = inputs.value_violations(ds)
+        self.assertEqual(list(ranges), ['temp'])
+        # -1 is the fill value, and the valid range is of the packed values
+        self.assertEqual((ranges['temp'].invalid, ranges['temp'].count), (2, 10))
+        self.assertEqual(sorted(flags), ['bits', 'qc'])
+        self.assertEqual((flags['qc'].invalid, flags['qc'].count), (1, 4))
+        self.assertEqual((flags['bits'].invalid, flags['bits'].count), (1, 4))
+
+    def test_value_violations(self):
+        for data_format in ('NETCDF3_CLASSIC', 'NETCDF4'):
+            ds = self.open(data_format)
+            self.assertEqual(bool(inputs.get_input(ds, 'classic_views')),
+                             data_format == 'NETCDF3_CLASSIC')
+            self.check_counts(ds)
+            # the dataset itself is still masked and scaled
+            self.assertTrue(np.ma.is_masked(ds.variables['temp'][:]))
+            self.assertEqual(ds.variables['temp'][0, 1], 25.)
+
+    def test_byte_fill_value(self):
+        # the default fill value of bytes is masked like any other
+        path = os.path.join(self.tmpdir, 'bytes.nc')
+        with Dataset(path, 'w') as nc:
+            nc.createDimension('time', 3)
+            for name, dtype, fill in (('qc', 'i1', -127), ('uqc', 'u1', 255)):
+                qc = nc.createVariable(name, dtype, ('time',))
+                qc.flag_values = np.array([1, 2], dtype=dtype)
+                qc[:] = np.array([fill, 1, 2], dtype=dtype)
+        ds = Dataset(path)
+        self.addCleanup(ds.close)
+        _, flags = inputs.value_violations(ds)
+        for name in ('qc', 'uqc'):
+            self.assertEqual(ds.variables[name][:].count(), 2)
+            self.assertEqual((flags[name].invalid, flags[name].count), (0, 2))
+
+    def test_in_memory(self):
+        ds = Dataset('in-memory.nc', 'w', diskless=True)
+        self.addCleanup(ds.close)
+        nc = self.open('NETCDF4')
+        ds.createDimension('time', None)
+        qc = ds.createVariable('qc', 'i1', ('time',))
+        qc.flag_values = nc.variables['qc'].flag_values
+        qc[:] = [1, 2, 3, 4]
+        with chunks.RawReader(ds) as reader:
+            counter = chunks.FlagCounter([], qc.flag_values)
+            chunks.reduce_variables(reader, {'qc': [counter]}, max_bytes=1)
+        self.assertEqual(counter.invalid, 1)
+        self.assertTrue(qc.mask and qc.scale)
+
+    def test_opt_in(self):
+        ds = self.open('NETCDF4')
+        for cs, expected in ((CheckSuite(), []),
+                             (CheckSuite(check_data=True),
+                              ['check_data_cell_bounds', 'check_data_compression_indices',
+                               'check_data_coordinates_monotonic', 'check_data_flag_values',
+                               'check_data_ragged_arrays', 'check_data_valid_range']),
+                             (CheckSuite(only_checks=['check_data_flag_values']),
+                              ['check_data_flag_values'])):
+            checker = CFBaseCheck()
+            checks = cs._select_checks(checker, cs._get_checks(
+                checker, defaultdict(lambda: None)))
+            names = sorted(c.__func__.__name__ for c, _ in checks
+                           if getattr(c, '_cc_validates_data', False))
+            self.assertEqual(names, expected)
+
+        results = CFBaseCheck().check_data_valid_range(ds)
+        self.assertEqual(results[0].value, (0, 1))
+        self.assertIn('temp has 2 of 10 values outside of its valid range (0, 100)',
+                      results[0].msgs)
+        results = CFBaseCheck().check_data_flag_values(ds)
+        self.assertEqual(results[0].value, (0, 2))
+
+    def test_index_violations(self):
+        path = os.path.join(self.tmpdir, 'good.nc')
+        write_ragged(path, [3, 0, 7], [0, 0, 2, 1, 2, 2, 1, 0, 0, 2], [0, 7, 19])
+        with Dataset(path) as ds:
+            counts, indices = inputs.index_violations(ds)
+            self.assertEqual(counts['row_size'].total, 10)
+            self.assertEqual(sorted(indices), ['list', 'station_index'])
+            self.assertEqual(indices['list'].valid_max, 19)
+            for check in ('check_data_ragged_arrays', 'check_data_compression_indices'):
+                results = getattr(CFBaseCheck(), check)(ds)
+                self.assertTrue(results)
+                for result in results:
+                    self.assertEqual(result.value[0], result.value[1], result.msgs)
+
+        path = os.path.join(self.tmpdir, 'bad.nc')
+        write_ragged(path, [3, -1, 7], [0, 0, 3, 1, 2, 2, 1, -1, 0, 2], [0, 20, 19])
+        with Dataset(path) as ds:
+            results = CFBaseCheck().check_data_ragged_arrays(ds)
+            msgs = [msg for result in results for msg in result.msgs]
+            self.assertEqual(msgs, [
+                '1 of 3 values of count variable row_size are negative',
+                'The counts of count variable row_size add up to 9, not to '
+                'the length of its sample dimension obs (10)',
+                '2 of 10 values of index variable station_index are not '
+                'indices of its instance dimension station, between 0 and 2'])
+            results = CFBaseCheck().check_data_compression_indices(ds)
+            self.assertEqual(results[0].value, (0, 1))
+
+    def test_streamed(self):
+        # a trajectory index far larger than a chunk
+        path = os.path.join(self.tmpdir, 'trajectories.nc')
+        index = np.repeat(np.arange(100, dtype='i4'), 10000)
+        index[-1] = 100
+        with Dataset(path, 'w', format='NETCDF3_64BIT_OFFSET') as nc:
+            nc.createDimension('trajectory', 100)
+            nc.createDimension('obs', index.size)
+            traj = nc.createVariable('trajectory_index', 'i4', ('obs',))
+            traj.instance_dimension = 'trajectory'
+            traj[:] = index
+        with Dataset(path) as ds:
+            with chunks.RawReader(ds, inputs.get_input(ds, 'classic_views')) as reader:
+                counter = chunks.RangeCounter([], 0, 99)
+                sizes = []
+
+                class Sizes(object):
+                    def update(self, chunk):
+                        sizes.append(chunk.nbytes)
+                chunks.reduce_variables(reader, {'trajectory_index': [counter, Sizes()]},
+                                        max_bytes=2 ** 16)
+            self.assertEqual((counter.invalid, counter.count), (1, index.size))
+            self.assertEqual(max(sizes), 2 ** 16)
+            self.assertEqual(sum(sizes), index.nbytes)
+
+    def test_coordinate_values(self):
+        # the hours are packed as halves
+        time = np.arange(0, 241, 6.)
+        bounds = np.column_stack([time - 3, time + 3])
+        path = os.path.join(self.tmpdir, 'good.nc')
+        write_coordinates(path, time, bounds)
+        with Dataset(path) as ds:
+            with chunks.RawReader(ds) as reader:
+                pieces = list(reader.iter_aligned(('time', 'time_bnds'), max_bytes=80))
+            # 5 rows of the bounds at a time
+            self.assertEqual([len(p[0]) for p in pieces], [5] * 8 + [1])
+            np.testing.assert_array_equal(np.concatenate([p[1] for p in pieces]), bounds)
+
+            order, cells = inputs.coordinate_values(ds)
+            self.assertTrue(order['time'].monotonic)
+            self.assertEqual((order['time'].minimum, order['time'].maximum), (0, 120))
+            self.assertEqual((cells['time'].invalid, cells['time'].count), (0, 41))
+            for check in ('check_data_coordinates_monotonic', 'check_data_cell_bounds'):
+                results = getattr(CFBaseCheck(), check)(ds)
+                self.assertEqual(results[0].value, (1, 1))
+
+        # the steps across chunks are compared too
+        time[20], time[21] = time[21], time[20]
+        counter = chunks.MonotonicCounter([])
+        for chunk in np.array_split(time, 7):
+            counter.update(chunk)
+        self.assertEqual((counter.increasing, counter.decreasing), (39, 1))
+        self.assertFalse(counter.monotonic)
+        counter = chunks.MonotonicCounter([])
+        counter.update(np.array([3, 2, 1], dtype='u1'))
+        self.assertTrue(counter.monotonic)
+
+        path = os.path.join(self.tmpdir, 'bad.nc')
+        write_coordinates(path, time, bounds)
+        with Dataset(path) as ds:
+            msgs = CFBaseCheck().check_data_coordinates_monotonic(ds)[0].msgs
+            self.assertEqual(msgs, ['The values of coordinate variable time are not strictly '
+                                    'monotonic: of 40 steps, 39 increase and 1 decrease'])
+            results = CFBaseCheck().check_data_cell_bounds(ds)
+            self.assertEqual(results[0].msgs, ['2 of 41 values of time lie outside of their '
+                                               'cells in boundary variable time_bnds'])
+
+    def test_time_extents(self):
+        # the last time isn't the latest
+        time = np.arange(0, 241, 6.)
+        time[-2:] = time[-1:-3:-1]
+        path = os.path.join(self.tmpdir, 'time.nc')
+        write_coordinates(path, time, np.column_stack([time, time]))
+        with Dataset(path) as ds:
+            result = ACDD1_3Check().check_time_extents(ds)
+            self.assertEqual(result.value, (1, 2))
+            self.assertIn('(time[N])', result.msgs[0])
+
+            # validating data, the times streamed for the CF checks are
+            # used, whether or not those checks are selected or ran first
+            self.assertEqual(inputs.get_requirements(
+                ACDD1_3Check.check_time_extents, check_data=True),
+                ('time_variable', 'time_endpoints', 'coordinate_values'))
+            self.addCleanup(inputs.release, ds)
+            for names in ([], ['time_variable', 'time_endpoints', 'coordinate_values']):
+                inputs.prefetch(ds, names, check_data=True)
+                result = ACDD1_3Check().check_time_extents(ds)
+                self.assertEqual(result.value, (2, 2), result.msgs)
+
+            # otherwise only the endpoints are read
+            inputs.prefetch(ds, ['time_variable', 'time_endpoints', 'coordinate_values'])
+            self.assertEqual(ACDD1_3Check().check_time_extents(ds).value, (1, 2))
+
+    def test_sample(self):
+        sample = chunks.Sample(0.1)
+        selected = sample.select('temp', 100)
+        self.assertEqual(len(selected), 10)
+        self.assertEqual((selected[0], selected[-1]), (0, 99))
+        np.testing.assert_array_equal(selected, sample.select('temp', 100))
+        self.assertIsNone(chunks.Sample(100).select('temp', 100))
+        for size in (0, 0., 1.5, '0.1', True):
+            with self.assertRaises(ValueError):
+                chunks.Sample(size)
+
+        path = os.path.join(self.tmpdir, 'sampled.nc')
+        with Dataset(path, 'w', format='NETCDF4') as nc:
+            nc.createDimension('obs', 100000)
+            nc.geospatial_lat_min = -90.
+            nc.geospatial_lat_max = 90.
+            lat = nc.createVariable('lat', 'f4', ('obs',), chunksizes=(1000,))
+            lat.units = 'degrees_north'
+            lat.standard_name = 'latitude'
+            lat[:] = np.linspace(-90, 90, 100000)
+            qc = nc.createVariable('qc', 'i1', ('obs',), chunksizes=(1000,))
+            qc.flag_values = np.array([1, 2], dtype='i1')
+            qc.flag_meanings = 'good bad'
+            qc[:] = 1
+        with Dataset(path) as ds:
+            self.addCleanup(inputs.release, ds)
+            inputs.prefetch(ds, ['value_violations', 'latitude_candidates',
+                                 'latitude_extents'], sample=chunks.Sample(5))
+            _, flags = inputs.get_input(ds, 'value_violations')
+            self.assertEqual(flags['qc'].count, 5000)
+            results = CFBaseCheck().check_data_flag_values(ds)
+            self.assertEqual(results[0].value, (1, 1))
+            self.assertEqual(results[0].msgs, [
+                'qc: approximate, from a sample of 5000 of 100000 values, fewer than '
+                '0.06% of the values are invalid (95% confidence)'])
+
+            # the extremes lie in the first and last chunk
+            result = ACDD1_3Check().check_lat_extents(ds)
+            self.assertEqual(result.value, (2, 2))
+            self.assertIn('Extents of lat are approximate, from a sample of 5000 '
+                          'of 100000 values', result.msgs[0])
+
+    def test_memory_budget(self):
+        budget = chunks.MemoryBudget(2 ** 20)
+        # 4 workers of 1 MiB, a quarter each, of 8 + 24 bytes per value
+        self.assertEqual(budget.plan(np.float64, workers=4), 8 * (2 ** 18 // 32))
+        self.assertEqual(budget.plan(np.int8, workers=10 ** 9), 1)
+        self.assertEqual(budget.plan(np.int8), 2 ** 20 // 25)
+
+        path = os.path.join(self.tmpdir, 'grid.nc')
+        with Dataset(path, 'w', format='NETCDF4') as nc:
+            nc.createDimension('y', 400)
+            nc.createDimension('x', 500)
+            nc.geospatial_lat_min = -80.
+            nc.geospatial_lat_max = 80.
+            lat = nc.createVariable('lat', 'f8', ('y', 'x'), fill_value=-999.)
+            lat.units = 'degrees_north'
+            lat.standard_name = 'latitude'
+            values = np.tile(np.linspace(-80, 80, 400)[:, None], (1, 500))
+            values[0, 0] = -999.
+            values[1, 1] = np.nan
+            lat[:] = values
+            temp = nc.createVariable('temp', 'f4', ('y', 'x'))
+            temp.valid_range = np.array([0, 40], dtype='f4')
+            temp[:] = 20.
+
+        with Dataset(path) as ds:
+            budget = chunks.MemoryBudget(2 ** 16)
+            self.addCleanup(inputs.release, ds)
+            inputs.prefetch(ds, ['latitude_candidates', 'latitude_extents',
+                                 'value_violations'], budget=budget)
+            mins, maxs = inputs.get_input(ds, 'latitude_extents')
+            self.assertEqual((mins['lat'], maxs['lat']), (-80., 80.))
+            ranges, _ = inputs.get_input(ds, 'value_violations')
+            self.assertEqual(ranges['temp'].count, 400 * 500)
+            # well below the 1.6 MB of lat alone
+            self.assertTrue(0 < budget.peak <= budget.limit, budget.peak)
+            self.assertEqual(budget.in_use, 0)
+            self.assertEqual(ACDD1_3Check().check_lat_extents(ds).value, (2, 2))
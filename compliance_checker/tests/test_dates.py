@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+compliance_checker/tests/test_dates.py
+'''
+import unittest
+from datetime import datetime, timedelta
+
+import numpy as np
+from netCDF4 import num2date
+
+from compliance_checker import dates
+from compliance_checker.dates import timezone
+
+
+class TestDates(unittest.TestCase):
+    '''
+    Test suite for parsing ISO 8601 dates and CF time references
+    '''
+
+    def test_parse_iso(self):
+        self.assertEqual(dates.parse_iso('2017-09-19T23:06:17.5+05:30'),
+                         datetime(2017, 9, 19, 23, 6, 17, 500000,
+                                  timezone(timedelta(hours=5, minutes=30))))
+        # dates without a time zone are in UTC
+        self.assertEqual(dates.parse_iso('2017-09-19'),
+                         datetime(2017, 9, 19, tzinfo=timezone.utc))
+        # forms which aren't parsed here are handed to pendulum
+        self.assertIsNone(dates._parse_iso('20170919T230617Z'))
+        self.assertEqual(dates.parse_iso('20170919T230617Z'),
+                         datetime(2017, 9, 19, 23, 6, 17, tzinfo=timezone.utc))
+
+        for bad in ('2017-02-30', '21 Dec 2015 10:02 PM', 'P1D'):
+            with self.assertRaises(ValueError):
+                dates.parse_iso(bad)
+
+    def test_is_iso(self):
+        for good in ('2011-01-21T02:30:11Z', '2011-01-21T02:30:11,5-00:00',
+                     '2017-W38-2', '2017-262'):
+            self.assertTrue(dates.is_iso(good), good)
+        for bad in ('2011-01-21T24:00:00Z', '2017-13-01', '09192017T230617Z',
+                    '2011-01-21 02:30:11', None, '2017-01-01\n',
+                    '2011-01-21T02:30:11Z\n'):
+            self.assertFalse(dates.is_iso(bad), bad)
+
+    def test_time_reference(self):
+        self.assertEqual(dates.time_reference('hours since 1970-1-1 12:30:00 UTC'),
+                         (3600., datetime(1970, 1, 1, 12, 30)))
+        for units in ('weeks since 1970-01-01', 'days', 'days since whenever',
+                      'days since 1970-01-01 00:00:00 +05:00'):
+            self.assertIsNone(dates.time_reference(units), units)
+
+        self.assertTrue(dates.is_time_reference('days since 1970-01-01'))
+        # understood by udunits alone
+        self.assertTrue(dates.is_time_reference('weeks since 1970-01-01'))
+        self.assertFalse(dates.is_time_reference('days'))
+        self.assertFalse(dates.is_time_reference('not a unit'))
+
+    def test_decode_times(self):
+        values = np.array([0., 1.5, -3.25, 12345.678])
+        units = 'days since 1900-01-01 06:00'
+        expected = num2date(values, units, only_use_cftime_datetimes=False)
+        self.assertEqual(dates.decode_times(values, units).tolist(), list(expected))
+
+        for values, units, calendar in (
+                ([0.], 'days since 1500-01-01', 'standard'),
+                ([0.], 'days since 1970-01-01', '360_day'),
+                ([np.nan], 'days since 1970-01-01', 'standard'),
+                (np.ma.masked_array([0.], mask=[True]), 'days since 1970-01-01', 'standard')):
+            with self.assertRaises(ValueError):
+                dates.decode_times(values, units, calendar)
+
+        self.assertEqual(dates.num2datetime(36, 'hours since 2017-01-01'),
+                         datetime(2017, 1, 2, 12, tzinfo=timezone.utc))
+        # converted by netCDF4
+        self.assertEqual(dates.num2datetime(1, 'days since 2017-01-01 00:00:00 -06:00'),
+                         datetime(2017, 1, 2, 6, tzinfo=timezone.utc))
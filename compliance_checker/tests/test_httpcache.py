@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+compliance_checker/tests/test_httpcache.py
+'''
+import hashlib
+import shutil
+import tempfile
+import threading
+import unittest
+
+from compliance_checker.httpcache import HTTPCache
+from compliance_checker.suite import CheckSuite
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+
+DAS = '''Attributes {
+    time {
+        String units "days since 1970-01-01";
+    }
+    NC_GLOBAL {
+        String title "Cached";
+        String Conventions "CF-1.6, ACDD-1.3";
+    }
+}'''
+
+DDS = '''Dataset {
+    Float64 time[time = 4];
+} data;'''
+
+
+class ETagHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        body = self.server.bodies.get(self.path)
+        if body is None:
+            self.send_error(404)
+            return
+        etag = '"{}"'.format(hashlib.md5(body).hexdigest())
+        if self.headers.get('If-None-Match') == etag:
+            self.server.statuses.append(304)
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.server.statuses.append(200)
+        self.send_response(200)
+        self.send_header('XDODS-Server', 'dods/3.2')
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestHTTPCache(unittest.TestCase):
+    '''
+    Test suite for caching the metadata of remote datasets and the results of
+    checking them
+    '''
+
+    def setUp(self):
+        self.server = HTTPServer(('localhost', 0), ETagHandler)
+        self.server.bodies = {'/data.das': DAS.encode('utf-8'),
+                              '/data.dds': DDS.encode('utf-8')}
+        self.server.statuses = []
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = 'http://localhost:{}/data'.format(self.server.server_port)
+
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+
+    def test_revalidate(self):
+        first = HTTPCache(self.tmpdir).get(self.url + '.das')
+        cache = HTTPCache(self.tmpdir)
+        second = cache.get(self.url + '.das')
+        self.assertEqual(self.server.statuses, [200, 304])
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.text, first.text)
+        self.assertEqual(second.headers['xdods-server'], 'dods/3.2')
+        self.assertIsNotNone(cache.fingerprint([self.url + '.das']))
+
+        # responses which can't be revalidated aren't cached
+        self.assertEqual(cache.get(self.url + '.nothing').status_code, 404)
+        self.assertIsNone(cache.fingerprint([self.url + '.das',
+                                             self.url + '.nothing']))
+
+    def run_checks(self):
+        cs = CheckSuite(metadata_only=True, http_cache=HTTPCache(self.tmpdir))
+        cs.load_all_available_checkers()
+        ds = cs.load_dataset(self.url)
+        return cs, ds
+
+    def test_reuse_results(self):
+        cs, ds = self.run_checks()
+        results = cs.run_cached(ds, self.url, [], 'acdd:1.3')
+        self.assertEqual(self.server.statuses, [200, 200])
+
+        # unchanged metadata, the results are reused without running checks
+        cs, ds = self.run_checks()
+        self.assertEqual(self.server.statuses[2:], [304, 304])
+
+        def run(*args):
+            raise AssertionError("checks run again")
+        cs.run = run
+        reused = cs.run_cached(ds, self.url, [], 'acdd:1.3')
+        groups, errors = reused['acdd:1.3']
+        self.assertEqual(groups, results['acdd:1.3'][0])
+        self.assertEqual(cs.passtree(groups, 1),
+                         cs.passtree(results['acdd:1.3'][0], 1))
+        self.assertEqual(errors, {})
+
+        # other checks aren't answered from the cache
+        with self.assertRaises(AssertionError):
+            cs.run_cached(ds, self.url, [], 'acdd:1.1')
+
+        # nor are other versions of the checkers
+        checker = cs.checkers['acdd:1.3']
+        package = cs.checker_packages[checker]
+        self.addCleanup(cs.checker_packages.__setitem__, checker, package)
+        cs.checker_packages[checker] = 'another version'
+        with self.assertRaises(AssertionError):
+            cs.run_cached(ds, self.url, [], 'acdd:1.3')
+        cs.checker_packages[checker] = package
+
+        # changed metadata is checked again
+        self.server.bodies['/data.das'] = DAS.replace('Cached', 'Changed').encode('utf-8')
+        cs, ds = self.run_checks()
+        self.assertEqual(self.server.statuses[4:], [200, 304])
+        self.assertEqual(ds.title, 'Changed')
+        self.assertIn('acdd:1.3', cs.run_cached(ds, self.url, [], 'acdd:1.3'))
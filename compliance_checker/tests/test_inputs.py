@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+compliance_checker/tests/test_inputs.py
+'''
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from netCDF4 import Dataset
+from compliance_checker import inputs, remote
+from compliance_checker.protocols import opendap
+from compliance_checker.tests.helpers import MockTimeSeries
+
+
+calls = []
+
+
+@inputs.input_provider('_test_counted', reads_data=True)
+def _test_counted(ds):
+    calls.append('counted')
+    return ds.variables['time'][0]
+
+
+@inputs.input_provider('_test_metadata')
+def _test_metadata(ds):
+    calls.append('metadata')
+    return len(ds.variables)
+
+
+@inputs.input_provider('_test_remote', reads_data=True,
+                       reads=lambda ds: [('time', 0)])
+def _test_remote(ds):
+    calls.append('remote')
+    return inputs.read_data(ds, 'time', 0)
+
+
+class RemoteTimeSeries(MockTimeSeries):
+    '''
+    Mock time series as if opened from an OPeNDAP URL
+    '''
+
+    def filepath(self):
+        return 'http://localhost/data'
+
+
+class ListHandler(logging.Handler):
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+@inputs.input_provider('_test_broken')
+def _test_broken(ds):
+    calls.append('broken')
+    raise ValueError("broken input")
+
+
+class TestInputs(unittest.TestCase):
+    '''
+    Test suite for shared check inputs
+    '''
+
+    def setUp(self):
+        del calls[:]
+        self.ds = MockTimeSeries()
+        self.addCleanup(self.ds.close)
+        self.ds.variables['time'][:] = np.arange(500)
+        self.ds.variables['time'].units = 'seconds since 1970-01-01'
+        self.ds.variables['time'].standard_name = 'time'
+        self.ds.variables['lat'][:] = np.linspace(-10, 10, 500)
+        self.ds.variables['lat'].units = 'degrees_north'
+
+    def test_requires(self):
+        @inputs.requires('_test_counted', '_test_metadata')
+        def check_something(ds):
+            pass
+        self.assertEqual(inputs.get_requirements(check_something),
+                         ('_test_counted', '_test_metadata'))
+
+        with self.assertRaises(KeyError):
+            inputs.requires('no_such_input')
+
+    def test_prefetch_computes_once(self):
+        inputs.prefetch(self.ds, ['_test_counted', '_test_metadata',
+                                  '_test_counted'])
+        try:
+            # metadata inputs are computed before inputs reading data
+            self.assertEqual(calls, ['metadata', 'counted'])
+            self.assertEqual(inputs.get_input(self.ds, '_test_counted'), 0)
+            self.assertEqual(inputs.get_input(self.ds, '_test_metadata'), 4)
+            self.assertEqual(calls, ['metadata', 'counted'])
+        finally:
+            inputs.release(self.ds)
+
+        # without a cache, inputs are computed on every request
+        inputs.get_input(self.ds, '_test_metadata')
+        self.assertEqual(calls, ['metadata', 'counted', 'metadata'])
+
+    def test_prefetch_errors(self):
+        inputs.prefetch(self.ds, ['_test_broken'])
+        try:
+            for _ in range(2):
+                with self.assertRaises(ValueError):
+                    inputs.get_input(self.ds, '_test_broken')
+            self.assertEqual(calls, ['broken'])
+        finally:
+            inputs.release(self.ds)
+
+    def test_batch_read_errors(self):
+        ds = RemoteTimeSeries()
+        self.addCleanup(ds.close)
+        ds.variables['time'][:] = np.arange(500)
+        self.addCleanup(inputs.release, ds)
+        handler = ListHandler()
+        remote.logger.addHandler(handler)
+        self.addCleanup(remote.logger.removeHandler, handler)
+        self.addCleanup(setattr, remote, 'read_batched', remote.read_batched)
+
+        def failed_request(ds, reads):
+            raise opendap.DAPError("DAP data request failed with status 500")
+        remote.read_batched = failed_request
+        # the inputs read their data themselves, and the failure is logged
+        inputs.prefetch(ds, ['_test_remote'])
+        self.assertEqual(inputs.get_input(ds, '_test_remote'), 0)
+        self.assertEqual(len(handler.messages), 1)
+        self.assertIn('status 500', handler.messages[0])
+
+        def broken(ds, reads):
+            raise KeyError('time')
+        remote.read_batched = broken
+        # bugs aren't hidden
+        with self.assertRaises(KeyError):
+            inputs.prefetch(ds, ['_test_remote'])
+
+    def test_prefetch_unwanted(self):
+        # without the attributes the extents are compared with, the data
+        # isn't read ahead of time
+        names = ['latitude_candidates', 'latitude_extents', 'time_variable',
+                 'time_endpoints', 'z_variable', 'vertical_extents']
+        cache = inputs.prefetch(self.ds, names)
+        self.addCleanup(inputs.release, self.ds)
+        self.assertEqual(sorted(cache._values),
+                         ['latitude_candidates', 'time_variable', 'z_variable'])
+        # but still when a check asks for them
+        self.assertEqual(inputs.get_input(self.ds, 'time_endpoints'), (0, 499))
+        self.assertIsNone(inputs.get_input(self.ds, 'vertical_extents'))
+
+        self.ds.geospatial_lat_min = -10.
+        self.ds.geospatial_lat_max = 10.
+        cache = inputs.prefetch(self.ds, names)
+        self.assertIn('latitude_extents', cache._values)
+        self.assertNotIn('vertical_extents', cache._values)
+
+    def test_extents(self):
+        self.assertEqual(inputs.get_input(self.ds, 'time_variable'), 'time')
+        self.assertEqual(inputs.get_input(self.ds, 'latitude_candidates'),
+                         ['lat'])
+        obs_mins, obs_maxs = inputs.get_input(self.ds, 'latitude_extents')
+        self.assertEqual(obs_mins, {'lat': -10})
+        self.assertEqual(obs_maxs, {'lat': 10})
+        first, last = inputs.get_input(self.ds, 'time_endpoints')
+        self.assertEqual((first, last), (0, 499))
+
+    def test_mapped_extents(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        path = os.path.join(tmpdir, 'classic.nc')
+        with Dataset(path, 'w', format='NETCDF3_CLASSIC') as nc:
+            nc.createDimension('obs', 4)
+            for name, values, attrs in (
+                    ('lat', [np.nan, -5., 5., 0.], {'_FillValue': -999.}),
+                    ('lat_filled', [-999., -5., 5., 0.], {'_FillValue': -999.}),
+                    ('lat_valid', [-95., -5., 5., 0.], {'valid_min': -90.}),
+                    ('lat_scaled', [-5., 5., 0., 1.], {'scale_factor': 0.5})):
+                var = nc.createVariable(name, 'f8', ('obs',),
+                                        fill_value=attrs.pop('_FillValue', None))
+                var.setncatts(attrs)
+                var.set_auto_mask(False)
+                var[:] = values
+
+        ds = Dataset(path)
+        self.addCleanup(ds.close)
+        self.assertIn('lat', inputs.get_input(ds, 'classic_views'))
+        self.assertEqual(inputs._mapped_extents(ds, 'lat', ignore_nan=True),
+                         (-5, 5))
+        # values netCDF4 would mask or scale are read through netCDF4
+        for name in ('lat_filled', 'lat_valid', 'lat_scaled'):
+            self.assertIsNone(inputs._mapped_extents(ds, name, ignore_nan=True))
+        names = ['lat', 'lat_filled', 'lat_valid', 'lat_scaled']
+        obs_mins, obs_maxs = inputs._variable_extents(ds, names)
+        self.assertEqual(obs_mins, dict.fromkeys(names, -5))
+        self.assertEqual(obs_maxs, dict.fromkeys(names, 5))
@@ -5,9 +5,25 @@ compliance_checker/tests/test_protocols.py
 Unit tests that ensure the compliance checker can successfully identify protocol endpoints
 '''
 from unittest import TestCase
+from netCDF4 import Dataset
 from compliance_checker.suite import CheckSuite
+from compliance_checker.protocols import netcdf, opendap
+from compliance_checker.header import HeaderDataset
+from compliance_checker import remote
+from pkg_resources import resource_filename
 
+import numpy as np
+import os
 import pytest
+import shutil
+import struct
+import tempfile
+import threading
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
 
 
 @pytest.mark.integration
@@ -51,3 +67,394 @@ class TestProtocols(TestCase):
         cs = CheckSuite()
         ds = cs.load_dataset(url)
         assert ds is not None
+
+
+class TestClassicHeader(TestCase):
+    '''
+    Tests for reading classic format netCDF headers without the netCDF library
+    '''
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+
+    def write_dataset(self, file_format):
+        path = os.path.join(self.tmpdir, file_format + '.nc')
+        with Dataset(path, 'w', format=file_format) as nc:
+            nc.title = 'Header test'
+            nc.createDimension('time', None)
+            nc.createDimension('strlen', 4)
+            time = nc.createVariable('time', 'f8', ('time',))
+            time.units = 'seconds since 1970-01-01'
+            time.valid_range = np.array([0., 100.])
+            time[:] = np.arange(3)
+            label = nc.createVariable('label', 'S1', ('strlen',))
+            label.standard_name = 'region'
+        return path
+
+    def test_magic_numbers(self):
+        for file_format, version in (('NETCDF3_CLASSIC', 1),
+                                     ('NETCDF3_64BIT_OFFSET', 2),
+                                     ('NETCDF3_64BIT_DATA', 5)):
+            path = self.write_dataset(file_format)
+            with open(path, 'rb') as f:
+                self.assertTrue(netcdf.is_classic_netcdf(f.read(4)))
+            self.assertEqual(netcdf.read_classic_header(path).version,
+                             version)
+
+    def test_header_dataset(self):
+        for file_format in ('NETCDF3_CLASSIC', 'NETCDF3_64BIT_OFFSET',
+                            'NETCDF3_64BIT_DATA'):
+            path = self.write_dataset(file_format)
+            ds = HeaderDataset.from_classic(path)
+            with Dataset(path) as nc:
+                self.assertEqual(ds.ncattrs(), nc.ncattrs())
+                self.assertEqual(ds.title, nc.title)
+                self.assertEqual(list(ds.dimensions), list(nc.dimensions))
+                self.assertTrue(ds.dimensions['time'].isunlimited())
+                self.assertEqual(len(ds.dimensions['time']), 3)
+                for name, var in nc.variables.items():
+                    hvar = ds.variables[name]
+                    self.assertEqual(hvar.dimensions, var.dimensions)
+                    self.assertEqual(hvar.shape, var.shape)
+                    self.assertEqual(hvar.dtype, var.dtype)
+                    self.assertEqual(hvar.ncattrs(), var.ncattrs())
+                np.testing.assert_array_equal(ds.variables['time'].valid_range,
+                                              nc.variables['time'].valid_range)
+            self.assertEqual(
+                [v.name for v in ds.get_variables_by_attributes(standard_name='region')],
+                ['label'])
+
+    def test_map_classic_variables(self):
+        for file_format in ('NETCDF3_CLASSIC', 'NETCDF3_64BIT_OFFSET',
+                            'NETCDF3_64BIT_DATA'):
+            path = self.write_dataset(file_format)
+            with Dataset(path, 'a') as nc:
+                # a second record variable, so the records are interleaved
+                depth = nc.createVariable('depth', 'i2', ('time', 'strlen'))
+                depth[:] = np.arange(12).reshape(3, 4)
+            views = netcdf.map_classic_variables(path)
+            with Dataset(path) as nc:
+                nc.set_auto_mask(False)
+                for name, var in nc.variables.items():
+                    self.assertEqual(views[name].shape, var.shape)
+                    np.testing.assert_array_equal(views[name], var[:])
+                    # views of the file, not copies
+                    self.assertFalse(views[name].flags.owndata)
+                    self.assertFalse(views[name].flags.writeable)
+
+    def test_not_classic(self):
+        path = os.path.join(self.tmpdir, 'hdf5.nc')
+        Dataset(path, 'w', format='NETCDF4').close()
+        with self.assertRaises(netcdf.ClassicHeaderError):
+            netcdf.read_classic_header(path)
+
+        # metadata-only loading falls back to the netCDF library
+        cs = CheckSuite(metadata_only=True)
+        ds = cs.load_dataset(path)
+        self.assertNotIsInstance(ds, HeaderDataset)
+        ds.close()
+
+    def test_same_results(self):
+        # the metadata checks return the same results whether a classic file
+        # is read through its header alone or with the netCDF library
+        paths = [self.write_dataset('NETCDF3_64BIT_DATA')] + [
+            resource_filename('compliance_checker', 'tests/data/' + name)
+            for name in ('bad_units.nc', 'bad_region.nc', 'bad_cf_role.nc',
+                         'bad-trajectory.nc')]
+        cs = CheckSuite(metadata_only=True)
+        cs.load_all_available_checkers()
+        checkers = ('cf', 'acdd', 'ioos')
+
+        def results(ds):
+            return dict((name, ([g.serialize() for g in groups], sorted(errors)))
+                        for name, (groups, errors)
+                        in cs.run(ds, [], *checkers).items())
+
+        for path in paths:
+            header = results(HeaderDataset.from_classic(path))
+            with Dataset(path) as nc:
+                self.assertEqual(header, results(nc), path)
+            self.assertEqual(sorted(header), ['acdd', 'cf', 'ioos'])
+
+
+def dods_body(dds, arrays):
+    '''
+    Encodes a DAP2 data response the way a server sends it
+    '''
+    body = dds.encode('utf-8') + b'\nData:\n'
+    for values, wire in arrays:
+        values = np.asarray(values)
+        if values.ndim:
+            body += struct.pack('>II', values.size, values.size)
+        body += values.astype(wire).tobytes()
+        if wire == 'u1':
+            body += b'\0' * (-values.size % 4)
+    return body
+
+
+class DODSHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        body = self.server.bodies.get(self.path)
+        if body is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('XDODS-Server', 'dods/3.2')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class RemoteDataset(object):
+    '''
+    The variables of a local dataset, as if opened from a URL
+    '''
+
+    def __init__(self, url, nc):
+        self.url = url
+        self.variables = nc.variables
+
+    def filepath(self):
+        return self.url
+
+
+class DAPServerCase(TestCase):
+    '''
+    Serves canned DAP2 responses from a local HTTP server
+    '''
+
+    def setUp(self):
+        self.server = HTTPServer(('localhost', 0), DODSHandler)
+        self.server.bodies = {}
+        self.server.requests = []
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = 'http://localhost:{}/data'.format(self.server.server_port)
+
+
+class TestOPeNDAPReads(DAPServerCase):
+    '''
+    Tests for batching reads of variable data into DAP2 data requests
+    '''
+
+    def setUp(self):
+        super(TestOPeNDAPReads, self).setUp()
+        self.nc = Dataset('remote.nc', 'w', diskless=True)
+        self.addCleanup(self.nc.close)
+        self.nc.createDimension('time', 10)
+        self.nc.createDimension('lat', 3)
+        time = self.nc.createVariable('time', 'f8', ('time',))
+        time[:] = np.arange(10)
+        lat = self.nc.createVariable('lat', 'i2', ('lat',), fill_value=-1)
+        lat.scale_factor = 0.5
+        lat[:] = [10, 20, 30]
+        self.nc.createVariable('name', str, ('lat',))
+
+    def test_constraint_expression(self):
+        self.assertEqual(opendap.constraint_expression([
+            ('lat', None), ('time', [(0, 9, 9)]),
+            ('sst', [(0, 1, 0), (2, 2, 10)])]),
+            'lat,time%5B0%3A9%3A9%5D,sst%5B0%3A1%3A0%5D%5B2%3A2%3A10%5D')
+
+    def test_parse_dods(self):
+        dds = ('''Dataset {
+    Int16 lat[lat = 3];
+    Byte flags[flags = 5];
+    Float64 depth;
+    Grid {
+     ARRAY:
+        Float32 sst[time = 2][lat = 3];
+     MAPS:
+        Float64 time[time = 2];
+        Int16 lat[lat = 3];
+    } sst;
+} data;''')
+        content = dods_body(dds, [([20, 40, -1], '>i4'),
+                                  ([1, 2, 3, 4, 255], 'u1'),
+                                  (5.0, '>f8'),
+                                  (np.arange(6).reshape(2, 3), '>f4'),
+                                  ([0, 1], '>f8'),
+                                  ([20, 40, -1], '>i4')])
+        values = opendap.parse_dods(content)
+        self.assertEqual(list(values), ['lat', 'flags', 'depth', 'sst',
+                                        'sst.time', 'sst.lat'])
+        np.testing.assert_array_equal(values['lat'], [20, 40, -1])
+        np.testing.assert_array_equal(values['flags'], [1, 2, 3, 4, 255])
+        self.assertEqual(values['depth'].shape, ())
+        self.assertEqual(values['depth'], 5.0)
+        np.testing.assert_array_equal(values['sst'], np.arange(6).reshape(2, 3))
+        np.testing.assert_array_equal(values['sst.lat'], [20, 40, -1])
+
+        with self.assertRaises(opendap.DAPError):
+            opendap.parse_dods(content[:-4])
+        with self.assertRaises(opendap.DAPError):
+            opendap.parse_dods(b'Error {\n    code = 1005;\n};')
+
+    def test_plan_reads(self):
+        batches, located = remote.plan_reads(self.nc, [
+            ('lat', Ellipsis), ('time', 0), ('time', -1), ('lat', 1),
+            ('name', Ellipsis), ('missing', Ellipsis)])
+        # the first and last times are read with one hyperslab, strings
+        # and missing variables are left to netCDF4
+        self.assertEqual(batches, [{'lat': None, 'time': (0, 9, 9)}])
+        self.assertEqual(located[('time', -1)], ('time', (0, 9, 9), 1))
+        self.assertEqual(located[('lat', 1)], ('lat', None, None))
+        self.assertNotIn(('name', Ellipsis), located)
+
+        # unevenly spaced reads of a variable need another request
+        batches, located = remote.plan_reads(self.nc, [
+            ('time', 0), ('time', 1), ('time', 5)])
+        self.assertEqual(batches, [{'time': (0, 1, 1)}, {'time': (5, 1, 5)}])
+
+    def test_hyperslabs(self):
+        self.assertEqual(remote.hyperslabs((10, 3), Ellipsis),
+                         ([(0, 1, 9), (0, 1, 2)], (slice(None), slice(None))))
+        self.assertEqual(remote.hyperslabs((10, 3), (slice(2, None, 3), -1)),
+                         ([(2, 3, 8), (2, 1, 2)], (slice(None), 0)))
+        self.assertEqual(remote.hyperslabs((10, 3), (Ellipsis, 1)),
+                         ([(0, 1, 9), (1, 1, 1)], (slice(None), 0)))
+        self.assertEqual(remote.hyperslabs((), Ellipsis), ([], ()))
+        # read through netCDF4 instead
+        for index in ([1, 2], slice(None, None, -1), slice(5, 5), 10,
+                      (0, 0, 0)):
+            self.assertIsNone(remote.hyperslabs((10, 3), index), index)
+
+    def test_safecast(self):
+        nc = Dataset('safecast.nc', 'w', diskless=True)
+        self.addCleanup(nc.close)
+        nc.createDimension('x', 2)
+        var = nc.createVariable('var', 'f4', ('x',))
+        var.nan = np.nan
+        var.inexact = 0.1
+        var.text = '-999'
+        var.pair = np.array([1, 2], dtype='i4')
+        np.testing.assert_array_equal(remote._safecast(var, 'nan'), [np.nan])
+        np.testing.assert_array_equal(remote._safecast(var, 'pair'), [1., 2.])
+        for name in ('inexact', 'text', 'absent'):
+            self.assertIsNone(remote._safecast(var, name), name)
+
+    def test_read_batched(self):
+        dds = '''Dataset {
+    Int16 lat[lat = 3];
+    Float64 time[time = 2];
+} data;'''
+        path = '/data.dods?lat,time%5B0%3A9%3A9%5D'
+        self.server.bodies[path] = dods_body(dds, [([10, 20, -1], '>i4'),
+                                                   ([0., 9.], '>f8')])
+        ds = RemoteDataset(self.url, self.nc)
+        self.assertTrue(remote.is_remote(ds))
+        values = remote.read_batched(ds, [('lat', Ellipsis), ('time', 0),
+                                          ('time', -1)])
+        self.assertEqual(self.server.requests, [path])
+        # masked and scaled as netCDF4 would
+        np.testing.assert_array_equal(values[('lat', Ellipsis)],
+                                      np.ma.masked_array([5., 10., 0.],
+                                                         mask=[0, 0, 1]))
+        self.assertEqual(values[('lat', Ellipsis)].mask.tolist(),
+                         [False, False, True])
+        self.assertEqual(values[('time', 0)], self.nc.variables['time'][0])
+        self.assertEqual(values[('time', -1)], self.nc.variables['time'][-1])
+
+        # failed requests leave the reads to netCDF4
+        self.assertEqual(remote.read_batched(ds, [('time', 3)]), {})
+
+
+class TestOPeNDAPMetadata(DAPServerCase):
+    '''
+    Tests for building header-only datasets from the DAS and DDS of OPeNDAP
+    datasets
+    '''
+
+    das = '''Attributes {
+    time {
+        String units "days since 1970-01-01";
+        String standard_name "time";
+    }
+    lat {
+        String units "degrees_north";
+        Float32 valid_range -90.0, 90.0;
+    }
+    sst {
+        Int16 _FillValue -32768;
+        Float32 scale_factor 0.01;
+        String long_name "sea surface \\"skin\\" temperature";
+        String flag_meanings "a", "b";
+    }
+    station {
+    }
+    NC_GLOBAL {
+        String title "DAP test";
+        String Conventions "CF-1.6, ACDD-1.3";
+        Float64 geospatial_lat_min -10.5;
+    }
+    DODS_EXTRA {
+        String Unlimited_Dimension "time";
+    }
+}'''
+
+    dds = '''Dataset {
+    Float64 time[time = 4];
+    Float32 lat[lat = 3];
+    Grid {
+     ARRAY:
+        Int16 sst[time = 4][lat = 3];
+     MAPS:
+        Float64 time[time = 4];
+        Float32 lat[lat = 3];
+    } sst;
+    String station;
+} data;'''
+
+    def test_parse_das(self):
+        containers = opendap.parse_das(self.das)
+        sst = containers['sst']
+        self.assertEqual(sst['_FillValue'], -32768)
+        self.assertEqual(sst['_FillValue'].dtype, np.int16)
+        self.assertEqual(sst['scale_factor'].dtype, np.float32)
+        self.assertEqual(sst['long_name'], 'sea surface "skin" temperature')
+        self.assertEqual(sst['flag_meanings'], 'a\nb')
+        np.testing.assert_array_equal(containers['lat']['valid_range'],
+                                      [-90, 90])
+        self.assertEqual(containers['NC_GLOBAL']['geospatial_lat_min'], -10.5)
+        with self.assertRaises(opendap.DAPError):
+            opendap.parse_das('Attributes { sst { Int16 _FillValue x; } }')
+
+    def test_load_dataset(self):
+        self.server.bodies['/data.das'] = self.das.encode('utf-8')
+        self.server.bodies['/data.dds'] = self.dds.encode('utf-8')
+        cs = CheckSuite(metadata_only=True)
+        ds = cs.load_dataset(self.url)
+        self.assertIsInstance(ds, HeaderDataset)
+        # the DAS fetched to detect the service is used
+        self.assertEqual(self.server.requests, ['/data.das', '/data.dds'])
+
+        self.assertEqual(ds.filepath(), self.url)
+        self.assertEqual(ds.title, 'DAP test')
+        self.assertEqual(list(ds.dimensions),
+                         ['time', 'lat', 'maxStrlen64'])
+        self.assertTrue(ds.dimensions['time'].isunlimited())
+        self.assertEqual(list(ds.variables), ['time', 'lat', 'sst', 'station'])
+        sst = ds.variables['sst']
+        self.assertEqual(sst.dimensions, ('time', 'lat'))
+        self.assertEqual(sst.shape, (4, 3))
+        self.assertEqual(sst.dtype, np.int16)
+        self.assertEqual(sst._FillValue, -32768)
+        self.assertEqual(ds.variables['station'].dimensions, ('maxStrlen64',))
+        self.assertEqual(ds.variables['station'].ncattrs(), [])
+        self.assertEqual(
+            [v.name for v in ds.get_variables_by_attributes(standard_name='time')],
+            ['time'])
+
+        # header checks need nothing more from the server
+        cs.load_all_available_checkers()
+        cs.run(ds, [], 'acdd')
+        self.assertEqual(len(self.server.requests), 2)
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+compliance_checker/tests/test_server.py
+'''
+import io
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+
+import six
+from pkg_resources import resource_filename
+
+from compliance_checker import client, server
+from compliance_checker.runner import ComplianceChecker
+
+
+class TestServer(unittest.TestCase):
+    '''
+    Test suite for the checker daemon and its client
+    '''
+
+    def setUp(self):
+        self.server = server.make_server(('localhost', 0))
+        self.address = self.server.server_address[:2]
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.dataset = resource_filename('compliance_checker',
+                                         'tests/data/bad_units.nc')
+
+    def read(self, name):
+        with io.open(os.path.join(self.tmpdir, name), encoding='utf-8') as f:
+            return f.read()
+
+    def test_status(self):
+        status = client.daemon_status(self.address)
+        self.assertIn('cf', status['checkers'])
+
+        # nothing listening
+        sock = socket.socket()
+        sock.bind(('localhost', 0))
+        port = sock.getsockname()[1]
+        sock.close()
+        self.assertIsNone(client.daemon_status(('localhost', port)))
+
+    def test_forward_to_daemon(self):
+        local = ComplianceChecker.run_checker(
+            self.dataset, ['cf'], 0, 'normal',
+            output_filename=os.path.join(self.tmpdir, 'local.json'),
+            output_format='json')
+        # relative paths are resolved against the client's directory
+        cwd = os.getcwd()
+        os.chdir(self.tmpdir)
+        try:
+            remote = client.forward_to_daemon(
+                self.address, self.dataset, ['cf'], 0, 'normal',
+                output_filename='remote.json', output_format='json',
+                token=self.server.token)
+        finally:
+            os.chdir(cwd)
+
+        self.assertEqual(local, remote)
+        self.assertEqual(self.read('local.json'), self.read('remote.json'))
+
+    def test_error(self):
+        with self.assertRaises(client.DaemonError):
+            client.forward_to_daemon(self.address, self.dataset,
+                                     ['no_such_checker'], 0, 'normal',
+                                     token=self.server.token)
+
+    def test_token(self):
+        with six.assertRaisesRegex(self, client.DaemonError, 'token'):
+            client.forward_to_daemon(self.address, self.dataset, ['cf'], 0,
+                                     'normal', token='not the token')
+
+    def test_paths(self):
+        with six.assertRaisesRegex(self, ValueError, 'working directory'):
+            server.run_check_request({'ds_loc': self.dataset},
+                                     cwd='relative/path')
+        missing = os.path.join(self.tmpdir, 'missing', 'out.json')
+        with six.assertRaisesRegex(self, ValueError, 'output file'):
+            server.run_check_request({'ds_loc': self.dataset,
+                                      'output_filename': missing},
+                                     cwd=self.tmpdir)
+
+    def test_loopback(self):
+        self.assertTrue(server.is_loopback('localhost'))
+        self.assertTrue(server.is_loopback('127.0.0.1'))
+        self.assertFalse(server.is_loopback(''))
+        self.assertFalse(server.is_loopback('0.0.0.0'))
+        with self.assertRaises(ValueError):
+            server.make_server(('0.0.0.0', 0))
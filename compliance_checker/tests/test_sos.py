@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+compliance_checker/tests/test_sos.py
+'''
+import threading
+import time
+import unittest
+
+from lxml import etree
+from owslib.swe.observation.sos100 import SensorObservationService_1_0_0
+from owslib.swe.sensor.sml import SensorML
+from pkg_resources import resource_filename
+
+from compliance_checker import sos
+from compliance_checker.base import BaseCheck, BaseSOSGCCheck, check_has
+from compliance_checker.ioos import IOOSSOSDSCheck, IOOSSOSGCCheck
+from compliance_checker.runner import ComplianceChecker
+from compliance_checker.suite import CheckSuite
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+
+class RelativeXPathCheck(BaseSOSGCCheck, BaseCheck):
+
+    @check_has(BaseCheck.HIGH)
+    def check_relative(self, ds):
+        return [('anything', etree.XPath('//title'))]
+
+
+class SOSHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        if 'request=DescribeSensor' in self.path:
+            if 'procedure=urn%3Aioos%3Amissing' in self.path:
+                self.send_error(404)
+                return
+            body = self.server.describesensor
+        else:
+            body = self.server.getcapabilities
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/xml')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def read_mock(name):
+    path = resource_filename('compliance_checker',
+                             'tests/data/http_mocks/' + name)
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+class TestSOSDocuments(unittest.TestCase):
+    '''
+    Test suite for parsing pruned SOS documents
+    '''
+
+    def test_element_paths(self):
+        keep, whole = sos.element_paths([
+            "/sml:SensorML/sml:member[@xlink:role='http://a/b']/sml:name",
+            "/sml:SensorML/sml:member/@gml:id",
+            "/sml:SensorML/sml:capabilities[swe:field]/swe:value",
+        ])
+        self.assertEqual(keep, {('SensorML',), ('SensorML', 'member'),
+                                ('SensorML', 'member', 'name'),
+                                ('SensorML', 'capabilities')})
+        self.assertEqual(whole, {('SensorML', 'member', 'name'),
+                                 ('SensorML', 'member'),
+                                 ('SensorML', 'capabilities')})
+
+        for xpath in ('//sml:name', 'sml:member', '/sml:SensorML/*',
+                      '/sml:SensorML/descendant::sml:name'):
+            self.assertIsNone(sos.element_paths([xpath]))
+
+    def test_parse_document(self):
+        cs = CheckSuite()
+        cs.load_all_available_checkers()
+        for name, checker in (('ncsos_getcapabilities.xml', IOOSSOSGCCheck),
+                              ('ncsos_describesensor.xml', IOOSSOSDSCheck)):
+            doc = read_mock(name)
+            full = etree.fromstring(doc)
+            ds = cs.process_doc(doc)
+            self.assertIn(type(ds), checker.supported_ds)
+            # elements no check looks at are pruned
+            self.assertLess(len(list(ds._root.iter())), len(list(full.iter())))
+
+            xpaths = sos.checker_xpaths([checker])
+            self.assertTrue(xpaths)
+            for xpath in xpaths:
+                xpath = etree.XPath(xpath, namespaces=checker.ns)
+                self.assertEqual(len(xpath(ds._root)), len(xpath(full)))
+
+        with self.assertRaises(ValueError):
+            sos.parse_document(b'<html><title>Not SOS</title></html>')
+
+    def test_unprunable(self):
+        xpaths = sos.checker_xpaths([RelativeXPathCheck])
+        self.assertEqual(xpaths, ['//title'])
+        self.assertIsNone(sos.element_paths(xpaths))
+        doc = read_mock('ncsos_getcapabilities.xml')
+        ds = sos.parse_document(doc)
+        self.assertEqual(len(list(ds._root.iter())),
+                         len(list(etree.fromstring(doc).iter())))
+
+        # checks which can't be pruned to get the owslib objects, as
+        # before documents were pruned
+        cs = CheckSuite()
+        cs.checkers = {'relative': RelativeXPathCheck}
+        ds = cs.process_doc(doc)
+        self.assertIsInstance(ds, SensorObservationService_1_0_0)
+        self.assertEqual(ds._root.tag, sos.CAPABILITIES_TAG)
+        self.assertEqual(len(list(ds._root.iter())),
+                         len(list(etree.fromstring(doc).iter())))
+        ds = cs.process_doc(read_mock('ncsos_describesensor.xml'))
+        self.assertIsInstance(ds, SensorML)
+        self.assertEqual(ds._root.tag, sos.SENSORML_TAG)
+
+
+class TestSOSCrawl(unittest.TestCase):
+    '''
+    Test suite for crawling the DescribeSensor documents of an SOS service
+    '''
+
+    def setUp(self):
+        self.server = HTTPServer(('localhost', 0), SOSHandler)
+        self.server.requests = []
+        endpoint = 'http://localhost:{}/sos?'.format(self.server.server_port)
+        self.server.getcapabilities = read_mock('ncsos_getcapabilities.xml').replace(
+            b'http://data.oceansmap.com/thredds/sos/caricoos_ag/VIA/VIA.ncml?',
+            endpoint.encode('utf-8'))
+        self.server.describesensor = read_mock('ncsos_describesensor.xml')
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = endpoint + 'service=SOS&request=GetCapabilities'
+
+    def test_describe_sensor_urls(self):
+        ds = sos.parse_document(self.server.getcapabilities)
+        urls = sos.describe_sensor_urls(ds, self.url)
+        self.assertEqual(list(urls), ['urn:ioos:network:ncsos:all',
+                                      'urn:ioos:station:ncsos:VIA'])
+        self.assertTrue(urls['urn:ioos:station:ncsos:VIA'].startswith(
+            'http://localhost:{}/sos?service=SOS&version=1.0.0&request=DescribeSensor&'
+            'procedure=urn%3Aioos%3Astation%3Ancsos%3AVIA'.format(self.server.server_port)))
+
+    def test_crawl(self):
+        cs = CheckSuite()
+        cs.load_all_available_checkers()
+        loaded = list(cs.crawl_sos(self.url, 2))
+        self.assertEqual(loaded[0][0], self.url)
+        self.assertIsInstance(loaded[0][1], sos.CapabilitiesDocument)
+        self.assertEqual(len(loaded), 3)
+        for location, ds in loaded[1:]:
+            self.assertIn('request=DescribeSensor', location)
+            self.assertIsInstance(ds, sos.SensorMLDocument)
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_crawl_failures(self):
+        self.server.getcapabilities = self.server.getcapabilities.replace(
+            b'urn:ioos:network:ncsos:all', b'urn:ioos:missing')
+        cs = CheckSuite()
+        cs.load_all_available_checkers()
+        loaded = list(cs.crawl_sos(self.url, 2))
+        # the missing procedure is skipped
+        self.assertEqual(len(loaded), 2)
+        self.assertIsInstance(loaded[1][1], sos.SensorMLDocument)
+
+    def test_fetch_bounded(self):
+        # only max_workers requests are made at once, and closing the
+        # generator early leaves the rest unrequested
+        class Session(object):
+            def __init__(self):
+                self.lock = threading.Lock()
+                self.running = self.most = self.made = 0
+
+            def get(self, url, **kwargs):
+                with self.lock:
+                    self.made += 1
+                    self.running += 1
+                    self.most = max(self.most, self.running)
+                time.sleep(0.01)
+                with self.lock:
+                    self.running -= 1
+                return url
+
+        session = Session()
+        urls = dict((i, 'url{}'.format(i)) for i in range(20))
+        fetched = sos.fetch_concurrently(urls, 3, session)
+        self.assertEqual(len([next(fetched) for _ in range(2)]), 2)
+        fetched.close()
+        self.assertLessEqual(session.most, 3)
+        self.assertLessEqual(session.made, 5)
+
+        session = Session()
+        fetched = list(sos.fetch_concurrently(urls, 3, session))
+        self.assertEqual(sorted(key for key, _, _ in fetched), list(range(20)))
+        self.assertLessEqual(session.most, 3)
+
+    def test_run_checker(self):
+        ComplianceChecker.run_checker(self.url, ['ioos_sos'], 0, 'strict',
+                                      output_filename='-', crawl_sos=2)
+        self.assertEqual(len(self.server.requests), 3)
@@ -1,9 +1,16 @@
 # coding=utf-8
 from pkg_resources import resource_filename
 from compliance_checker.suite import CheckSuite
-from compliance_checker.base import Result, BaseCheck, GenericFile
+from compliance_checker.base import (Result, BaseCheck, GenericFile,
+                                     io_bound, max_priority, thread_unsafe)
+from compliance_checker.tests.helpers import OPeNDAPServer
+from netCDF4 import Dataset
 import numpy as np
+import shutil
+import tempfile
+import threading
 import unittest
+import time
 import os
 
 static_files = {
@@ -17,6 +24,140 @@ static_files = {
 }
 
 
+class ConcurrentCheck(BaseCheck):
+    """
+    Minimal checker used to exercise concurrent check scheduling
+    """
+    _cc_spec = 'concurrent'
+    _cc_spec_version = '1.0'
+    supported_ds = [GenericFile]
+
+    @io_bound
+    def check_a_slow_read(self, ds):
+        time.sleep(0.05)
+        return Result(BaseCheck.HIGH, True, 'slow read')
+
+    @io_bound
+    def check_b_failed_read(self, ds):
+        raise IOError("remote read failed")
+
+    def check_c_attributes(self, ds):
+        return [Result(BaseCheck.MEDIUM, False, 'attrs', ['missing'])]
+
+    @thread_unsafe
+    def check_d_stateful(self, ds):
+        return Result(BaseCheck.LOW, (1, 2), 'stateful')
+
+
+class OverlapCheck(BaseCheck):
+    """
+    Checker recording the most checks which ever ran at once
+    """
+    _cc_spec = 'overlap'
+    _cc_spec_version = '1.0'
+    supported_ds = [Dataset, GenericFile]
+
+    def __init__(self):
+        self.running = 0
+        self.most = 0
+        self.lock = threading.Lock()
+
+    def read(self):
+        with self.lock:
+            self.running += 1
+            self.most = max(self.most, self.running)
+        time.sleep(0.02)
+        with self.lock:
+            self.running -= 1
+        return Result(BaseCheck.HIGH, True, 'read')
+
+    @io_bound
+    def check_a(self, ds):
+        return self.read()
+
+    @io_bound
+    def check_b(self, ds):
+        return self.read()
+
+    @io_bound
+    def check_c(self, ds):
+        return self.read()
+
+
+class ReadingCheck(BaseCheck):
+    """
+    Checker reading all of the temperatures in each of its checks
+    """
+    _cc_spec = 'reading'
+    _cc_spec_version = '1.0'
+    supported_ds = [Dataset]
+
+    def read(self, ds):
+        values = ds.variables['temp'][:]
+        return Result(BaseCheck.HIGH, bool(values.count() == values.size),
+                      'temperatures')
+
+    @io_bound
+    def check_a(self, ds):
+        return self.read(ds)
+
+    @io_bound
+    def check_b(self, ds):
+        return self.read(ds)
+
+    @io_bound
+    def check_c(self, ds):
+        return self.read(ds)
+
+
+class SectionedCheck(BaseCheck):
+    """
+    Minimal checker numbering its checks by section
+    """
+    _cc_spec = 'sectioned'
+    _cc_spec_version = '1.0'
+    _cc_check_sections = {
+        'check_a': '2.1',
+        'check_b': '2.2.1',
+        'check_c': '3',
+    }
+    supported_ds = [GenericFile]
+
+    def check_a(self, ds):
+        return Result(BaseCheck.HIGH, True, 'a')
+
+    def check_b(self, ds):
+        return Result(BaseCheck.HIGH, True, 'b')
+
+    def check_c(self, ds):
+        return Result(BaseCheck.HIGH, True, 'c')
+
+
+class PriorityCheck(BaseCheck):
+    """
+    Minimal checker with a low priority check and a mixed priority check
+    """
+    _cc_spec = 'priority'
+    _cc_spec_version = '1.0'
+    supported_ds = [GenericFile]
+
+    def __init__(self):
+        self.ran = []
+
+    @max_priority(BaseCheck.LOW)
+    def check_low(self, ds):
+        self.ran.append('check_low')
+        return Result(BaseCheck.LOW, False, 'low')
+
+    def check_mixed(self, ds):
+        ret_val = [Result(BaseCheck.HIGH, True, 'high')]
+        if self.keeps(BaseCheck.MEDIUM):
+            ret_val.append(Result(BaseCheck.MEDIUM, True, 'medium'))
+        # not checking keeps() is fine, the result is discarded
+        ret_val.append(Result(BaseCheck.LOW, False, 'unguarded'))
+        return ret_val
+
+
 class TestSuite(unittest.TestCase):
     # @see
     # http://www.saltycrane.com/blog/2012/07/how-prevent-nose-unittest-using-docstring-when-verbosity-2/
@@ -126,6 +267,222 @@ class TestSuite(unittest.TestCase):
         self.assertEqual(score[1].name, 'two')
         self.assertEqual(score[1].value, (1, 2))
 
+    def test_nested_score_grouping(self):
+        # Results with tuple names are grouped hierarchically, with scores
+        # summed at each level and messages kept on the leaves
+        res = [
+            Result(BaseCheck.HIGH, (1, 2), ('sec', 'a'), ['a failed']),
+            Result(BaseCheck.HIGH, True, ('sec', 'b')),
+            Result(BaseCheck.HIGH, False, ('sec', 'a'), ['a failed again']),
+            Result(BaseCheck.LOW, True, ('sec', 'a')),
+        ]
+        score = self.cs.scores(res)
+        self.assertEqual([(s.name, s.weight) for s in score],
+                         [('sec', BaseCheck.LOW), ('sec', BaseCheck.HIGH)])
+        high = score[1]
+        self.assertEqual(high.value, (2, 4))
+        self.assertEqual(high.msgs, [])
+        self.assertEqual([c.name for c in high.children], ['a', 'b'])
+        self.assertEqual(high.children[0].value, (1, 3))
+        self.assertEqual(high.children[0].msgs,
+                         ['a failed', 'a failed again'])
+
+    def test_concurrent_run(self):
+        # Running checks on worker threads must yield the same results and
+        # errors, in the same order, as running them sequentially
+        ds = GenericFile(static_files['empty'])
+        results = []
+        for workers in (None, 4):
+            cs = CheckSuite(max_workers=workers)
+            cs.checkers = {'concurrent': ConcurrentCheck}
+            groups, errors = cs.run(ds, [], 'concurrent')['concurrent']
+            results.append(([g.serialize() for g in groups], list(errors)))
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[1][1], ['check_b_failed_read'])
+        self.assertEqual(len(results[1][0]), 3)
+
+    def test_netcdf_checks_take_turns(self):
+        # the netCDF library isn't thread-safe, so checks of netCDF4
+        # datasets never run at once, unlike those of other datasets
+        checker = OverlapCheck()
+        checks = [(checker.check_a, None), (checker.check_b, None),
+                  (checker.check_c, None)]
+        cs = CheckSuite(max_workers=4)
+        with Dataset(static_files['bad_region']) as ds:
+            cs._run_checks(checks, ds)
+        self.assertEqual(checker.most, 1)
+
+        cs._run_checks(checks, GenericFile(static_files['empty']))
+        self.assertGreater(checker.most, 1)
+
+    def remote_dataset(self):
+        # an OPeNDAP dataset served from a local file
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        path = os.path.join(tmpdir, 'remote.nc')
+        with Dataset(path, 'w') as nc:
+            nc.Conventions = 'CF-1.6, ACDD-1.3'
+            nc.geospatial_lat_min = -10.
+            nc.geospatial_lat_max = 10.
+            nc.time_coverage_start = '1970-01-01T00:00:00Z'
+            nc.time_coverage_end = '1970-01-20T00:00:00Z'
+            nc.createDimension('time', 20)
+            nc.createDimension('lat', 3)
+            time = nc.createVariable('time', 'f8', ('time',))
+            time.standard_name = 'time'
+            time.units = 'days since 1970-01-01'
+            time[:] = np.arange(20)
+            lat = nc.createVariable('lat', 'f4', ('lat',))
+            lat.standard_name = 'latitude'
+            lat.units = 'degrees_north'
+            lat[:] = [-10, 0, 10]
+            temp = nc.createVariable('temp', 'i2', ('time', 'lat'),
+                                     fill_value=-1)
+            temp.standard_name = 'sea_water_temperature'
+            temp.units = 'K'
+            temp.scale_factor = 0.5
+            temp.valid_range = np.array([0, 50], dtype='i2')
+            temp[:] = np.arange(60).reshape(20, 3)
+        return path
+
+    def test_remote_checks_overlap(self):
+        # checks of OPeNDAP datasets read their data side by side, without
+        # the netCDF library
+        checker = ReadingCheck()
+        checks = [(checker.check_a, None), (checker.check_b, None),
+                  (checker.check_c, None)]
+        with OPeNDAPServer(self.remote_dataset(), delay=0.1) as server:
+            with Dataset(server.url) as ds:
+                sequential = CheckSuite()._run_checks(checks, ds)
+                self.assertEqual(server.most, 1)
+                concurrent = CheckSuite(max_workers=4)._run_checks(checks, ds)
+                self.assertGreater(server.most, 1)
+        self.assertEqual(concurrent, sequential)
+        self.assertEqual([r.value for r in concurrent[0]], [False] * 3)
+
+    def test_remote_same_results(self):
+        # the checks give the same results whether or not they run at once
+        self.cs.load_all_available_checkers()
+
+        def results(ds, checker, workers):
+            groups, errors = CheckSuite(max_workers=workers, check_data=True).run(
+                ds, [], checker)[checker]
+            return sorted(errors), sorted((r.name, r.value, r.msgs)
+                                          for r in groups)
+
+        with OPeNDAPServer(self.remote_dataset()) as server:
+            with Dataset(server.url) as ds:
+                self.assertEqual(results(ds, 'cf', 4), results(ds, 'cf', None))
+                # the ACDD checks reading data compare the extents
+                extents = [[r for r in results(ds, 'acdd', workers)[1]
+                            if 'extents' in r[0]] for workers in (None, 4)]
+        self.assertEqual(extents[1], extents[0])
+        self.assertEqual(len(extents[0]), 4)
+
+    def test_iter_run(self):
+        # Results are yielded per check as they complete, sequentially in the
+        # order of the checks
+        ds = GenericFile(static_files['empty'])
+        cs = CheckSuite()
+        cs.checkers = {'concurrent': ConcurrentCheck}
+        outcomes = list(cs.iter_run(ds, [], 'concurrent'))
+        self.assertEqual([o[1] for o in outcomes],
+                         ['check_a_slow_read', 'check_b_failed_read',
+                          'check_c_attributes', 'check_d_stateful'])
+        checker_name, check_name, results, error = outcomes[1]
+        self.assertEqual(checker_name, 'concurrent')
+        self.assertEqual(results, [])
+        self.assertIsInstance(error[0], IOError)
+        self.assertEqual(outcomes[2][2][0].name, 'attrs')
+
+        cs = CheckSuite(max_workers=4)
+        cs.checkers = {'concurrent': ConcurrentCheck}
+        self.assertEqual(sorted(o[1] for o in cs.iter_run(ds, [], 'concurrent')),
+                         [o[1] for o in outcomes])
+
+    def test_fail_fast(self):
+        ds = GenericFile(static_files['empty'])
+        # the medium priority failure of check_c_attributes stops the checks,
+        # errors don't
+        cs = CheckSuite(fail_fast=BaseCheck.MEDIUM)
+        cs.checkers = {'concurrent': ConcurrentCheck}
+        groups, errors = cs.run(ds, [], 'concurrent')['concurrent']
+        self.assertEqual(sorted(g.name for g in groups), ['attrs', 'slow read'])
+        self.assertEqual(list(errors), ['check_b_failed_read'])
+
+        # nothing fails at high priority, so every check runs
+        cs = CheckSuite(fail_fast=BaseCheck.HIGH)
+        cs.checkers = {'concurrent': ConcurrentCheck}
+        groups, errors = cs.run(ds, [], 'concurrent')['concurrent']
+        self.assertEqual(len(groups), 3)
+
+    def test_select_checks(self):
+        ds = GenericFile(static_files['empty'])
+
+        def names(**kwargs):
+            cs = CheckSuite(**kwargs)
+            cs.checkers = {'sectioned': SectionedCheck}
+            groups, _ = cs.run(ds, [], 'sectioned')['sectioned']
+            return sorted(g.name for g in groups)
+
+        self.assertEqual(names(only_checks=['check_b']), ['b'])
+        self.assertEqual(names(sections=['2']), ['a', 'b'])
+        self.assertEqual(names(sections=['2.1', '3']), ['a', 'c'])
+        self.assertEqual(names(sections=['2.2']), ['b'])
+        self.assertEqual(names(sections=['2.11']), [])
+        self.assertEqual(names(only_checks=['check_a', 'check_c'],
+                               sections=['2']), ['a'])
+
+        # checkers without sections aren't narrowed by them
+        cs = CheckSuite(sections=['4'])
+        cs.checkers = {'concurrent': ConcurrentCheck}
+        groups, _ = cs.run(ds, [], 'concurrent')['concurrent']
+        self.assertEqual(len(groups), 3)
+
+    def test_priority_limit(self):
+        ds = GenericFile(static_files['empty'])
+
+        def names(**kwargs):
+            cs = CheckSuite(**kwargs)
+            cs.checkers = {'priority': PriorityCheck}
+            checks = cs._get_checker_checks(ds, [], ['priority'])[0][1]
+            vals, _ = cs._run_checks(checks, ds)
+            return sorted(c.__func__.__name__ for c, _ in checks), \
+                sorted(r.name for r in vals)
+
+        self.assertEqual(names(), (['check_low', 'check_mixed'],
+                                   ['high', 'low', 'medium', 'unguarded']))
+        self.assertEqual(names(limit=BaseCheck.MEDIUM),
+                         (['check_mixed'], ['high', 'medium']))
+        self.assertEqual(names(limit=BaseCheck.HIGH),
+                         (['check_mixed'], ['high']))
+        # failing fast never stops on results below the limit
+        cs = CheckSuite(limit=BaseCheck.HIGH, fail_fast=BaseCheck.LOW)
+        self.assertEqual(cs.fail_fast, BaseCheck.HIGH)
+        self.assertEqual(names(limit=BaseCheck.HIGH, fail_fast=BaseCheck.LOW),
+                         (['check_mixed'], ['high']))
+        self.assertEqual(CheckSuite(fail_fast=BaseCheck.LOW).fail_fast,
+                         BaseCheck.LOW)
+
+        # the scores at the limit are those of running every check
+        def points(cs):
+            cs.checkers = {'priority': PriorityCheck}
+            groups, _ = cs.run(ds, [], 'priority')['priority']
+            return (cs.passtree(groups, BaseCheck.MEDIUM),
+                    cs.get_points(groups, BaseCheck.MEDIUM)[1:])
+
+        self.assertEqual(points(CheckSuite(limit=BaseCheck.MEDIUM)),
+                         points(CheckSuite()))
+
+    def test_metadata_only(self):
+        # Checks which read variable data are not run in metadata-only mode
+        ds = GenericFile(static_files['empty'])
+        cs = CheckSuite(metadata_only=True)
+        cs.checkers = {'concurrent': ConcurrentCheck}
+        groups, errors = cs.run(ds, [], 'concurrent')['concurrent']
+        self.assertEqual([g.name for g in groups], ['attrs', 'stateful'])
+        self.assertEqual(errors, {})
+
     def test_cdl_file(self):
         # Testing whether you can run compliance checker on a .cdl file
         # Load the cdl file
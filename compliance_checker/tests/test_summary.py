@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+compliance_checker/tests/test_summary.py
+'''
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from pkg_resources import resource_filename
+
+from compliance_checker.base import BaseCheck, Result
+from compliance_checker.runner import ComplianceChecker
+from compliance_checker.suite import CheckSuite
+from compliance_checker.summary import Summary
+
+
+def groups(units, names):
+    return [Result(BaseCheck.HIGH, units, 'Units'),
+            Result(BaseCheck.MEDIUM, names, 'Naming'),
+            Result(BaseCheck.LOW, (0, 1), 'Suggestions')]
+
+
+class TestSummary(unittest.TestCase):
+    '''
+    Test suite for archive-level summaries
+    '''
+
+    def make_summary(self, scores, top_k=2, start=0):
+        summary = Summary(limit=2, top_k=top_k)
+        checker = summary.checker('cf', 'cf:1.6', {3: 'Errors', 2: 'Warnings'})
+        for i, (units, names) in enumerate(scores, start):
+            results = groups(units, names)
+            passed = units[0] == units[1] and names[0] == names[1]
+            errors = {'check_broken': None} if i == 0 else {}
+            checker.add('ds{}.nc'.format(i), results, errors, passed, 2)
+        return summary
+
+    def test_add(self):
+        summary = self.make_summary([((1, 4), (1, 1)),
+                                     ((4, 4), (1, 1)),
+                                     ((2, 4), (0, 1)),
+                                     ((3, 4), (1, 1))])
+        cf = summary.to_dict()['checkers']['cf']
+        self.assertEqual(cf['datasets'], 4)
+        self.assertEqual(cf['passed'], 1)
+        self.assertEqual(cf['errored'], 1)
+        self.assertEqual(cf['errors'], {'check_broken': 1})
+        # low priority results are below the limit
+        self.assertEqual(cf['failures'], [
+            {'name': 'Units', 'weight': 3, 'failed': 3, 'checked': 4},
+            {'name': 'Naming', 'weight': 2, 'failed': 1, 'checked': 4},
+        ])
+        self.assertEqual(cf['score_min'], 0.4)
+        self.assertEqual(cf['score_max'], 1.0)
+        self.assertAlmostEqual(cf['score_mean'], (0.4 + 1.0 + 0.4 + 0.8) / 4)
+        self.assertEqual(sum(cf['score_histogram']), 4)
+        self.assertEqual(cf['score_histogram'][4], 2)
+        # only the top k lowest scores are kept, worst first
+        self.assertEqual([w['source_name'] for w in cf['worst']],
+                         ['ds2.nc', 'ds0.nc'])
+
+    def test_merge(self):
+        scores = [((1, 4), (1, 1)), ((4, 4), (1, 1)), ((2, 4), (0, 1)),
+                  ((3, 4), (1, 1)), ((0, 4), (1, 1))]
+        whole = self.make_summary(scores)
+        first = self.make_summary(scores[:2])
+        second = self.make_summary(scores[2:], start=2)
+        # round trip through JSON as summaries of separate runs would be
+        merged = Summary.from_dict(json.loads(first.to_json()), top_k=2)
+        merged.merge(Summary.from_dict(json.loads(second.to_json()), top_k=2))
+
+        expected = whole.to_dict()['checkers']['cf']
+        actual = merged.to_dict()['checkers']['cf']
+        for key in ('datasets', 'passed', 'errored', 'errors', 'failures',
+                    'score_histogram', 'score_min', 'score_max', 'worst'):
+            self.assertEqual(actual[key], expected[key])
+        self.assertAlmostEqual(actual['score_sum'], expected['score_sum'])
+        self.assertEqual(merged.checkers['cf'].scoreheader[3], 'Errors')
+
+        with self.assertRaises(ValueError):
+            merged.merge(Summary(limit=1))
+
+    def test_load_errors(self):
+        first = self.make_summary([((4, 4), (1, 1))])
+        first.add_load_error('missing.nc', ValueError('No such file'))
+        merged = Summary.from_dict(json.loads(first.to_json()), top_k=2)
+        self.assertEqual(merged.load_errors,
+                         [('missing.nc', 'ValueError: No such file')])
+        # older summaries have no load errors
+        older = first.to_dict()
+        del older['load_errors'], older['load_error_count']
+        merged.merge(Summary.from_dict(older))
+        self.assertEqual(merged.load_error_count, 1)
+
+        # only the first top_k load errors are kept, however many there are
+        for i in range(5):
+            first.add_load_error('broken{}.nc'.format(i), IOError('Truncated'))
+        merged.merge(first)
+        self.assertEqual(merged.load_error_count, 7)
+        self.assertEqual([source for source, _ in merged.load_errors],
+                         ['missing.nc', 'missing.nc'])
+        self.assertEqual(len(first.load_errors), first.top_k)
+        d = json.loads(first.to_json())
+        self.assertEqual((d['load_error_count'], len(d['load_errors'])), (6, 2))
+
+    def test_run_summary_load_errors(self):
+        # a dataset which fails to load is recorded, and the others checked
+        CheckSuite.load_all_available_checkers()
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        output = os.path.join(tmpdir, 'summary.json')
+        dataset = resource_filename('compliance_checker', 'tests/data/bad_units.nc')
+        missing = os.path.join(tmpdir, 'missing.nc')
+        passed, errors = ComplianceChecker.run_summary(
+            [missing, dataset], ['acdd:1.3'], 0, 'normal',
+            output_filename=output, output_format='json')
+        self.assertTrue(errors)
+        self.assertFalse(passed)
+        with open(output) as f:
+            summary = json.load(f)
+        self.assertEqual(summary['checkers']['acdd:1.3']['datasets'], 1)
+        self.assertEqual([e['source_name'] for e in summary['load_errors']],
+                         [missing])
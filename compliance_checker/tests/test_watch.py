@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+compliance_checker/tests/test_watch.py
+'''
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from compliance_checker import watch
+
+
+class TestWatch(unittest.TestCase):
+    '''
+    Test suite for watching a directory for datasets
+    '''
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+
+    def write(self, name, content=b'CDF\x01'):
+        with open(os.path.join(self.tmpdir, name), 'ab') as f:
+            f.write(content)
+
+    def next_path(self, watcher, timeout=10):
+        '''
+        Returns the next path yielded by the watcher, failing the test if
+        there is none within timeout seconds
+        '''
+        paths = []
+        thread = threading.Thread(target=lambda: paths.append(next(iter(watcher))))
+        thread.daemon = True
+        thread.start()
+        thread.join(timeout)
+        self.assertEqual(len(paths), 1, "No dataset found by the watcher")
+        return paths[0]
+
+    def test_polling_events(self):
+        self.write('existing.nc')
+        events = watch._PollingEvents(self.tmpdir, 0.01)
+        self.assertEqual(events.wait(0.05), set())
+        self.write('new.nc')
+        self.write('existing.nc')
+        self.assertEqual(events.wait(1), {'new.nc', 'existing.nc'})
+
+    def test_watcher(self):
+        self.write('existing.nc')
+        watcher = watch.DatasetWatcher(self.tmpdir, settle=0.2,
+                                       poll_interval=0.05)
+        self.addCleanup(watcher.close)
+
+        self.write('notes.txt')
+        self.write('new.nc')
+        start = time.time()
+        # keep writing to the file, it must not be yielded while it changes
+        for _ in range(3):
+            time.sleep(0.1)
+            self.write('new.nc')
+        self.assertEqual(self.next_path(watcher),
+                         os.path.join(self.tmpdir, 'new.nc'))
+        self.assertGreaterEqual(time.time() - start, 0.5)
+
+    def test_polling_watcher(self):
+        watcher = watch.DatasetWatcher(self.tmpdir, settle=0.1,
+                                       poll_interval=0.05)
+        watcher._events.close()
+        watcher._events = watch._PollingEvents(self.tmpdir, 0.05)
+        self.write('new.nc')
+        self.assertEqual(self.next_path(watcher),
+                         os.path.join(self.tmpdir, 'new.nc'))
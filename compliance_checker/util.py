@@ -1,8 +1,7 @@
 """
 General purpose utility functions to aid in compliance checking tasks
 """
-import isodate
-import pendulum
+from compliance_checker import dates
 
 
 def isstring(obj):
@@ -14,22 +13,19 @@ def isstring(obj):
 
 def datetime_is_iso(date_str):
     """Attempts to parse a date formatted in ISO 8601 format"""
-    try:
-        if len(date_str) > 10:
-            dt = isodate.parse_datetime(date_str)
-        else:
-            dt = isodate.parse_date(date_str)
+    if dates.is_iso(date_str):
         return True, []
-    except:  # Any error qualifies as not ISO format
-        return False, ['Datetime provided is not in a valid ISO 8601 format']
+    # Any error qualifies as not ISO format
+    return False, ['Datetime provided is not in a valid ISO 8601 format']
 
 
 def dateparse(date_str):
     '''
-    Returns a naive datetime. parsed from an ISO-8601 input string
+    Returns an aware datetime parsed from an ISO-8601 input string, in UTC if
+    the string has no time zone
 
     :param str date_str: An ISO-8601 string
     '''
 
-    return pendulum.parse(date_str)
+    return dates.parse_iso(date_str)
 
@@ -0,0 +1,183 @@
+'''
+Watching a directory for datasets to check
+
+DatasetWatcher yields the paths of files in a directory as they are created
+or changed.  On Linux it is woken up by inotify, elsewhere it falls back to
+polling the directory listing.  A file is only yielded once its size and
+modification time have stopped changing for a while, so files which are
+still being written or copied in aren't checked half finished.
+'''
+from __future__ import unicode_literals
+import ctypes
+import ctypes.util
+import errno
+import fnmatch
+import os
+import select
+import struct
+import sys
+import time
+
+
+class _InotifyEvents(object):
+    '''
+    Reports the names of files changed in a directory using the Linux
+    inotify API through ctypes.  Raises OSError if inotify isn't available.
+    '''
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    _EVENT = struct.Struct('iIII')
+
+    def __init__(self, path):
+        if not sys.platform.startswith('linux'):
+            raise OSError(errno.ENOSYS, "inotify is only available on Linux")
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._fd = libc.inotify_init()
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init failed")
+        mask = (self.IN_MODIFY | self.IN_ATTRIB | self.IN_CLOSE_WRITE |
+                self.IN_MOVED_TO | self.IN_CREATE)
+        if libc.inotify_add_watch(self._fd, path.encode(sys.getfilesystemencoding()),
+                                  mask) < 0:
+            err = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(err, "inotify_add_watch failed", path)
+
+    def wait(self, timeout):
+        '''
+        Returns the set of names changed, waiting up to timeout seconds for
+        a change, or indefinitely if timeout is None
+        '''
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return set()
+        data = os.read(self._fd, 64 * 1024)
+        names = set()
+        offset = 0
+        while offset < len(data):
+            _, _, _, length = self._EVENT.unpack_from(data, offset)
+            offset += self._EVENT.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if name:
+                names.add(name.decode(sys.getfilesystemencoding()))
+        return names
+
+    def close(self):
+        os.close(self._fd)
+
+
+class _PollingEvents(object):
+    '''
+    Reports the names of files changed in a directory by comparing the size
+    and modification time of its files every interval seconds
+    '''
+
+    def __init__(self, path, interval):
+        self._path = path
+        self._interval = interval
+        self._listing = self._scan()
+
+    def _scan(self):
+        listing = {}
+        for name in os.listdir(self._path):
+            signature = _signature(os.path.join(self._path, name))
+            if signature is not None:
+                listing[name] = signature
+        return listing
+
+    def wait(self, timeout):
+        '''
+        Returns the set of names changed, waiting up to timeout seconds for
+        a change, or indefinitely if timeout is None
+        '''
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            listing = self._scan()
+            names = set(name for name, signature in listing.items()
+                        if self._listing.get(name) != signature)
+            self._listing = listing
+            if names:
+                return names
+            if deadline is not None and time.time() >= deadline:
+                return names
+            time.sleep(self._interval)
+
+    def close(self):
+        pass
+
+
+def _signature(path):
+    # size and modification time of a regular file, None for anything else
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    if not os.path.isfile(path):
+        return None
+    return st.st_size, st.st_mtime
+
+
+class DatasetWatcher(object):
+    '''
+    Iterating over a DatasetWatcher blocks, yielding the path of each file
+    in the directory matching the pattern once it has been created or
+    changed and then left alone for `settle` seconds.  Files which already
+    exist when the watcher is created aren't yielded unless they change.
+    Subdirectories aren't watched.
+
+    :param str path: Directory to watch
+    :param str pattern: Shell-style pattern file names must match
+    :param float settle: Seconds a file must go unchanged before it is
+                         yielded
+    :param float poll_interval: Seconds between directory scans when inotify
+                                isn't available
+    '''
+
+    def __init__(self, path, pattern='*.nc', settle=2.0, poll_interval=1.0):
+        self.path = path
+        self.pattern = pattern
+        self.settle = settle
+        self.poll_interval = poll_interval
+        try:
+            self._events = _InotifyEvents(path)
+        except (OSError, AttributeError):
+            # AttributeError: a C library without inotify
+            self._events = _PollingEvents(path, poll_interval)
+        # file name -> (signature, time the signature was first seen)
+        self._pending = {}
+
+    def __iter__(self):
+        while True:
+            timeout = min(self.settle, self.poll_interval) if self._pending else None
+            for name in self._events.wait(timeout):
+                if fnmatch.fnmatch(name, self.pattern):
+                    self._pending[name] = (None, None)
+            for path in self._settled():
+                yield path
+
+    def _settled(self):
+        '''
+        Returns the paths of the pending files which have stopped changing,
+        in the order they were last changed
+        '''
+        now = time.time()
+        settled = []
+        for name, (last_signature, since) in list(self._pending.items()):
+            path = os.path.join(self.path, name)
+            signature = _signature(path)
+            if signature is None:
+                # removed or replaced by a directory
+                del self._pending[name]
+            elif signature != last_signature:
+                self._pending[name] = (signature, now)
+            elif now - since >= self.settle:
+                del self._pending[name]
+                settled.append((since, path))
+        return [path for _, path in sorted(settled)]
+
+    def close(self):
+        self._events.close()